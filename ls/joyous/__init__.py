@@ -17,3 +17,15 @@ default_app_config = 'ls.joyous.apps.JoyousAppConfig'
 # settings.JOYOUS_GROUP_MODEL = "joyous.GroupPage"
 # settings.JOYOUS_TIME_INPUT = "24"
 # settings.JOYOUS_EVENTS_PER_PAGE = 25
+# settings.JOYOUS_OCCURRENCES_HORIZON = 730
+# The caches below are forgotten by changing generation numbers kept in
+# JOYOUS_CACHE, so before turning any of them on it must be a cache that all
+# the processes share (e.g. Memcached or Redis, not the default LocMemCache),
+# else they go on serving what they cached after it should have been forgotten
+# settings.JOYOUS_CACHE = "default"
+# settings.JOYOUS_CALENDAR_CACHE_TIMEOUT = 0
+# settings.JOYOUS_GROUP_CACHE_TIMEOUT = 0
+# settings.JOYOUS_RESTRICTIONS_CACHE_TIMEOUT = 0
+# settings.JOYOUS_ICAL_STREAMING = False
+# settings.JOYOUS_ICAL_BACKGROUND_IMPORT = False
+# settings.JOYOUS_RECURRENCE_CACHE_SIZE = 1024
@@ -2,6 +2,8 @@
 # Joyous Fields
 # ------------------------------------------------------------------------------
 import sys
+from functools import lru_cache
+from django.conf import settings
 from django.db.models import Field
 from django.core.exceptions import ValidationError
 from django.forms.fields import Field as FormField
@@ -10,6 +12,15 @@ from django.utils.encoding import force_text
 from .utils.recurrence import Recurrence
 from .widgets import RecurrenceWidget
 
+# ------------------------------------------------------------------------------
+_RECURRENCE_CACHE_SIZE = getattr(settings, "JOYOUS_RECURRENCE_CACHE_SIZE", 1024)
+
+@lru_cache(maxsize=_RECURRENCE_CACHE_SIZE)
+def _parseRecurrence(value):
+    # The same few rules are stored by many events, so parse each just once.
+    # The Recurrences returned are shared, and so must not be modified.
+    return Recurrence(value)
+
 # ------------------------------------------------------------------------------
 class RecurrenceField(Field):
     """
@@ -35,7 +46,7 @@ class RecurrenceField(Field):
         if isinstance(value, Recurrence):
             return value
         try:
-            return Recurrence(value)
+            return _parseRecurrence(value)
         except (TypeError, ValueError, UnboundLocalError) as err:
             raise ValidationError("Invalid input for recurrence {}".format(err))
 
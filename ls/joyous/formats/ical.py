@@ -11,18 +11,22 @@ import quopri
 from icalendar import Calendar, Event
 from icalendar import vDatetime, vRecur, vDDDTypes, vText
 from django.contrib import messages
-from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
-from django.http import HttpResponse
+from django.db import transaction
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import html
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django.utils import timezone
 from ls.joyous import __version__
 from ..models import (SimpleEventPage, MultidayEventPage, RecurringEventPage,
         MultidayRecurringEventPage, EventExceptionBase, ExtraInfoPage,
         CancellationPage, PostponementPage, RescheduleMultidayEventPage,
-        EventBase, CalendarPage)
+        EventBase, CalendarPage, ICalImportJob, getEventsFingerprint,
+        getEventsFromUids)
 from ..utils.recurrence import Recurrence
+from ..utils.restrictions import getRestrictedPaths
 from ..utils.telltime import getAwareDatetime, getLocalDatetime
-from .vtimezone import create_timezone
 
 # ------------------------------------------------------------------------------
 class VComponentMixin:
@@ -41,29 +45,75 @@ class CalendarNotInitializedError(RuntimeError):
 # ------------------------------------------------------------------------------
 class ICalHandler:
     """Serve and load iCalendar files"""
+    streaming = getattr(settings, "JOYOUS_ICAL_STREAMING", False)
+
     def serve(self, page, request, *args, **kwargs):
         try:
-            vcal = VCalendar.fromPage(page, request)
+            etag = quote_etag(self._getFingerprint(page, request))
         except CalendarTypeError:
             return None
-        response = HttpResponse(vcal.to_ical(), content_type='text/calendar')
+        # Calendar clients poll subscribed feeds, so answer them with a
+        # 304 Not Modified before doing the work of building the calendar.
+        # There is no Last-Modified as removing an event need not move it on.
+        response = get_conditional_response(request, etag)
+        if response is None:
+            response = self._makeResponse(page, request)
+        response['ETag'] = etag
+        return response
+
+    def _makeResponse(self, page, request):
+        if self.streaming:
+            response = StreamingHttpResponse(VCalendar.streamPage(page, request),
+                                             content_type='text/calendar')
+        else:
+            vcal = VCalendar.fromPage(page, request)
+            response = HttpResponse(vcal.to_ical(),
+                                    content_type='text/calendar')
         response['Content-Disposition'] = \
             'attachment; filename={}.ics'.format(page.slug)
         return response
 
+    def _getFingerprint(self, page, request):
+        if isinstance(page, CalendarPage):
+            return page._getEventsFingerprint(request)
+        elif isinstance(page, EventBase):
+            return getEventsFingerprint(request, home=page, inclusive=True)
+        else:
+            raise CalendarTypeError("Unsupported input page")
+
+    background = getattr(settings, "JOYOUS_ICAL_BACKGROUND_IMPORT", False)
+
     def load(self, page, request, upload, **kwargs):
-        vcal = VCalendar(page, **kwargs)
-        vcal.load(request, upload.read(), getattr(upload, 'name', ""))
+        if self.background:
+            self._queue(page, request, upload, **kwargs)
+        else:
+            vcal = VCalendar(page, **kwargs)
+            vcal.load(request, upload.read(), getattr(upload, 'name', ""))
+
+    def _queue(self, page, request, upload, utc2local=False):
+        # leave the upload for the joyous_import_ical command to load
+        maxLength = ICalImportJob._meta.get_field('name').max_length
+        job = ICalImportJob.objects.create(calendar  = page,
+                                           user      = request.user,
+                                           name      = getattr(upload, 'name', "")[-maxLength:],
+                                           data      = upload.read(),
+                                           utc2local = bool(utc2local),
+                                           publish   = bool(request.POST.get('action-publish')))
+        messages.info(request, "iCal import {} queued".format(job.name))
 
 # ------------------------------------------------------------------------------
 class VCalendar(Calendar, VComponentMixin):
     prodVersion = ".".join(__version__.split(".", 2)[:2])
     prodId = "-//linuxsoftware.nz//NONSGML Joyous v{}//EN".format(prodVersion)
 
-    def __init__(self, page=None, utc2local=False):
+    def __init__(self, page=None, utc2local=False, batchSize=100,
+                 progress=None, skipUids=()):
         super().__init__(self)
         self.page = page
         self.utc2local = utc2local
+        self.batchSize = batchSize
+        self.progress = progress
+        self.skipUids = skipUids
         self.set('PRODID',  self.prodId)
         self.set('VERSION', "2.0")
 
@@ -76,6 +126,38 @@ class VCalendar(Calendar, VComponentMixin):
         else:
             raise CalendarTypeError("Unsupported input page")
 
+    @classmethod
+    def streamPage(cls, page, request):
+        """
+        Like fromPage, but yields the calendar serialized a component at a
+        time, so that large calendars need not be held in memory.
+        """
+        if isinstance(page, CalendarPage):
+            yield from cls._streamCalendarPage(page, request)
+        else:
+            yield cls.fromPage(page, request).to_ical()
+
+    @classmethod
+    def _streamCalendarPage(cls, page, request):
+        vcal = cls(page)
+        header, footer = vcal.to_ical().rsplit(b"END:VCALENDAR", 1)
+        yield header
+        # The timezones go up top, so this first pass through the events only
+        # finds the spans of time they need to cover, from the event fields
+        tzs = {}
+        for event in page._iterAllEvents(request):
+            if event.tz and event.tz is not pytz.utc:
+                tzs.setdefault(event.tz, TimeZoneSpan()).addPage(event)
+        for tz, vspan in tzs.items():
+            yield vspan.createVTimeZone(tz).to_ical()
+        del tzs
+        for event in page._iterAllEvents(request):
+            vevent = cls.factory.makeFromPage(event)
+            yield vevent.to_ical()
+            for vchild in vevent.vchildren:
+                yield vchild.to_ical()
+        yield b"END:VCALENDAR" + footer
+
     @classmethod
     def _fromCalendarPage(cls, page, request):
         vcal = cls(page)
@@ -137,7 +219,7 @@ class VCalendar(Calendar, VComponentMixin):
         except ValueError as e:
             messages.error(request, "Could not parse iCalendar file "+name)
             #messages.debug(request, str(e))
-            return
+            return 0, 0
 
         self.clear()
         numSuccess = numFail = 0
@@ -157,6 +239,7 @@ class VCalendar(Calendar, VComponentMixin):
             messages.success(request, "{} iCal events loaded".format(numSuccess))
         if numFail:
             messages.error(request, "Could not load {} iCal events".format(numFail))
+        return numSuccess, numFail
 
     def _loadEvents(self, request, vevents):
         numSuccess = numFail = 0
@@ -174,58 +257,107 @@ class VCalendar(Calendar, VComponentMixin):
                 self.add_component(vevent)
                 match.add(vevent)
 
-        for vmatch in vmap.values():
-            vevent = vmatch.parent
-            if vevent is not None:
-                try:
-                    event = self.page._getEventFromUid(request, vevent['UID'])
-                except PermissionDenied:
-                    # No authority
-                    pass
-                except ObjectDoesNotExist:
-                    numSuccess += self._createEventPage(request, vevent)
-                else:
-                    numSuccess += self._updateEventPage(request, vevent, event)
+        vevents = [vmatch.parent for vmatch in vmap.values()
+                   if vmatch.parent is not None and
+                      str(vmatch.parent['UID']) not in self.skipUids]
+        plan, numClashes = self._planLoad(request, vevents)
+        if numClashes:
+            messages.warning(request, "{} iCal events have UIDs already used "
+                                      "by events outside of this calendar"
+                                      .format(numClashes))
+        numFail += numClashes
+        numSuccess += self._applyPlan(request, plan)
         return numSuccess, numFail
 
-    def _updateEventPage(self, request, vevent, event):
-        numUpdated = 0
-        if vevent.modifiedDt > event.latest_revision_created_at:
-            vevent.toPage(event)
+    def _planLoad(self, request, vevents):
+        # Fetch everything that already exists up front, rather than an
+        # event and exception at a time, and work out what needs doing
+        uids = [str(vevent['UID']) for vevent in vevents]
+        events = self.page._getEventsFromUids(request, uids)
+        # UIDs must stay unique, so those of events that are out of this
+        # calendar's reach cannot be loaded here
+        elsewhere = getEventsFromUids(request, [uid for uid in uids
+                                                if uid not in events])
+        exceptions = self._getExceptions(events.values())
+        restricted = getRestrictedPaths(request)
+        plan = []
+        numClashes = 0
+        for vevent in vevents:
+            event = events.get(str(vevent['UID']))
+            if event is None and str(vevent['UID']) in elsewhere:
+                numClashes += 1
+                continue
+            if event is None:
+                vchildren = [(vchild, None) for vchild in _getVChildren(vevent)]
+                plan.append(LoadStep(vevent, None, True, vchildren))
+                continue
+            if _isRestricted(event, restricted):
+                # No authority
+                continue
+            modified = vevent.modifiedDt > event.latest_revision_created_at
+            vchildren = []
+            for vchild in _getVChildren(vevent):
+                key = (vchild.Page._meta.concrete_model, event.id,
+                       vchild['RECURRENCE-ID'].date())
+                exception = exceptions.get(key)
+                if exception is None:
+                    vchildren.append((vchild, None))
+                elif (not _isRestricted(exception, restricted) and
+                      vchild.modifiedDt > exception.latest_revision_created_at):
+                    vchildren.append((vchild, exception))
+            if modified or vchildren:
+                plan.append(LoadStep(vevent, event, modified, vchildren))
+        return plan, numClashes
+
+    def _getExceptions(self, events):
+        exceptions = {}
+        eventIds = [event.id for event in events
+                    if isinstance(event, RecurringEventPage)]
+        if not eventIds:
+            return exceptions
+        for model in (ExtraInfoPage, CancellationPage, PostponementPage):
+            qry = model.objects.filter(overrides_id__in=eventIds)
+            for exception in qry.iterator():
+                key = (model, exception.overrides_id, exception.except_date)
+                exceptions.setdefault(key, exception)
+        return exceptions
+
+    def _applyPlan(self, request, plan):
+        # Commit the changes in batches, so a failure part way through only
+        # loses the batch it happens in
+        numSuccess = 0
+        for start in range(0, len(plan), self.batchSize):
+            batch = plan[start:start+self.batchSize]
+            with transaction.atomic():
+                for step in batch:
+                    numSuccess += self._applyStep(request, step)
+            if self.progress is not None:
+                self.progress([str(step.vevent['UID']) for step in batch],
+                              start + len(batch), len(plan))
+        return numSuccess
+
+    def _applyStep(self, request, step):
+        numChanged = 0
+        event = step.event
+        if event is None:
+            event = step.vevent.makePage(uid=step.vevent['UID'])
+            _addPage(request, self.page, event)
             _saveRevision(request, event)
-            numUpdated += 1
-
-        vchildren  = vevent.vchildren[:]
-        vchildren += [CancellationVEvent.fromExDate(vevent, exDate)
-                      for exDate in vevent.exDates]
-        for vchild in vchildren:
-            try:
-                exception = vchild.Page.objects.child_of(event)            \
-                                  .get(except_date=vchild['RECURRENCE-ID'].date())
-            except ObjectDoesNotExist:
+            numChanged += 1
+        elif step.modified:
+            step.vevent.toPage(event)
+            _saveRevision(request, event)
+            numChanged += 1
+        for vchild, exception in step.vchildren:
+            if exception is None:
                 self._createExceptionPage(request, event, vchild)
             else:
-                if exception.isAuthorized(request):
-                    self._updateExceptionPage(request, vchild, exception)
-        return numUpdated
+                self._updateExceptionPage(request, vchild, exception)
+        return numChanged
 
     def _updateExceptionPage(self, request, vchild, exception):
-        if vchild.modifiedDt > exception.latest_revision_created_at:
-            vchild.toPage(exception)
-            _saveRevision(request, exception)
-
-    def _createEventPage(self, request, vevent):
-        event = vevent.makePage(uid=vevent['UID'])
-        _addPage(request, self.page, event)
-        _saveRevision(request, event)
-        numCreated = 1
-
-        vchildren  = vevent.vchildren[:]
-        vchildren += [CancellationVEvent.fromExDate(vevent, exDate)
-                      for exDate in vevent.exDates]
-        for vchild in vchildren:
-            self._createExceptionPage(request, event, vchild)
-        return numCreated
+        vchild.toPage(exception)
+        _saveRevision(request, exception)
 
     def _createExceptionPage(self, request, event, vchild):
         exception = vchild.makePage(overrides=event)
@@ -233,6 +365,17 @@ class VCalendar(Calendar, VComponentMixin):
         _saveRevision(request, exception)
 
 # ------------------------------------------------------------------------------
+LoadStep = namedtuple("LoadStep", "vevent event modified vchildren")
+
+def _getVChildren(vevent):
+    vchildren  = vevent.vchildren[:]
+    vchildren += [CancellationVEvent.fromExDate(vevent, exDate)
+                  for exDate in vevent.exDates]
+    return vchildren
+
+def _isRestricted(page, restrictedPaths):
+    return any(page.path.startswith(path) for path in restrictedPaths)
+
 def _addPage(request, parent, page):
     page.owner = request.user
     page.live  = bool(request.POST.get('action-publish'))
@@ -353,7 +496,40 @@ class TimeZoneSpan:
                 # either -- icalendar/src/icalendar/cal.py:526
                 # using replace to keep the tzinfo
                 lastDt = lastDt.replace(year=2038, month=12, day=31)
+        self._extend(firstDt, lastDt)
+
+    def addPage(self, page):
+        """
+        Like add, but for the VEVENT that would be made from this page,
+        without the cost of making it.
+        """
+        if isinstance(page, EventExceptionBase):
+            page = page.overrides
+        if isinstance(page, SimpleEventPage):
+            firstDt = getAwareDatetime(page.date, page.time_from, page.tz,
+                                       dt.time.min)
+            lastDt  = getAwareDatetime(page.date, page.time_to, page.tz,
+                                       dt.time.max)
+        elif isinstance(page, MultidayEventPage):
+            firstDt = getAwareDatetime(page.date_from, page.time_from, page.tz,
+                                       dt.time.min)
+            lastDt  = getAwareDatetime(page.date_to, page.time_to, page.tz,
+                                       dt.time.max)
+        elif isinstance(page, RecurringEventPage):
+            minDt   = pytz.utc.localize(dt.datetime.min)
+            firstDt = page._getMyFirstDatetimeFrom() or minDt
+            lastDt  = page._getMyFirstDatetimeTo()   or minDt
+            if page.repeat.until:
+                # to the second, as UNTIL is
+                lastDt = getAwareDatetime(page.repeat.until, dt.time.max,
+                                          lastDt.tzinfo).replace(microsecond=0)
+            else:
+                lastDt = lastDt.replace(year=2038, month=12, day=31)
+        else:
+            raise CalendarTypeError("Unsupported page type")
+        self._extend(firstDt, lastDt)
 
+    def _extend(self, firstDt, lastDt):
         if self.firstDt is None or firstDt < self.firstDt:
             self.firstDt = firstDt
         if self.lastDt is None or lastDt > self.lastDt:
@@ -362,6 +538,7 @@ class TimeZoneSpan:
     def createVTimeZone(self, tz):
         if self.firstDt is None or self.lastDt is None:
             raise self.NotInitializedError()
+        from .vtimezone import create_timezone
         return create_timezone(tz, self.firstDt, self.lastDt)
 
 # ------------------------------------------------------------------------------
@@ -3,6 +3,7 @@
 # ------------------------------------------------------------------------------
 from __future__ import unicode_literals
 import re
+from functools import lru_cache
 from .. import holidays
 
 __all__ = ["parseHolidays"]
@@ -18,7 +19,11 @@ def _createMap(symbols):
             if hasattr(obj, "country"):
                 holidayMap.setdefault(obj.country, cls)
     return holidayMap
-_HOLIDAY_MAP = _createMap(holidays.__dict__.items())
+
+@lru_cache(maxsize=None)
+def _getHolidayMap():
+    # creating the map instantiates every holiday class, so wait until needed
+    return _createMap(holidays.__dict__.items())
 
 HolsRe = re.compile(r"(\w[\w\ ]*)(\[.+?\])?")
 SplitRe = re.compile(r",\s*")
@@ -48,7 +53,7 @@ def parseHolidays(holidaysStr, holidayMap=None):
     Takes a string like NZ[WTL,Nelson],AU[*],Northern Ireland and builds a HolidaySum from it
     """
     if holidayMap is None:
-        holidayMap = _HOLIDAY_MAP
+        holidayMap = _getHolidayMap()
     retval = holidays.HolidayBase()
     retval.country = None
     holidaysStr = holidaysStr.strip()
@@ -0,0 +1,201 @@
+# ------------------------------------------------------------------------------
+# Import iCalendar files outside of the request cycle
+# ------------------------------------------------------------------------------
+import time
+import datetime as dt
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from wagtail.core.models import Site
+from ...models import CalendarPage, ICalImportJob
+from ...formats.ical import VCalendar
+
+# ------------------------------------------------------------------------------
+class Command(BaseCommand):
+    help = "Import an iCalendar file into a calendar, or run the imports "     \
+           "queued from the admin interface.  Progress is recorded after "   \
+           "each batch of events, so an interrupted import can be resumed, " \
+           "as can one that has shown no progress for --stale-after minutes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", nargs="?",
+                            help="iCalendar file to import (if not given, "
+                                 "run the queued imports)")
+        parser.add_argument("--calendar", type=int,
+                            help="id of the calendar page to import into")
+        parser.add_argument("--user",
+                            help="username of the owner of the new pages")
+        parser.add_argument("--utc2local", action="store_true",
+                            help="convert UTC times to localtime")
+        parser.add_argument("--publish", action="store_true",
+                            help="publish the imported pages")
+        parser.add_argument("--resume", type=int, metavar="JOB",
+                            help="id of an interrupted import to carry on")
+        parser.add_argument("--force", action="store_true",
+                            help="with --resume, carry on even if the "
+                                 "import seems to be running")
+        parser.add_argument("--stale-after", type=int, default=30,
+                            metavar="MINUTES",
+                            help="minutes without progress after which a "
+                                 "running import is taken to have died")
+        parser.add_argument("--batch-size", type=int, default=100,
+                            help="number of events to commit at a time")
+
+    def handle(self, *args, **options):
+        staleAfter = dt.timedelta(minutes=options['stale_after'])
+        if options['force'] and options['resume'] is not None:
+            claimable = ~Q(status=ICalImportJob.DONE)
+        else:
+            claimable = self._getClaimableQ(staleAfter)
+        if options['resume'] is not None:
+            jobs = [self._getResumableJob(options['resume'], claimable)]
+        elif options['file'] is not None:
+            jobs = [self._createJob(options)]
+        else:
+            # the queued jobs, and those whose process has died
+            jobs = ICalImportJob.objects                                     \
+                       .filter(Q(status=ICalImportJob.PENDING) |
+                               self._getStaleQ(staleAfter))
+        numJobs = numFailed = 0
+        for job in jobs:
+            # claim the job, in case another import is running at the same time
+            now = timezone.now()
+            claimed = ICalImportJob.objects                                  \
+                                   .filter(claimable, id=job.id)             \
+                                   .update(status=ICalImportJob.RUNNING,
+                                           heartbeat_at=now)
+            if claimed:
+                job.status = ICalImportJob.RUNNING
+                job.heartbeat_at = now
+                numJobs += 1
+                # carry on with the other jobs, the error is kept on this one
+                try:
+                    self._runJob(job, options['batch_size'])
+                except CommandError as e:
+                    self.stderr.write(str(e))
+                    numFailed += 1
+        if options['file'] is None and options['resume'] is None:
+            self.stdout.write("Ran {} queued iCal imports".format(numJobs))
+        if numFailed:
+            raise CommandError("{} of {} iCal imports failed"
+                               .format(numFailed, numJobs))
+
+    def _getClaimableQ(self, staleAfter):
+        # a running job might be being run by another process, unless that has
+        # shown no sign of life for a while
+        return (Q(status__in=(ICalImportJob.PENDING, ICalImportJob.FAILED)) |
+                self._getStaleQ(staleAfter))
+
+    def _getStaleQ(self, staleAfter):
+        cutoff = timezone.now() - staleAfter
+        return (Q(status=ICalImportJob.RUNNING) &
+                (Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True)))
+
+    def _getResumableJob(self, jobId, claimable):
+        job = ICalImportJob.objects.filter(id=jobId).first()
+        if job is None:
+            raise CommandError("No iCal import job {}".format(jobId))
+        if job.status == ICalImportJob.DONE:
+            raise CommandError("iCal import job {} is already done"
+                               .format(jobId))
+        if not ICalImportJob.objects.filter(claimable, id=jobId).exists():
+            raise CommandError("iCal import job {} is already running "
+                               "(use --force to take it over)".format(jobId))
+        return job
+
+    def _createJob(self, options):
+        calendar = CalendarPage.objects.filter(id=options['calendar']).first()
+        if calendar is None:
+            raise CommandError("No calendar page {}".format(options['calendar']))
+        User = get_user_model()
+        user = User.objects.filter(**{User.USERNAME_FIELD:
+                                      options['user']}).first()
+        if user is None:
+            raise CommandError("No user {}".format(options['user']))
+        try:
+            with open(options['file'], "rb") as upload:
+                data = upload.read()
+        except OSError as e:
+            raise CommandError(str(e))
+        # keep the end of a long path, it has the name of the file
+        maxLength = ICalImportJob._meta.get_field('name').max_length
+        return ICalImportJob.objects.create(calendar  = calendar,
+                                            user      = user,
+                                            name      = options['file'][-maxLength:],
+                                            data      = data,
+                                            utc2local = options['utc2local'],
+                                            publish   = options['publish'])
+
+    def _runJob(self, job, batchSize):
+        if job.user is None:
+            self._failJob(job, "has no user")
+        if job.started_at is None:
+            job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+        loadedUids = job.getLoadedUids()
+        if loadedUids:
+            self.stdout.write("Resuming {} after {} events"
+                              .format(job.name, len(loadedUids)))
+
+        def progress(uids, numDone, numTotal):
+            job.checkpoint(uids)
+            job.beat()
+            self.stdout.write("{}/{} events".format(numDone, numTotal))
+
+        request = self._getRequest(job)
+        vcal = VCalendar(job.calendar.specific,
+                         utc2local = job.utc2local,
+                         batchSize = batchSize,
+                         progress  = progress,
+                         skipUids  = loadedUids)
+        startTime = time.perf_counter()
+        try:
+            numLoaded, numFailed = vcal.load(request, bytes(job.data), job.name)
+        except Exception as e:
+            self._failJob(job, "failed: {}".format(e))
+        except BaseException:
+            # e.g. interrupted, it can be resumed later
+            job.status = ICalImportJob.FAILED
+            job.save(update_fields=["status"])
+            raise
+        elapsed = time.perf_counter() - startTime
+
+        job.status      = ICalImportJob.DONE
+        job.num_loaded += numLoaded
+        job.num_failed  = numFailed
+        job.finished_at = timezone.now()
+        job.error       = ""
+        job.save(update_fields=["status", "num_loaded", "num_failed",
+                                "finished_at", "error"])
+        for message in request._messages:
+            self.stdout.write(str(message))
+        self.stdout.write("Loaded {} iCal events in {:.1f} seconds "
+                          "({:.1f} events/sec)"
+                          .format(numLoaded, elapsed,
+                                  numLoaded / elapsed if elapsed else 0.0))
+
+    def _failJob(self, job, error):
+        job.status = ICalImportJob.FAILED
+        job.error  = error
+        job.save(update_fields=["status", "error"])
+        raise CommandError("iCal import {} {}".format(job.name, error))
+
+    def _getRequest(self, job):
+        # VCalendar.load expects to be run within an admin request
+        request = HttpRequest()
+        request.user = job.user
+        request.site = job.calendar.get_site() or                            \
+                       Site.objects.filter(is_default_site=True).first()
+        request.session = {}
+        request.POST = QueryDict(mutable=True)
+        if job.publish:
+            request.POST['action-publish'] = "action-publish"
+        request._messages = FallbackStorage(request)
+        return request
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
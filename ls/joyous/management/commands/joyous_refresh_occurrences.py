@@ -0,0 +1,38 @@
+# ------------------------------------------------------------------------------
+# Refresh the materialized occurrences of recurring events
+# ------------------------------------------------------------------------------
+from django.core.management.base import BaseCommand
+from ...models import (SimpleEventPage, MultidayEventPage, RecurringEventPage,
+        PostponementPage, ExtraInfoPage)
+
+# ------------------------------------------------------------------------------
+class Command(BaseCommand):
+    help = "Rebuild the materialized occurrences of all recurring events, "   \
+           "and when every event next and last starts.  Run this "          \
+           "periodically to extend the occurrences of open-ended rules past " \
+           "the horizon."
+
+    def handle(self, *args, **options):
+        numEvents = 0
+        for event in RecurringEventPage.objects.all().iterator():
+            event._refreshOccurrences()
+            numEvents += 1
+        self.stdout.write("Refreshed the occurrences of {} recurring events"
+                          .format(numEvents))
+
+        numEvents = 0
+        for Event in (SimpleEventPage, MultidayEventPage, RecurringEventPage,
+                      PostponementPage, ExtraInfoPage):
+            for event in Event.objects.all().iterator():
+                event._setOccurrenceTimes()
+                Event.objects.filter(id=event.id)                             \
+                     .update(next_occurrence_at=event.next_occurrence_at,
+                             last_occurrence_at=event.last_occurrence_at,
+                             occurrence_times_at=event.occurrence_times_at)
+                numEvents += 1
+        self.stdout.write("Refreshed the occurrence times of {} events"
+                          .format(numEvents))
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.28 on 2026-10-17 12:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('joyous', '0015_auto_20190409_0645'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringeventpage',
+            name='occurrences_until',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='EventOccurrence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('start', models.DateTimeField(verbose_name='start')),
+                ('finish', models.DateTimeField(verbose_name='finish')),
+                ('exception', models.CharField(blank=True, choices=[('', 'none'), ('extra-info', 'extra information'), ('cancellation', 'cancellation'), ('postponement', 'postponement')], max_length=16, verbose_name='exception')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='joyous.RecurringEventPage', verbose_name='event')),
+            ],
+            options={
+                'verbose_name': 'event occurrence',
+                'verbose_name_plural': 'event occurrences',
+                'ordering': ['start'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='eventoccurrence',
+            index=models.Index(fields=['start', 'finish'], name='joyous_even_start_f1de61_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='eventoccurrence',
+            unique_together={('event', 'date')},
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 2.2.28 on 2026-10-17 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('joyous', '0016_eventoccurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extrainfopage',
+            name='last_occurrence_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='extrainfopage',
+            name='next_occurrence_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='extrainfopage',
+            name='occurrence_times_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='multidayeventpage',
+            name='last_occurrence_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='multidayeventpage',
+            name='next_occurrence_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='multidayeventpage',
+            name='occurrence_times_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='postponementpage',
+            name='last_occurrence_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='postponementpage',
+            name='next_occurrence_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='postponementpage',
+            name='occurrence_times_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recurringeventpage',
+            name='last_occurrence_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recurringeventpage',
+            name='next_occurrence_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recurringeventpage',
+            name='occurrence_times_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='simpleeventpage',
+            name='last_occurrence_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='simpleeventpage',
+            name='next_occurrence_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='simpleeventpage',
+            name='occurrence_times_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
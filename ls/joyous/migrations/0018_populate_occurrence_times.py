@@ -0,0 +1,123 @@
+from django.db import migrations, models
+from django.db.models.functions import Cast
+from django.utils import timezone
+from dateutil.rrule import rrulestr
+import datetime as dt
+import pytz
+
+# These work out the times the same way as the models' _setOccurrenceTimes,
+# but with just the fields available to a migration, and without the joyous
+# utilities, which may change after it
+
+def getAwareDatetime(date, time, tz):
+    # with no time this is the end of the day, and if daylight savings causes
+    # an error then standard time is used, as in the models
+    if tz is None:
+        tz = timezone.get_current_timezone()
+    if time is None:
+        time = dt.time.max
+    datetime = dt.datetime.combine(date, time)
+    try:
+        return tz.localize(datetime, is_dst=None)
+    except (pytz.AmbiguousTimeError, pytz.NonExistentTimeError):
+        return tz.localize(datetime, is_dst=False)
+
+def getRule(text):
+    # the repeat field as stored, e.g. DTSTART:20180329\nRRULE:FREQ=WEEKLY...
+    return rrulestr(text)
+
+def isOccurrence(rule, date):
+    start = dt.datetime.combine(date, dt.time.min)
+    return rule.after(start, inc=True) == start
+
+def getNextAndLast(event, rule, exceptDates, now):
+    # when the recurring event next and last starts, not counting exceptions
+    myNow = now.astimezone(event.tz)
+    timeFrom = event.time_from
+    fromDate = myNow.date()
+    if timeFrom and timeFrom < myNow.time():
+        fromDate += dt.timedelta(days=1)
+    toDate = myNow.date()
+    if timeFrom and timeFrom > myNow.time():
+        toDate -= dt.timedelta(days=1)
+    nextDt = rule.after(dt.datetime.combine(fromDate, dt.time.min), inc=True)
+    while nextDt is not None and nextDt.date() in exceptDates:
+        nextDt = rule.after(nextDt)
+    lastDt = rule.before(dt.datetime.combine(toDate, dt.time.min), inc=True)
+    while lastDt is not None and lastDt.date() in exceptDates:
+        lastDt = rule.before(lastDt)
+    return tuple(getAwareDatetime(when.date(), timeFrom, event.tz)
+                 if when is not None else None
+                 for when in (nextDt, lastDt))
+
+def getOwnTz(event):
+    return event.tz
+
+def getOverriddenTz(postponement):
+    # tz is a property of PostponementPage, so isn't in the historical model
+    overrides = postponement.overrides
+    return overrides.tz if overrides is not None else None
+
+def populate(apps, schema_editor):
+    now = timezone.now()
+    for model, dateField, getTz in [("SimpleEventPage",   'date',
+                                     getOwnTz),
+                                    ("MultidayEventPage", 'date_from',
+                                     getOwnTz),
+                                    ("PostponementPage",  'date',
+                                     getOverriddenTz)]:
+        Model = apps.get_model("joyous", model)
+        for row in Model.objects.filter(occurrence_times_at__isnull=True):
+            fromDt = getAwareDatetime(getattr(row, dateField), row.time_from,
+                                      getTz(row))
+            Model.objects.filter(id=row.id)                                  \
+                         .update(next_occurrence_at=fromDt,
+                                 last_occurrence_at=fromDt,
+                                 occurrence_times_at=now)
+
+    RecurringEventPage = apps.get_model("joyous", "RecurringEventPage")
+    CancellationPage = apps.get_model("joyous", "CancellationPage")
+    ExtraInfoPage = apps.get_model("joyous", "ExtraInfoPage")
+    events = RecurringEventPage.objects                                      \
+                               .annotate(rule=Cast('repeat',
+                                                   models.TextField()))      \
+                               .defer('repeat')
+    for event in events:
+        rule = getRule(event.rule)
+        cancelled = set(CancellationPage.objects                             \
+                                        .filter(overrides_id=event.id,
+                                                live=True)                   \
+                                        .values_list('except_date', flat=True))
+        extraInfo = set(ExtraInfoPage.objects                                \
+                                     .filter(overrides_id=event.id, live=True)\
+                                     .exclude(extra_title="")                \
+                                     .values_list('except_date', flat=True))
+        if event.occurrence_times_at is None:
+            nextDt, lastDt = getNextAndLast(event, rule, cancelled | extraInfo,
+                                            now)
+            RecurringEventPage.objects.filter(id=event.id)                   \
+                              .update(next_occurrence_at=nextDt,
+                                      last_occurrence_at=lastDt,
+                                      occurrence_times_at=now)
+        for info in ExtraInfoPage.objects.filter(overrides_id=event.id,
+                                                 occurrence_times_at__isnull=True):
+            fromDt = None
+            if (isOccurrence(rule, info.except_date) and
+                info.except_date not in cancelled):
+                fromDt = getAwareDatetime(info.except_date, event.time_from,
+                                          event.tz)
+            ExtraInfoPage.objects.filter(id=info.id)                         \
+                         .update(next_occurrence_at=fromDt,
+                                 last_occurrence_at=fromDt,
+                                 occurrence_times_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('joyous', '0017_occurrence_times'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.28 on 2026-10-17 13:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('joyous', '0018_populate_occurrence_times'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ICalImportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=255, verbose_name='name')),
+                ('data', models.BinaryField(verbose_name='data')),
+                ('utc2local', models.BooleanField(default=False, verbose_name='convert UTC to localtime')),
+                ('publish', models.BooleanField(default=False, verbose_name='publish')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='pending', max_length=16, verbose_name='status')),
+                ('num_loaded', models.PositiveIntegerField(default=0, verbose_name='number loaded')),
+                ('num_failed', models.PositiveIntegerField(default=0, verbose_name='number failed')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished at')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='heartbeat at')),
+                ('error', models.TextField(blank=True, verbose_name='error')),
+                ('calendar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='joyous.CalendarPage', verbose_name='calendar')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'iCal import job',
+                'verbose_name_plural': 'iCal import jobs',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ICalImportedUid',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uid', models.CharField(max_length=255, verbose_name='UID')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loaded_uids', to='joyous.ICalImportJob', verbose_name='job')),
+            ],
+            options={
+                'verbose_name': 'iCal imported UID',
+                'verbose_name_plural': 'iCal imported UIDs',
+            },
+        ),
+    ]
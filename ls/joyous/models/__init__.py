@@ -4,6 +4,7 @@ from .events import SimpleEventPage
 from .events import MultidayEventPage
 from .events import RecurringEventPage
 from .events import MultidayRecurringEventPage
+from .events import EventOccurrence
 from .events import EventExceptionBase
 from .events import ExtraInfoPage
 from .events import CancellationPage
@@ -13,16 +14,25 @@ from .events import RescheduleMultidayEventPage
 
 from .events import getAllEventsByDay
 from .events import getAllEventsByWeek
+from .events import getAllEventsByYear
 from .events import getAllUpcomingEvents
 from .events import getAllPastEvents
 from .events import getGroupUpcomingEvents
+from .events import getGroupUpcomingEventsCached
+from .events import forgetGroupEvents
+from .events import forgetOccurrenceMemos
 from .events import getEventFromUid
+from .events import getEventsFromUids
 from .events import getAllEvents
+from .events import iterAllEvents
+from .events import getEventsFingerprint
 from .events import removeContentPanels
 
 from .calendar import CalendarPage
 from .calendar import CalendarPageForm
 from .calendar import SpecificCalendarPage
 from .calendar import GeneralCalendarPage
+from .calendar import ICalImportJob
+from .calendar import ICalImportedUid
 
 from .groups import GroupPage
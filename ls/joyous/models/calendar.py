@@ -2,18 +2,25 @@
 # Joyous calendar models
 # ------------------------------------------------------------------------------
 import datetime as dt
+from hashlib import md5
 from django.conf import settings
+from django.core.exceptions import SuspiciousOperation
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from django.http import Http404
+from django.http import Http404, HttpResponseBadRequest
+from django.http import JsonResponse
 from django import forms
 from django.shortcuts import redirect
 from django.template.response import TemplateResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import quote_etag
 from django.utils.translation import gettext_lazy as _
+from django.utils.translation import get_language
 from wagtail.admin.forms import WagtailAdminPageForm
-from wagtail.core.models import Page
+from wagtail.core.models import Page, Site
 from wagtail.core.fields import RichTextField
 from wagtail.admin.edit_handlers import HelpPanel, FieldPanel, MultiFieldPanel
 from wagtail.contrib.routable_page.models import RoutablePageMixin, route
@@ -24,9 +31,14 @@ from ..utils.names import WEEKDAY_NAMES, MONTH_NAMES, MONTH_ABBRS
 from ..utils.weeks import week_info, gregorian_to_week_date, num_weeks_in_year
 from ..utils.weeks import weekday_abbr, weekday_name
 from ..utils.mixins import ProxyPageMixin
+from ..utils.cache import getCache, getGeneration, nextGeneration
+from ..utils.restrictions import getRestrictionProfile
 from ..fields import MultipleSelectField
-from . import (getAllEventsByDay, getAllEventsByWeek, getAllUpcomingEvents,
-               getAllPastEvents, getEventFromUid, getAllEvents)
+from . import EventExceptionBase, CancellationPage, PostponementPage
+from . import (getAllEventsByDay, getAllEventsByWeek, getAllEventsByYear,
+               getAllUpcomingEvents,
+               getAllPastEvents, getEventFromUid, getEventsFromUids,
+               getAllEvents, iterAllEvents, getEventsFingerprint)
 
 # ------------------------------------------------------------------------------
 class CalendarPageForm(WagtailAdminPageForm):
@@ -116,6 +128,20 @@ class CalendarPage(RoutablePageMixin, Page):
         verbose_name_plural = _("calendar pages")
 
     EventsPerPage = getattr(settings, "JOYOUS_EVENTS_PER_PAGE", 25)
+    # How many seconds to cache the calendar views for (0 to not cache them)
+    CacheTimeout = getattr(settings, "JOYOUS_CALENDAR_CACHE_TIMEOUT", 0)
+    # The views which can be cached, and the query parameters each reads
+    CachedViews = {"routeDefault":     ("view", "page", "after"),
+                   "routeByMonthAbbr": (),
+                   "serveMonth":       (),
+                   "serveYear":        (),
+                   "serveWeek":        (),
+                   "serveDay":         (),
+                   "serveUpcoming":    ("page", "after")}
+    # Whether the events of other sites are shown too
+    ShowsAllSites = False
+    # The most days the events API will return at once
+    ApiMaxDays = 366
     subpage_types = ['joyous.SimpleEventPage',
                      'joyous.MultidayEventPage',
                      'joyous.RecurringEventPage',
@@ -142,6 +168,25 @@ class CalendarPage(RoutablePageMixin, Page):
             heading=_("View Options")),
         ]
 
+    def serve(self, request, view=None, args=None, kwargs=None):
+        key = self._getCacheKey(request, view, args, kwargs)
+        if key is None:
+            return super().serve(request, view, args, kwargs)
+        cache = getCache()
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        response = super().serve(request, view, args, kwargs)
+        if (response.status_code == 200 and
+            hasattr(response, "add_post_render_callback")):
+            def store(response):
+                # not if something was rendered just for this visitor
+                if (not response.cookies and
+                    not request.META.get("CSRF_COOKIE_USED")):
+                    cache.set(key, response, self.CacheTimeout)
+            response.add_post_render_callback(store)
+        return response
+
     @route(r"^$")
     @route(r"^{YYYY}/$".format(**DatePictures))
     def routeDefault(self, request, year=None):
@@ -218,6 +263,57 @@ class CalendarPage(RoutablePageMixin, Page):
                                 "joyous/calendar_month.html",
                                 context)
 
+    @route(r"^year/$")
+    @route(r"^{YYYY}/year/$".format(**DatePictures))
+    def serveYear(self, request, year=None):
+        """Yearly calendar view."""
+        myurl = self.get_url(request)
+        def myUrl(urlYear):
+            if 1900 <= urlYear <= 2099:
+                return myurl + self.reverse_subpage('serveYear',
+                                                    args=[urlYear])
+        today = timezone.localdate()
+        if year is None: year = today.year
+        year = int(year)
+
+        if year == today.year:
+            month = today.month
+            weekNum = gregorian_to_week_date(today)[1]
+        else:
+            month = 1
+            weekNum = 1
+        monthlyUrl = myurl + self.reverse_subpage('serveMonth',
+                                                  args=[year, month])
+        weeklyUrl = myurl + self.reverse_subpage('serveWeek',
+                                                 args=[year, weekNum])
+        listUrl = myurl + self.reverse_subpage('serveUpcoming')
+
+        months = []
+        for month, weeks in enumerate(self._getEventsByYear(request, year),
+                                      start=1):
+            monthUrl = myurl + self.reverse_subpage('serveMonth',
+                                                    args=[year, month])
+            months.append((month, MONTH_NAMES[month], monthUrl, weeks))
+
+        context = {'self':         self,
+                   'page':         self,
+                   'version':      __version__,
+                   'year':         year,
+                   'today':        today,
+                   'prevYearUrl':  myUrl(year - 1),
+                   'nextYearUrl':  myUrl(year + 1),
+                   'thisYearUrl':  myUrl(today.year),
+                   'monthlyUrl':   monthlyUrl,
+                   'weeklyUrl':    weeklyUrl,
+                   'listUrl':      listUrl,
+                   'calendarUrl':  myurl,
+                   'weekdayInfo':  list(zip(weekday_abbr, weekday_name)),
+                   'months':       months}
+        context.update(self._getExtraContext("year"))
+        return TemplateResponse(request,
+                                "joyous/calendar_year.html",
+                                context)
+
     @route(r"^week/$")
     @route(r"^{YYYY}/W{WW}/$".format(**DatePictures))
     def serveWeek(self, request, year=None, week=None):
@@ -411,6 +507,63 @@ class CalendarPage(RoutablePageMixin, Page):
                                 "joyous/includes/minicalendar.html",
                                 context)
 
+    @route(r"^api/events/$")
+    def serveEventsApi(self, request):
+        """
+        The occurrences of events between the ?from= and ?to= dates (given as
+        YYYY-MM-DD, inclusive) as JSON, for client-side calendars.
+        """
+        try:
+            firstDay = parse_date(request.GET.get('from', "") or "")
+            lastDay  = parse_date(request.GET.get('to', "") or "")
+        except ValueError:
+            # well formatted, but not a real date
+            firstDay = lastDay = None
+        if firstDay is None or lastDay is None:
+            return HttpResponseBadRequest("from and to dates are required")
+        numDays = (lastDay - firstDay).days + 1
+        if not 1 <= numDays <= self.ApiMaxDays:
+            return HttpResponseBadRequest("Between 1 and {} days please"
+                                          .format(self.ApiMaxDays))
+
+        tag = self._getEventsFingerprint(request)
+        # whether each occurrence has started or finished depends upon the
+        # time, which is good to the minute for events given in minutes
+        now = timezone.localtime().replace(second=0, microsecond=0)
+        etag = quote_etag(md5("{}:{}:{}:{}:{}:{}".format(tag,
+                                   firstDay, lastDay,
+                                   timezone.get_current_timezone_name(),
+                                   get_language(),
+                                   now.isoformat()).encode()).hexdigest())
+        response = get_conditional_response(request, etag)
+        if response is None:
+            records = self._getEventRecords(request, firstDay, lastDay)
+            response = JsonResponse({'from':   firstDay.isoformat(),
+                                     'to':     lastDay.isoformat(),
+                                     'events': records})
+        response['ETag'] = etag
+        return response
+
+    def _getEventRecords(self, request, firstDay, lastDay):
+        """
+        Compact records of the occurrences of events between these dates.
+        """
+        records = []
+        now = timezone.localtime()
+        for evod in self._getEventsByDay(request, firstDay, lastDay):
+            occurrences = list(zip(evod.all_events, evod.all_spans))
+            numDays = len(evod.days_events)
+            if evod.date == firstDay:
+                # and those which started before the first day
+                occurrences = occurrences[numDays:] + occurrences[:numDays]
+            else:
+                occurrences = occurrences[:numDays]
+            for thisEvent, span in occurrences:
+                if span is None:
+                    span = thisEvent.page._getLocalSpan(evod.date)
+                records.append(_makeEventRecord(thisEvent, span, now))
+        return records
+
     @classmethod
     def can_create_at(cls, parent):
         return super().can_create_at(parent) and cls._allowAnotherAt(parent)
@@ -429,6 +582,105 @@ class CalendarPage(RoutablePageMixin, Page):
         contentType = ContentType.objects.get_for_model(cls)
         return cls.objects.filter(content_type=contentType)
 
+    @classmethod
+    def _invalidateCaches(cls, page=None):
+        """
+        Forget the cached views and calendar tags which could show this event
+        page: those of the sites it is in, and of any general calendar.
+        Without a page forget those of every calendar and site.
+        """
+        if not cls.CacheTimeout:
+            return
+        siteIds = []
+        if page is not None:
+            siteIds = [siteId for siteId, rootPath, _
+                       in Site.get_site_root_paths()
+                       if page.url_path.startswith(rootPath)]
+        if siteIds:
+            for siteId in siteIds:
+                nextGeneration("events:site:{}".format(siteId))
+        else:
+            nextGeneration("events")
+
+    @classmethod
+    def _getEventsGeneration(cls, request, allSites=False):
+        """
+        The generation of the cached views and calendar tags showing the
+        events of the site of this request, or with allSites of every site.
+        """
+        if allSites:
+            siteIds = [siteId for siteId, _, _ in Site.get_site_root_paths()]
+        else:
+            siteIds = [request.site.id]
+        generations = [getGeneration("events")]
+        generations += [getGeneration("events:site:{}".format(siteId))
+                        for siteId in siteIds]
+        return md5(":".join(generations).encode()).hexdigest()
+
+    @classmethod
+    def _getSiteCalendarId(cls, request):
+        """
+        Return the id of the first live calendar in the site of this request,
+        or None.  This is remembered for the CacheTimeout, or until a calendar
+        is changed.
+        """
+        return cls._getSiteCalendar(request)[0]
+
+    @classmethod
+    def _getSiteCalendar(cls, request):
+        """
+        Return the id of the first live calendar in the site of this request,
+        or None, and whether it shows the events of every site.
+        """
+        site = request.site
+        if not cls.CacheTimeout:
+            return cls._findSiteCalendar(site)
+        key = "joyous:sitecalendar:{}:{}".format(getGeneration("events"),
+                                                 site.root_page_id)
+        cache = getCache()
+        cached = cache.get(key)
+        if cached is None:
+            cached = cls._findSiteCalendar(site)
+            cache.set(key, cached, cls.CacheTimeout)
+        return cached
+
+    @classmethod
+    def _findSiteCalendar(cls, site):
+        found = cls.objects.live().descendant_of(site.root_page)             \
+                           .values_list('id', 'content_type_id').first()
+        if found is None:
+            return (None, False)
+        calId, contentTypeId = found
+        model = ContentType.objects.get_for_id(contentTypeId).model_class()
+        return (calId, getattr(model, "ShowsAllSites", False))
+
+    def _getCacheKey(self, request, view, args, kwargs):
+        """
+        The key to cache this view under, or None if it should not be cached.
+        """
+        # signed in users may be shown things just for them, e.g. the userbar
+        if (not self.CacheTimeout or request.method != "GET" or
+            request.user.is_authenticated):
+            return None
+        params = self.CachedViews.get(getattr(view, "__name__", None))
+        # other parameters, e.g. utm_source, would each need their own copy
+        if params is None or any(key not in params for key in request.GET):
+            return None
+        keyed = (view.__name__,
+                 tuple(args or ()),
+                 tuple(sorted((kwargs or {}).items())),
+                 tuple((key, request.GET.get(key)) for key in params),
+                 request.get_host(),
+                 get_language(),
+                 timezone.get_current_timezone_name(),
+                 timezone.localdate(),
+                 getRestrictionProfile(request),
+                 getGeneration("restrictions"))
+        return "joyous:calendar:{}:{}:{}".format(self.id,
+                            self._getEventsGeneration(request,
+                                                      self.ShowsAllSites),
+                            md5(repr(keyed).encode()).hexdigest())
+
     def _getExtraContext(self, route):
         return {}
 
@@ -451,6 +703,14 @@ class CalendarPage(RoutablePageMixin, Page):
         home = request.site.root_page
         return getAllEventsByWeek(request, year, month, home=home)
 
+    def _getEventsByYear(self, request, year):
+        """
+        Return the events in this site for the given year grouped by month
+        and week.
+        """
+        home = request.site.root_page
+        return getAllEventsByYear(request, year, home=home)
+
     def _getUpcomingEvents(self, request):
         """Return the upcoming events in this site."""
         home = request.site.root_page
@@ -465,16 +725,35 @@ class CalendarPage(RoutablePageMixin, Page):
         """Try and find an event with the given UID in this site."""
         event = getEventFromUid(request, uid) # might raise exception
         home = request.site.root_page
-        if event.get_ancestors().filter(id=home.id).exists():
+        if event.path.startswith(home.path) and event.path != home.path:
             # only return event if it is in the same site
             return event
 
+    def _getEventsFromUids(self, request, uids):
+        """Find the events in this site with the given UIDs."""
+        home = request.site.root_page
+        return getEventsFromUids(request, uids, home=home)
+
     def _getAllEvents(self, request):
         """Return all the events in this site."""
         home = request.site.root_page
         return getAllEvents(request, home=home)
 
+    def _iterAllEvents(self, request):
+        """Iterate through all the events in this site, unsorted."""
+        home = request.site.root_page
+        return iterAllEvents(request, home=home)
+
+    def _getEventsFingerprint(self, request):
+        """Return a fingerprint of all the events in this site."""
+        home = request.site.root_page
+        return getEventsFingerprint(request, home=home)
+
     def _paginate(self, request, events):
+        after = self._getAfterCursor(request, events)
+        if after is not None:
+            # keyset pagination, e.g. for infinite scrolling
+            events = events.after(*after)
         paginator = Paginator(events, self.EventsPerPage)
         try:
             eventsPage = paginator.page(request.GET.get('page'))
@@ -482,8 +761,36 @@ class CalendarPage(RoutablePageMixin, Page):
             eventsPage = paginator.page(1)
         except EmptyPage:
             eventsPage = paginator.page(paginator.num_pages)
+        if hasattr(events, "cursor") and eventsPage.has_next():
+            when, pageId = events.cursor(eventsPage[-1])
+            # in UTC, so there is no + to be mistaken for a space
+            when = when.astimezone(dt.timezone.utc)
+            eventsPage.next_after = "{:%Y-%m-%dT%H:%M:%S.%f}Z,{}".format(when,
+                                                                       pageId)
         return eventsPage
 
+    def _getAfterCursor(self, request, events):
+        """
+        Parse the ?after=<datetime>,<page id> cursor, if given and the events
+        support it.  A cursor that cannot be parsed is a bad request, rather
+        than a reason to start again from the first page.
+        """
+        cursor = request.GET.get('after')
+        if not cursor or not hasattr(events, "after"):
+            return None
+        when, _, pageId = cursor.rpartition(",")
+        try:
+            when = parse_datetime(when)
+            pageId = int(pageId)
+        except ValueError:
+            when = None
+        if when is None:
+            raise SuspiciousOperation("Invalid events cursor {!r}"
+                                      .format(cursor))
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+        return (when, pageId)
+
 # ------------------------------------------------------------------------------
 class SpecificCalendarPage(ProxyPageMixin, CalendarPage):
     """
@@ -514,6 +821,10 @@ class SpecificCalendarPage(ProxyPageMixin, CalendarPage):
         """Return my child events for the given month grouped by week."""
         return getAllEventsByWeek(request, year, month, home=self)
 
+    def _getEventsByYear(self, request, year):
+        """Return my child events for the given year grouped by month and week."""
+        return getAllEventsByYear(request, year, home=self)
+
     def _getUpcomingEvents(self, request):
         """Return my upcoming child events."""
         return getAllUpcomingEvents(request, home=self)
@@ -525,14 +836,26 @@ class SpecificCalendarPage(ProxyPageMixin, CalendarPage):
     def _getEventFromUid(self, request, uid):
         """Try and find a child event with the given UID."""
         event = getEventFromUid(request, uid) # might raise exception
-        if event.get_ancestors().filter(id=self.id).exists():
+        if event.path.startswith(self.path) and event.path != self.path:
             # only return event if it is a descendant
             return event
 
+    def _getEventsFromUids(self, request, uids):
+        """Find the child events with the given UIDs."""
+        return getEventsFromUids(request, uids, home=self)
+
     def _getAllEvents(self, request):
         """Return all my child events."""
         return getAllEvents(request, home=self)
 
+    def _iterAllEvents(self, request):
+        """Iterate through all my child events, unsorted."""
+        return iterAllEvents(request, home=self)
+
+    def _getEventsFingerprint(self, request):
+        """Return a fingerprint of all my child events."""
+        return getEventsFingerprint(request, home=self)
+
 # ------------------------------------------------------------------------------
 class GeneralCalendarPage(ProxyPageMixin, CalendarPage):
     """
@@ -543,6 +866,7 @@ class GeneralCalendarPage(ProxyPageMixin, CalendarPage):
         verbose_name_plural = _("general calendar pages")
 
     is_creatable  = False  # creation is disabled by default
+    ShowsAllSites = True
 
     @classmethod
     def _allowAnotherAt(cls, parent):
@@ -563,6 +887,10 @@ class GeneralCalendarPage(ProxyPageMixin, CalendarPage):
         """Return all events for the given month grouped by week."""
         return getAllEventsByWeek(request, year, month)
 
+    def _getEventsByYear(self, request, year):
+        """Return all events for the given year grouped by month and week."""
+        return getAllEventsByYear(request, year)
+
     def _getUpcomingEvents(self, request):
         """Return all the upcoming events."""
         return getAllUpcomingEvents(request)
@@ -575,10 +903,136 @@ class GeneralCalendarPage(ProxyPageMixin, CalendarPage):
         """Try and find an event with the given UID."""
         return getEventFromUid(request, uid) # might raise exception
 
+    def _getEventsFromUids(self, request, uids):
+        """Find the events with the given UIDs."""
+        return getEventsFromUids(request, uids)
+
     def _getAllEvents(self, request):
         """Return all the events."""
         return getAllEvents(request)
 
+    def _iterAllEvents(self, request):
+        """Iterate through all the events, unsorted."""
+        return iterAllEvents(request)
+
+    def _getEventsFingerprint(self, request):
+        """Return a fingerprint of all the events."""
+        return getEventsFingerprint(request)
+
+# ------------------------------------------------------------------------------
+class ICalImportJob(models.Model):
+    """
+    An iCalendar file waiting to be, or being, imported into a calendar by the
+    joyous_import_ical management command.  The UIDs of the events loaded are
+    recorded as :class:`ICalImportedUid` rows after each batch is committed,
+    so an interrupted import can carry on from where it got to.  A running
+    job's heartbeat is recorded as it goes, so one whose process has died
+    can be told apart from one that is still being run.
+    """
+    class Meta:
+        ordering = ["created_at"]
+        verbose_name = _("iCal import job")
+        verbose_name_plural = _("iCal import jobs")
+
+    PENDING  = "pending"
+    RUNNING  = "running"
+    DONE     = "done"
+    FAILED   = "failed"
+    STATUS_CHOICES = [(PENDING, _("pending")),
+                      (RUNNING, _("running")),
+                      (DONE,    _("done")),
+                      (FAILED,  _("failed"))]
+
+    calendar = models.ForeignKey('joyous.CalendarPage',
+                                 related_name="+",
+                                 verbose_name=_("calendar"),
+                                 on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             related_name="+",
+                             verbose_name=_("user"),
+                             null=True, blank=True,
+                             on_delete=models.SET_NULL)
+    name = models.CharField(_("name"), max_length=255, blank=True)
+    data = models.BinaryField(_("data"))
+    utc2local = models.BooleanField(_("convert UTC to localtime"),
+                                    default=False)
+    publish = models.BooleanField(_("publish"), default=False)
+    status = models.CharField(_("status"), max_length=16,
+                              choices=STATUS_CHOICES, default=PENDING)
+    num_loaded = models.PositiveIntegerField(_("number loaded"), default=0)
+    num_failed = models.PositiveIntegerField(_("number failed"), default=0)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    started_at = models.DateTimeField(_("started at"), null=True, blank=True)
+    finished_at = models.DateTimeField(_("finished at"), null=True, blank=True)
+    heartbeat_at = models.DateTimeField(_("heartbeat at"), null=True, blank=True)
+    error = models.TextField(_("error"), blank=True)
+
+    def __str__(self):
+        return "{} {}".format(self.calendar, self.name)
+
+    def getLoadedUids(self):
+        """The UIDs of the events already loaded by this job."""
+        return set(self.loaded_uids.values_list('uid', flat=True))
+
+    def checkpoint(self, uids):
+        """Record that the events with these UIDs have been loaded."""
+        ICalImportedUid.objects.bulk_create([ICalImportedUid(job=self, uid=uid)
+                                             for uid in uids])
+
+    def beat(self):
+        """Record that this job is still being run."""
+        self.heartbeat_at = timezone.now()
+        ICalImportJob.objects.filter(id=self.id)                             \
+                             .update(heartbeat_at=self.heartbeat_at)
+
+class ICalImportedUid(models.Model):
+    """
+    The UID of an event that an :class:`ICalImportJob` has loaded.
+    """
+    class Meta:
+        verbose_name = _("iCal imported UID")
+        verbose_name_plural = _("iCal imported UIDs")
+
+    job = models.ForeignKey(ICalImportJob,
+                            related_name="loaded_uids",
+                            verbose_name=_("job"),
+                            on_delete=models.CASCADE)
+    uid = models.CharField(_("UID"), max_length=255)
+
+    def __str__(self):
+        return self.uid
+
+# ------------------------------------------------------------------------------
+def _makeEventRecord(thisEvent, span, now):
+    # the JSON record of an occurrence of an event, which starts and finishes
+    # at the local datetimes of span
+    page = thisEvent.page
+    fromDt, toDt = span
+    uid = getattr(page, 'uid', None)
+    if uid is None and isinstance(page, EventExceptionBase):
+        # the event being overridden might have been deleted
+        uid = getattr(page.overrides, 'uid', None)
+    return {'uid':       uid,
+            'title':     thisEvent.title,
+            'url':       thisEvent.url,
+            'start':     fromDt.isoformat() if fromDt else None,
+            'end':       toDt.isoformat() if toDt else None,
+            'allDay':    page.time_from is None,
+            'status':    _getOccurrenceStatus(page, fromDt, toDt, now),
+            'exception': getattr(page, 'slugName', None)}
+
+def _getOccurrenceStatus(page, fromDt, toDt, now):
+    # the status of just this occurrence (cancelled, started, finished or
+    # pending), rather than that of the whole event
+    if (isinstance(page, CancellationPage) and
+        not isinstance(page, PostponementPage)):
+        return "cancelled"
+    if toDt is not None and toDt < now:
+        return "finished"
+    if fromDt is not None and fromDt < now:
+        return "started"
+    return None
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
@@ -2,18 +2,23 @@
 # Joyous events models
 # ------------------------------------------------------------------------------
 import datetime as dt
+import bisect
 import calendar
+import heapq
+import threading
+from hashlib import md5
 from collections import namedtuple
-from contextlib import suppress
 from functools import partial
-from itertools import chain, groupby
-from operator import attrgetter
+from itertools import chain, groupby, islice
+from operator import attrgetter, itemgetter
 from uuid import uuid4
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist, PermissionDenied
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Q, F, Case, When, Value, Count, Max, Sum
+from django.db.models.functions import Length
 from django.db.models.query import ModelIterable
 from django.forms import widgets
 from django.template.response import TemplateResponse
@@ -23,7 +28,7 @@ from django.utils.translation import gettext_lazy as _
 from django.utils.translation import gettext
 from timezone_field import TimeZoneField
 from wagtail.core.query import PageQuerySet
-from wagtail.core.models import Page, PageManager, PageViewRestriction
+from wagtail.core.models import Page, PageManager, get_page_models
 from wagtail.core.fields import RichTextField
 from wagtail.admin.edit_handlers import (FieldPanel, MultiFieldPanel,
         PageChooserPanel)
@@ -32,10 +37,13 @@ from wagtail.images import get_image_model_string
 from wagtail.contrib.routable_page.models import RoutablePageMixin, route
 from wagtail.search import index
 from wagtail.admin.forms import WagtailAdminPageForm
-from ..holidays.parser import parseHolidays
+from ..utils.holidays import HolidayTable
 from ..utils.mixins import ProxyPageMixin
+from ..utils.cache import getCache, getGeneration, nextGeneration
+from ..utils.restrictions import getRestrictedPaths, getRestrictionProfile
 from ..utils.telltime import (getAwareDatetime, getLocalDatetime,
-        getLocalDateAndTime, getLocalDate, getLocalTime, todayUtc)
+        getLocalDatetimes, getLocalDateAndTime, getLocalDate, getLocalTime,
+        todayUtc)
 from ..utils.telltime import timeFrom, timeTo
 from ..utils.telltime import timeFormat, dateFormat
 from ..utils.weeks import week_of_month
@@ -85,13 +93,28 @@ def getAllEventsByWeek(request, year, month, *, home=None):
     return _getEventsByWeek(year, month,
                             partial(getAllEventsByDay, request, home=home))
 
+def getAllEventsByYear(request, year, *, home=None):
+    """
+    Return all the events (under home if given) for the given year, grouped by
+    month and week.  The events are fetched for the whole year at once.
+
+    :param request: Django request object
+    :param year: the year
+    :type year: int
+    :param home: only include events that are under this page (if given)
+    :returns: a list of 12 sublists (one for each month) each of which is a list of weeks as :func:`getAllEventsByWeek` returns.
+    :rtype: list of lists of lists of None or :class:`EventsOnDay <ls.joyous.models.events.EventsOnDay>` objects
+    """
+    return _getEventsByYear(year,
+                            partial(getAllEventsByDay, request, home=home))
+
 def getAllUpcomingEvents(request, *, home=None):
     """
     Return all the upcoming events (under home if given).
 
     :param request: Django request object
     :param home: only include events that are under this page (if given)
-    :rtype: list of the namedtuple ThisEvent (title, page, url)
+    :rtype: :class:`EventsByTimeList <ls.joyous.models.events.EventsByTimeList>` of the namedtuple ThisEvent (title, page, url)
     """
     qrys = [SimpleEventPage.events(request).upcoming().this(),
             MultidayEventPage.events(request).upcoming().this(),
@@ -101,9 +124,7 @@ def getAllUpcomingEvents(request, *, home=None):
                                          .this()]
     if home is not None:
         qrys = [qry.descendant_of(home) for qry in qrys]
-    events = sorted(chain.from_iterable(qrys),
-                    key=attrgetter('page._upcoming_datetime_from'))
-    return events
+    return EventsByTimeList(qrys, 'next_occurrence_at')
 
 def getGroupUpcomingEvents(request, group):
     """
@@ -113,46 +134,92 @@ def getGroupUpcomingEvents(request, group):
     :param group: for this group page
     :rtype: list of the namedtuple ThisEvent (title, page, url)
     """
-    # Get events that are a child of a group page, or a postponement or extra
-    # info a child of the recurring event child of the group
-    rrEvents = RecurringEventPage.events(request).exclude(group_page=group) \
-                                        .upcoming().child_of(group).this()
-    qrys = [SimpleEventPage.events(request).exclude(group_page=group)
-                                        .upcoming().child_of(group).this(),
-            MultidayEventPage.events(request).exclude(group_page=group)
-                                        .upcoming().child_of(group).this(),
-            rrEvents]
-    for rrEvent in rrEvents:
-        qrys += [PostponementPage.events(request).child_of(rrEvent.page)
-                                         .upcoming().this(),
-                 ExtraInfoPage.events(request).exclude(extra_title="")
-                                 .child_of(rrEvent.page).upcoming().this()]
-
-    # Get events that are linked to a group page, or a postponement or extra
-    # info a child of the recurring event linked to a group
-    rrEvents = group.recurringeventpage_set(manager='events').auth(request)  \
-                                                        .upcoming().this()
-    qrys += [group.simpleeventpage_set(manager='events').auth(request)
-                                                        .upcoming().this(),
-             group.multidayeventpage_set(manager='events').auth(request)
-                                                        .upcoming().this(),
-             rrEvents]
-    for rrEvent in rrEvents:
-        qrys += [PostponementPage.events(request).child_of(rrEvent.page)
-                                                       .upcoming().this(),
-                 ExtraInfoPage.events(request).exclude(extra_title="")
-                                 .child_of(rrEvent.page).upcoming().this()]
+    # Get events that are a child of, or linked to, a group page, and the
+    # postponements and extra info of its recurring events, with a fixed
+    # number of queries however many events the group has
+    inGroup = Page.objects.child_of_q(group) | Q(group_page=group)
+    rrEvents = RecurringEventPage.events(request).filter(inGroup).upcoming()
+    rrIds = rrEvents.order_by().values('id')
+    qrys = [SimpleEventPage.events(request).filter(inGroup).upcoming().this(),
+            MultidayEventPage.events(request).filter(inGroup).upcoming().this(),
+            rrEvents.this(),
+            PostponementPage.events(request).filter(overrides_id__in=rrIds)
+                                            .upcoming().this(),
+            ExtraInfoPage.events(request).exclude(extra_title="")
+                                         .filter(overrides_id__in=rrIds)
+                                         .upcoming().this()]
     events = sorted(chain.from_iterable(qrys),
-                    key=attrgetter('page._upcoming_datetime_from'))
+                    key=attrgetter('page.next_occurrence_at'))
     return events
 
+def getGroupUpcomingEventsCached(request, group):
+    """
+    Return all the upcoming events that are assigned to the specified group,
+    as :func:`getGroupUpcomingEvents` does, but cached (see
+    JOYOUS_GROUP_CACHE_TIMEOUT) for viewers who may see the same events.  The
+    cached events are forgotten before the first of them starts, or when an
+    event of the group is changed.
+
+    :param request: Django request object
+    :param group: for this group page
+    :rtype: list of the namedtuple ThisEvent (title, page, url)
+    """
+    if not _GROUP_CACHE_TIMEOUT:
+        return getGroupUpcomingEvents(request, group)
+    keyed = (request.get_host() if request is not None else "",
+             timezone.get_current_timezone_name(),
+             getRestrictionProfile(request) if request is not None else None,
+             getGeneration("restrictions"))
+    key = "joyous:group:{}:{}:{}".format(group.id,
+                            getGeneration("group:{}".format(group.id)),
+                            md5(repr(keyed).encode()).hexdigest())
+    cache = getCache()
+    entries = cache.get(key)
+    if entries is not None:
+        return _getEventsFromGroupEntries(entries)
+    events = getGroupUpcomingEvents(request, group)
+    timeout = _GROUP_CACHE_TIMEOUT
+    if events:
+        # they would no longer be upcoming once the first has started
+        untilStart = events[0].page.next_occurrence_at - timezone.now()
+        timeout = min(timeout, int(untilStart.total_seconds()))
+    if timeout > 0:
+        # just what is needed to fetch the pages again, not the pages
+        entries = [GroupEntry(thisEvent.title,
+                              ContentType.objects.get_for_model(thisEvent.page,
+                                               for_concrete_model=False).id,
+                              thisEvent.page.id,
+                              thisEvent.url)
+                   for thisEvent in events]
+        cache.set(key, entries, timeout)
+    return events
+
+def forgetGroupEvents(page, *, former=False):
+    """
+    Forget the cached upcoming events (see :func:`getGroupUpcomingEventsCached`)
+    of the groups this event, or event exception, page could be listed under:
+    the group it is linked to, or its parent or grandparent.  With
+    former=True, which is for calling before the page is saved, forget only
+    those of the group it is about to be unlinked from.
+
+    :param page: the event page which is changing
+    """
+    if not _GROUP_CACHE_TIMEOUT:
+        return
+    if former:
+        groupIds = _getFormerGroupIds(page)
+    else:
+        groupIds = _getGroupIds(page)
+    for groupId in groupIds:
+        nextGeneration("group:{}".format(groupId))
+
 def getAllPastEvents(request, *, home=None):
     """
     Return all the past events (under home if given).
 
     :param request: Django request object
     :param home: only include events that are under this page (if given)
-    :rtype: list of the namedtuple ThisEvent (title, page, url)
+    :rtype: :class:`EventsByTimeList <ls.joyous.models.events.EventsByTimeList>` of the namedtuple ThisEvent (title, page, url)
     """
     qrys = [SimpleEventPage.events(request).past().this(),
             MultidayEventPage.events(request).past().this(),
@@ -161,9 +228,7 @@ def getAllPastEvents(request, *, home=None):
             ExtraInfoPage.events(request).exclude(extra_title="").past().this()]
     if home is not None:
         qrys = [qry.descendant_of(home) for qry in qrys]
-    events = sorted(chain.from_iterable(qrys),
-                    key=attrgetter('page._past_datetime_from'), reverse=True)
-    return events
+    return EventsByTimeList(qrys, 'last_occurrence_at', reverse=True)
 
 def getEventFromUid(request, uid):
     """
@@ -175,25 +240,45 @@ def getEventFromUid(request, uid):
     :param uid: iCal unique identifier
     :rtype: list of event pages
     """
-    events = []
-    with suppress(ObjectDoesNotExist):
-        events.append(SimpleEventPage.objects.get(uid=uid))
-    with suppress(ObjectDoesNotExist):
-        events.append(MultidayEventPage.objects.get(uid=uid))
-    with suppress(ObjectDoesNotExist):
-        events.append(RecurringEventPage.objects.get(uid=uid))
+    entries = _getUidEntries([uid])
     # Exceptions do not have uids and are not returned by this function
 
-    if len(events) == 1:
-        if events[0].isAuthorized(request):
-            return events[0]
+    if len(entries) == 1:
+        event = _getPagesFromUidEntries(entries)[0]
+        if event.isAuthorized(request):
+            return event
         else:
             raise PermissionDenied("No authority for uid={}".format(uid))
-    elif len(events) == 0:
+    elif len(entries) == 0:
         raise ObjectDoesNotExist("No event with uid={}".format(uid))
     else:
         raise MultipleObjectsReturned("Multiple events with uid={}".format(uid))
 
+def getEventsFromUids(request, uids, *, home=None):
+    """
+    Get the events (under home if given) with any of the given UIDs.  Unlike
+    getEventFromUid this does not check the request has authority to view the
+    events, so that the caller can tell the difference between an event that
+    is not found and one that it may not see.
+
+    :param request: Django request object
+    :param uids: iCal unique identifiers
+    :param home: only include events that are under this page (if given)
+    :rtype: dict of event pages keyed by uid
+    """
+    uids = list(uids)
+    entries = []
+    for i in range(0, len(uids), _UIDS_PER_QUERY):
+        entries += _getUidEntries(uids[i:i+_UIDS_PER_QUERY])
+    if home is not None:
+        entries = [entry for entry in entries
+                   if entry.path.startswith(home.path) and
+                      entry.path != home.path]
+    events = {}
+    for event in _getPagesFromUidEntries(entries):
+        events.setdefault(event.uid, event)
+    return events
+
 def getAllEvents(request, *, home=None):
     """
     Return all the events (under home if given).
@@ -212,28 +297,173 @@ def getAllEvents(request, *, home=None):
                     key=attrgetter('_first_datetime_from'))
     return events
 
+def iterAllEvents(request, *, home=None, chunkSize=200):
+    """
+    Iterate through all the events (under home if given), fetching them from
+    the database a chunk at a time.  Unlike getAllEvents the events are not
+    sorted, but they do not all have to be held in memory at once.
+
+    :param request: Django request object
+    :param home: only include events that are under this page (if given)
+    :param chunkSize: how many events to fetch at a time
+    :rtype: iterator of event pages
+    """
+    qrys = [SimpleEventPage.events(request).all(),
+            MultidayEventPage.events(request).all(),
+            RecurringEventPage.events(request).all()]
+    # Does not return exceptions
+    if home is not None:
+        qrys = [qry.descendant_of(home) for qry in qrys]
+    return chain.from_iterable(qry.iterator(chunkSize) for qry in qrys)
+
+def getEventsFingerprint(request, *, home=None, inclusive=False):
+    """
+    Return a cheap fingerprint of all the events and exceptions (under home if
+    given).  This changes whenever one of them is edited, published,
+    unpublished, moved or deleted, so can be used to tell if anything built
+    from them is still current.
+
+    :param request: Django request object
+    :param home: only include pages that are under this page (if given)
+    :param inclusive: also include home itself
+    :returns: an entity tag
+    :rtype: str
+    """
+    pages = Page.objects.live().filter(content_type__in=_getEventContentTypes())
+    if home is not None:
+        pages = pages.descendant_of(home, inclusive=inclusive)
+    # The latest change on its own can go backwards when a page is removed,
+    # so which pages there are is part of the fingerprint too, and where they
+    # are, as moving a page changes its URL but not when it was changed
+    stats = pages.aggregate(numPages=Count('id'),
+                            sumIds=Sum('id'),
+                            latestRevision=Max('latest_revision_created_at'),
+                            lastPublished=Max('last_published_at'),
+                            lastUrlPath=Max('url_path'),
+                            sumUrlPathLengths=Sum(Length('url_path')))
+    # the events a viewer can see depend upon the restrictions they have
+    restrictions = "|".join(getRestrictedPaths(request))
+    return md5("{}:{}:{}:{}:{}:{}:{}".format(stats['latestRevision'],
+                                             stats['lastPublished'],
+                                             stats['numPages'],
+                                             stats['sumIds'],
+                                             stats['lastUrlPath'],
+                                             stats['sumUrlPathLengths'],
+                                             restrictions)
+               .encode()).hexdigest()
+
 # ------------------------------------------------------------------------------
 # Private
 # ------------------------------------------------------------------------------
+# stay well within the limits databases have on the number of query parameters
+_UIDS_PER_QUERY = 500
+
+# seconds to cache the upcoming events of a group for, 0 to not cache them
+_GROUP_CACHE_TIMEOUT = getattr(settings, "JOYOUS_GROUP_CACHE_TIMEOUT", 0)
+
+UidEntry = namedtuple("UidEntry", "uid content_type_id page_id path")
+
+def _getUidEntries(uids):
+    # Resolve the uids to where their events are with one query
+    fields = ('uid', 'content_type_id', 'id', 'path')
+    qrys = [model.objects.filter(uid__in=uids).order_by().values_list(*fields)
+            for model in (SimpleEventPage, MultidayEventPage,
+                          RecurringEventPage)]
+    qry = qrys[0].union(*qrys[1:], all=True)
+    return [UidEntry(*row) for row in qry]
+
+def _getEntryPages(entries):
+    # Fetch the pages of the uid or group entries, with one query per type of
+    # page, paired with their entries and skipping any that have gone
+    byType = {}
+    for entry in entries:
+        byType.setdefault(entry.content_type_id, []).append(entry.page_id)
+    pages = {}
+    for contentTypeId, pageIds in byType.items():
+        model = ContentType.objects.get_for_id(contentTypeId).model_class()
+        pages.update(model.objects.in_bulk(pageIds))
+    return [(entry, pages[entry.page_id]) for entry in entries
+            if entry.page_id in pages]
+
+def _getPagesFromUidEntries(entries):
+    return [page for entry, page in _getEntryPages(entries)]
+
+GroupEntry = namedtuple("GroupEntry", "title content_type_id page_id url")
+
+def _getEventsFromGroupEntries(entries):
+    return [ThisEvent(entry.title, page, entry.url)
+            for entry, page in _getEntryPages(entries)]
+
+def _getGroupIds(page):
+    # The groups this page could be listed under
+    groupIds = {getattr(page, 'group_page_id', None)}
+    overridesId = getattr(page, 'overrides_id', None)
+    if overridesId is not None:
+        groupIds.update(RecurringEventPage.objects.filter(id=overridesId)
+                                          .values_list('group_page_id',
+                                                       flat=True))
+    steplen = Page.steplen
+    ancestorPaths = [page.path[:-steplen], page.path[:-steplen * 2]]
+    groupIds.update(Page.objects.filter(path__in=ancestorPaths)
+                                .values_list('id', flat=True))
+    groupIds.discard(None)
+    return groupIds
+
+def _getFormerGroupIds(page):
+    # The group this event is about to be unlinked from
+    if page.id is None or not hasattr(page, 'group_page_id'):
+        return set()
+    formerGroupIds = set(type(page).objects.filter(id=page.id)               \
+                             .exclude(group_page_id=page.group_page_id)      \
+                             .values_list('group_page_id', flat=True))
+    formerGroupIds.discard(None)
+    return formerGroupIds
+
+def _getEventContentTypes():
+    models = [model for model in get_page_models()
+              if issubclass(model, (EventBase, EventExceptionBase))]
+    return ContentType.objects.get_for_models(*models,
+                                              for_concrete_models=False).values()
+
 def _getEventsByDay(date_from, eventsByDaySrcs):
     evods = []
     day = date_from
     for srcs in zip(*eventsByDaySrcs):
-        days_events       = []
+        # each source's days_events are already in order of their start times
+        keyed = heapq.merge(*(zip(_getSortKeys(src), src.days_events,
+                                  _getSpans(src)[:len(src.days_events)])
+                              for src in srcs), key=itemgetter(0))
+        days_events = []
+        spans = []
+        for sortKey, thisEvent, span in keyed:
+            days_events.append(thisEvent)
+            spans.append(span)
         continuing_events = []
         for src in srcs:
-            days_events += src.days_events
             continuing_events += src.continuing_events
-        def sortByTime(thisEvent):
-            fromTime = thisEvent.page._getFromTime(atDate=day)
-            if fromTime is None:
-                fromTime = dt.time.max
-            return fromTime
-        days_events.sort(key=sortByTime)
-        evods.append(EventsOnDay(day, days_events, continuing_events))
+            spans += _getSpans(src)[len(src.days_events):]
+        evods.append(EventsOnDay(day, days_events, continuing_events,
+                                 spans=spans))
         day += _1day
     return evods
 
+def _getSortKeys(evod):
+    if evod._sortKeys is not None:
+        return evod._sortKeys
+    sortKeys = []
+    for thisEvent in evod.days_events:
+        fromTime = thisEvent.page._getFromTime(atDate=evod.date)
+        if fromTime is None:
+            sortKeys.append(dt.time.max)
+        else:
+            sortKeys.append(fromTime.replace(tzinfo=None))
+    return sortKeys
+
+def _getSpans(evod):
+    if evod._spans is not None:
+        return evod._spans
+    return [None] * len(evod.all_events)
+
 def _getEventsByWeek(year, month, eventsByDaySrc):
     weeks = []
     firstDay = dt.date(year, month, 1)
@@ -252,6 +482,17 @@ def _getEventsByWeek(year, month, eventsByDaySrc):
         weeks.append(week)
     return weeks
 
+def _getEventsByYear(year, eventsByDaySrc):
+    firstDay = dt.date(year, 1, 1)
+    lastDay  = dt.date(year, 12, 31)
+    events = eventsByDaySrc(firstDay, lastDay)
+    firstOrd = firstDay.toordinal()
+    def sliceEventsByDay(fromDate, toDate):
+        return events[fromDate.toordinal() - firstOrd:
+                      toDate.toordinal() - firstOrd + 1]
+    return [_getEventsByWeek(year, month, sliceEventsByDay)
+            for month in range(1, 13)]
+
 # ------------------------------------------------------------------------------
 # Helper types and constants
 # ------------------------------------------------------------------------------
@@ -262,7 +503,28 @@ class EventsOnDay(namedtuple("EODBase", "date days_events continuing_events")):
     The events that occur on a certain day.  Both events that start on that day
     and events that are still continuing.
     """
-    holidays = parseHolidays(getattr(settings, "JOYOUS_HOLIDAYS", ""))
+    holidays = HolidayTable(getattr(settings, "JOYOUS_HOLIDAYS", ""))
+
+    def __new__(cls, date, days_events, continuing_events, sortKeys=None,
+                spans=None):
+        self = super().__new__(cls, date, days_events, continuing_events)
+        # the times days_events start at, for merging them in order
+        self._sortKeys = sortKeys
+        # the local (start, finish) datetimes of each of all_events, where
+        # they are known
+        self._spans = spans
+        return self
+
+    _sortKeys = None
+    _spans = None
+
+    @property
+    def all_spans(self):
+        """
+        The datetimes that each of all_events starts and finishes (in the
+        local time zone), or None where that is not known.
+        """
+        return _getSpans(self)
 
     @property
     def all_events(self):
@@ -294,28 +556,162 @@ class EventsOnDay(namedtuple("EODBase", "date days_events continuing_events")):
         """
         return self.holidays.get(self.date)
 
-class EventsByDayList(list):
+class EventsByDayList:
+    """
+    The events between two dates, grouped by day.  Each event is recorded just
+    once, as the span of days it is on, and the days it covers are only built
+    as they are iterated over, so long multi-day events cost no more than
+    short ones.
+    """
     def __init__(self, fromDate, toDate):
         self.fromOrd = fromDate.toordinal()
         self.toOrd   = toDate.toordinal()
-        super().__init__(EventsOnDay(dt.date.fromordinal(ord), [], [])
-                         for ord in range(self.fromOrd, self.toOrd+1))
+        self.spans   = []
 
-    def add(self, thisEvent, pageFromDate, pageToDate):
+    def add(self, thisEvent, pageFromDate, pageToDate, fromTime=None,
+            span=None):
+        """
+        Add an event which is on the days from pageFromDate to pageToDate, and
+        starts at fromTime (local time) if it has a start time.  The span of
+        local datetimes this occurrence starts and finishes at may be given
+        too.
+        """
         pageFromOrd = pageFromDate.toordinal()
-        pageToOrd   = pageToDate.toordinal()
-        dayNum = pageFromOrd - self.fromOrd
-        if 0 <= dayNum <= self.toOrd - self.fromOrd:
-            self[dayNum].days_events.append(thisEvent)
-
-        for pageOrd in range(pageFromOrd + 1, pageToOrd + 1):
-            dayNum = pageOrd - self.fromOrd
-            if 0 <= dayNum <= self.toOrd - self.fromOrd:
-                self[dayNum].continuing_events.append(thisEvent)
+        pageToOrd   = max(pageToDate.toordinal(), pageFromOrd)
+        if pageToOrd < self.fromOrd or pageFromOrd > self.toOrd:
+            return
+        # events starting on the same day are shown in order of their times
+        if fromTime is None:
+            sortKey = dt.time.max
+        else:
+            sortKey = fromTime.replace(tzinfo=None)
+        self.spans.append(_EventSpan(pageFromOrd, pageToOrd, sortKey,
+                                     len(self.spans), thisEvent, span))
+
+    def __iter__(self):
+        # sweep through the days, keeping the events that started before
+        # each one, and have not yet finished, in the order they were added
+        starts = sorted(self.spans, key=attrgetter('fromOrd', 'sortKey', 'seq'))
+        nextStart = 0
+        continuing = []
+        for ord in range(self.fromOrd, self.toOrd + 1):
+            continuing = [span for span in continuing if span.toOrd >= ord]
+            days = []
+            while (nextStart < len(starts) and
+                   starts[nextStart].fromOrd <= ord):
+                span = starts[nextStart]
+                nextStart += 1
+                if span.fromOrd == ord:
+                    days.append(span)
+                else:
+                    # it started before the first day
+                    bisect.insort(continuing, span)
+            yield EventsOnDay(dt.date.fromordinal(ord),
+                              [span.thisEvent for span in days],
+                              [span.thisEvent for span in continuing],
+                              [span.sortKey for span in days],
+                              [span.span for span in days + continuing])
+            for span in days:
+                if span.toOrd > ord:
+                    bisect.insort(continuing, span)
+
+class _EventSpan(namedtuple("_EventSpan",
+                            "fromOrd toOrd sortKey seq thisEvent span")):
+    # spans are ordered by when they were added
+    def __lt__(self, other):
+        return self.seq < other.seq
+
+class EventsByTimeList:
+    """
+    The events from several querysets, each already ordered by time, merged
+    into one lazy sequence.  Only as many events as are needed are fetched, so
+    this can be given to a Paginator.
+    """
+    def __init__(self, qrys, attribute, reverse=False):
+        self.qrys      = qrys
+        self.attribute = attribute
+        self.reverse   = reverse
+        self._count    = None
+        self._results  = None
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        if self._results is None:
+            self._results = list(self.__merge(qry.iterator()
+                                              for qry in self.qrys))
+        return iter(self._results)
+
+    def __getitem__(self, index):
+        if self._results is not None:
+            return self._results[index]
+        if isinstance(index, slice):
+            if index.step is not None:
+                return list(self)[index]
+            start = index.start or 0
+            stop  = index.stop
+            if start < 0 or (stop is not None and stop < 0):
+                return list(self)[index]
+            if stop is None:
+                return list(islice(self, start, None))
+            return list(islice(self.__merge(qry[:stop] for qry in self.qrys),
+                               start, stop))
+        if index < 0:
+            return list(self)[index]
+        events = self[index:index+1]
+        if not events:
+            raise IndexError("list index out of range")
+        return events[0]
+
+    def count(self):
+        """
+        The number of events.
+        """
+        if self._results is not None:
+            return len(self._results)
+        if self._count is None:
+            self._count = sum(qry.count() for qry in self.qrys)
+        return self._count
+
+    def after(self, when, pageId):
+        """
+        The events that come after the event at this time with this page id,
+        for keyset pagination.
+        """
+        op = "lt" if self.reverse else "gt"
+        qrys = []
+        for qry in self.qrys:
+            field = qry._getTimeField(self.attribute)
+            q = (Q(**{"{}__{}".format(field, op): when}) |
+                 Q(**{field: when, "id__{}".format(op): pageId}))
+            qrys.append(qry.filter(q))
+        return EventsByTimeList(qrys, self.attribute, self.reverse)
+
+    def cursor(self, event):
+        """
+        The key of this event, for passing to after.
+        """
+        return (getattr(event.page, self.attribute), event.page.id)
+
+    def __merge(self, iterables):
+        return heapq.merge(*iterables, key=self.cursor, reverse=self.reverse)
 
 _1day  = dt.timedelta(days=1)
 _2days = dt.timedelta(days=2)
 
+# What RecurringEventPages memoize is only kept for the request it was worked
+# out in, as the same instance might be handed out again after an exception
+# page has been changed elsewhere
+_memoScope = threading.local()
+
+def forgetOccurrenceMemos():
+    """
+    Start a new scope for the exceptions and occurrences that
+    RecurringEventPages memoize in this thread, e.g. at each new request.
+    """
+    _memoScope.current = object()
+
 # ------------------------------------------------------------------------------
 # Event models
 # ------------------------------------------------------------------------------
@@ -341,16 +737,34 @@ class EventManager(PageManager):
         # a shortcut
         return self.get_queryset().auth(request)
 
+class EventIterable(ModelIterable):
+    """
+    Yields the event pages, with the occurrence times worked out for those
+    whose stored times are out of date.
+    """
+    def __iter__(self):
+        liveTimes = self.queryset.liveTimes or {}
+        for page in super().__iter__():
+            times = liveTimes.get(page.id)
+            if times is not None:
+                page.next_occurrence_at, page.last_occurrence_at = times
+            yield page
+
 class EventQuerySet(PageQuerySet):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.request    = None
         self.postFilter = None
+        self.liveTimes  = None
+        self.timeFields = None
+        self._iterable_class = EventIterable
 
     def _clone(self):
         qs = super()._clone()
         qs.request    = self.request
         qs.postFilter = self.postFilter
+        qs.liveTimes  = self.liveTimes
+        qs.timeFields = self.timeFields
         return qs
 
     def _fetch_all(self):
@@ -368,6 +782,22 @@ class EventQuerySet(PageQuerySet):
         qs.postFilter = self.__predicateBasedOn('_past_datetime_from')
         return qs
 
+    def _upcomingByTimes(self):
+        now = timezone.now()
+        nextAt = self._getTimeField('next_occurrence_at')
+        return self.filter(**{nextAt+'__gte': now})                          \
+                   .order_by(nextAt, 'id')
+
+    def _pastByTimes(self):
+        now = timezone.now()
+        lastAt = self._getTimeField('last_occurrence_at')
+        return self.filter(**{lastAt+'__lt': now})                           \
+                   .order_by('-'+lastAt, '-id')
+
+    def _getTimeField(self, attribute):
+        # What to filter and order on for this occurrence time
+        return (self.timeFields or {}).get(attribute, attribute)
+
     def __predicateBasedOn(self, attribute):
         def predicate(item):
             for event in getattr(item, 'days_events', [item]):
@@ -379,7 +809,7 @@ class EventQuerySet(PageQuerySet):
 
     def this(self):
         request = self.request
-        class ThisEventIterable(ModelIterable):
+        class ThisEventIterable(EventIterable):
             def __iter__(self):
                 for page in super().__iter__():
                     yield ThisEvent(page.title, page, page.get_url(request))
@@ -388,28 +818,9 @@ class EventQuerySet(PageQuerySet):
         return qs
 
     def authorized_q(self, request):
-        PASSWORD = PageViewRestriction.PASSWORD
-        LOGIN    = PageViewRestriction.LOGIN
-        GROUPS   = PageViewRestriction.GROUPS
-        KEY      = PageViewRestriction.passed_view_restrictions_session_key
-
-        restrictions = PageViewRestriction.objects.all()
-        passed = request.session.get(KEY, [])
-        if passed:
-            restrictions = restrictions.exclude(id__in=passed,
-                                                restriction_type=PASSWORD)
-        if request.user.is_authenticated:
-            restrictions = restrictions.exclude(restriction_type=LOGIN)
-        if request.user.is_superuser:
-            restrictions = restrictions.exclude(restriction_type=GROUPS)
-        else:
-            membership = request.user.groups.all()
-            if membership:
-                restrictions = restrictions.exclude(groups__in=membership,
-                                                    restriction_type=GROUPS)
         q = Q()
-        for restriction in restrictions:
-            q &= ~self.descendant_of_q(restriction.page, inclusive=True)
+        for path in getRestrictedPaths(request):
+            q &= ~Q(path__startswith=path)
         return q
 
     def auth(self, request):
@@ -474,6 +885,16 @@ class EventBase(models.Model):
     location = models.CharField(_("location"), max_length=255, blank=True)
     website = models.URLField(_("website"), blank=True)
 
+    # When this event next and last starts, kept up to date so that the
+    # database can find and order the upcoming and past events
+    next_occurrence_at = models.DateTimeField(null=True, blank=True,
+                                              editable=False, db_index=True)
+    last_occurrence_at = models.DateTimeField(null=True, blank=True,
+                                              editable=False, db_index=True)
+    # When those were calculated, or None if they have not been yet
+    occurrence_times_at = models.DateTimeField(null=True, blank=True,
+                                               editable=False)
+
     search_fields = Page.search_fields + [
         index.SearchField('location'),
         index.SearchField('details'),
@@ -535,6 +956,30 @@ class EventBase(models.Model):
         """
         raise NotImplementedError()
 
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is None:
+            self._setOccurrenceTimes()
+        super().save(*args, **kwargs)
+
+    def _setOccurrenceTimes(self):
+        """
+        Set when this event next and last starts.
+        """
+        fromDt = self._getMyFromDt()
+        self.next_occurrence_at = fromDt
+        self.last_occurrence_at = fromDt
+        self.occurrence_times_at = timezone.now()
+
+    def _refreshOccurrenceTimes(self):
+        """
+        Recalculate and store when this event next and last starts.
+        """
+        self._setOccurrenceTimes()
+        type(self).objects.filter(id=self.id)                                \
+                          .update(next_occurrence_at=self.next_occurrence_at,
+                                  last_occurrence_at=self.last_occurrence_at,
+                                  occurrence_times_at=self.occurrence_times_at)
+
     @property
     def status_text(self):
         """
@@ -609,6 +1054,20 @@ class EventBase(models.Model):
         """
         raise NotImplementedError()
 
+    def _getMyFromDt(self):
+        """
+        Datetime that the event starts (in the event's own time zone), or the
+        end of its first day if it has no start time.
+        """
+        raise NotImplementedError()
+
+    def _getLocalSpan(self, atDate):
+        """
+        Datetimes that the occurrence of the event which is on the given date
+        starts and finishes (in the local time zone).
+        """
+        raise NotImplementedError()
+
 def removeContentPanels(remove):
     """
     Remove the panels and so hide the fields named.
@@ -622,12 +1081,10 @@ def removeContentPanels(remove):
 # ------------------------------------------------------------------------------
 class SimpleEventQuerySet(EventQuerySet):
     def upcoming(self):
-        qs = super().upcoming()
-        return qs.filter(date__gte = todayUtc() - _1day)
+        return self._upcomingByTimes()
 
     def past(self):
-        qs = super().past()
-        return qs.filter(date__lte = todayUtc() + _1day)
+        return self._pastByTimes()
 
     def byDay(self, fromDate, toDate):
         request = self.request
@@ -635,13 +1092,14 @@ class SimpleEventQuerySet(EventQuerySet):
             def __iter__(self):
                 evods = EventsByDayList(fromDate, toDate)
                 for page in super().__iter__():
-                    pageFromDate = getLocalDate(page.date,
-                                                page.time_from, page.tz)
+                    pageFromDate, fromTime = getLocalDateAndTime(page.date,
+                                                    page.time_from, page.tz)
                     pageToDate   = getLocalDate(page.date,
                                                 page.time_to, page.tz)
                     thisEvent = ThisEvent(page.title, page,
                                           page.get_url(request))
-                    evods.add(thisEvent, pageFromDate, pageToDate)
+                    evods.add(thisEvent, pageFromDate, pageToDate, fromTime,
+                              page._getLocalSpan())
                 yield from evods
 
         qs = self._clone()
@@ -711,15 +1169,27 @@ class SimpleEventPage(EventBase, Page):
         """
         return getLocalDatetime(self.date, self.time_from, self.tz)
 
+    def _getMyFromDt(self):
+        """
+        Datetime that the event starts (in the event's own time zone).
+        """
+        return getAwareDatetime(self.date, self.time_from, self.tz)
+
+    def _getLocalSpan(self, atDate=None):
+        """
+        Datetimes that the event starts and finishes (in the local time zone).
+        """
+        return (getLocalDatetime(self.date, self.time_from, self.tz,
+                                 dt.time.min),
+                getLocalDatetime(self.date, self.time_to, self.tz))
+
 # ------------------------------------------------------------------------------
 class MultidayEventQuerySet(EventQuerySet):
     def upcoming(self):
-        qs = super().upcoming()
-        return qs.filter(date_from__gte = todayUtc() - _1day)
+        return self._upcomingByTimes()
 
     def past(self):
-        qs = super().past()
-        return qs.filter(date_from__lte = todayUtc() + _1day)
+        return self._pastByTimes()
 
     def byDay(self, fromDate, toDate):
         request = self.request
@@ -727,13 +1197,14 @@ class MultidayEventQuerySet(EventQuerySet):
             def __iter__(self):
                 evods = EventsByDayList(fromDate, toDate)
                 for page in super().__iter__():
-                    pageFromDate = getLocalDate(page.date_from,
-                                                page.time_from, page.tz)
+                    pageFromDate, fromTime = getLocalDateAndTime(page.date_from,
+                                                    page.time_from, page.tz)
                     pageToDate   = getLocalDate(page.date_to,
                                                 page.time_to, page.tz)
                     thisEvent = ThisEvent(page.title, page,
                                           page.get_url(request))
-                    evods.add(thisEvent, pageFromDate, pageToDate)
+                    evods.add(thisEvent, pageFromDate, pageToDate, fromTime,
+                              page._getLocalSpan())
                 yield from evods
 
         qs = self._clone()
@@ -815,18 +1286,100 @@ class MultidayEventPage(EventBase, Page):
         """
         return getLocalDatetime(self.date_from, self.time_from, self.tz)
 
+    def _getMyFromDt(self):
+        """
+        Datetime that the event starts (in the event's own time zone).
+        """
+        return getAwareDatetime(self.date_from, self.time_from, self.tz)
+
+    def _getLocalSpan(self, atDate=None):
+        """
+        Datetimes that the event starts and finishes (in the local time zone).
+        """
+        return (getLocalDatetime(self.date_from, self.time_from, self.tz,
+                                 dt.time.min),
+                getLocalDatetime(self.date_to, self.time_to, self.tz))
+
 # ------------------------------------------------------------------------------
 class RecurringEventQuerySet(EventQuerySet):
+    def upcoming(self):
+        return self._withLiveTimes()._upcomingByTimes()
+
+    def past(self):
+        # the last occurrence of an all day event can still be later today
+        qs = self._withLiveTimes()
+        lastAt = qs._getTimeField('last_occurrence_at')
+        return qs.filter(**{lastAt+'__isnull': False})                       \
+                 .order_by('-'+lastAt, '-id')
+
+    def _withLiveTimes(self):
+        # The stored times of the events whose next occurrence has started are
+        # out of date until they are saved again or the
+        # joyous_refresh_occurrences command catches them up.  Work out the
+        # times of those in scope here, without storing them, and have the
+        # database filter and order on them in place of the stored ones.
+        stale = list(self.filter(self.__staleTimes()).order_by())
+        qs = self._clone()
+        if not stale:
+            return qs
+        liveTimes = {}
+        for page in stale:
+            page._setOccurrenceTimes()
+            liveTimes[page.id] = (page.next_occurrence_at,
+                                  page.last_occurrence_at)
+        qs = qs.annotate(live_next_at=self.__liveTimeCase(liveTimes, 0,
+                                                  'next_occurrence_at'),
+                         live_last_at=self.__liveTimeCase(liveTimes, 1,
+                                                  'last_occurrence_at'))
+        qs.liveTimes  = liveTimes
+        qs.timeFields = {'next_occurrence_at': 'live_next_at',
+                         'last_occurrence_at': 'live_last_at'}
+        return qs
+
+    def __liveTimeCase(self, liveTimes, index, attribute):
+        field = models.DateTimeField()
+        whens = [When(id=pageId, then=Value(times[index], output_field=field))
+                 for pageId, times in liveTimes.items()]
+        return Case(*whens, default=F(attribute), output_field=field)
+
+    def __staleTimes(self):
+        # The occurrence times are out of date once the next occurrence has
+        # started, or if the clock has been turned back since they were
+        # calculated.  (Times never calculated are filled in by the
+        # 0018_populate_occurrence_times migration and the
+        # joyous_refresh_occurrences command, not here.)
+        now = timezone.now()
+        return (Q(next_occurrence_at__lt=now) |
+                Q(occurrence_times_at__gt=now))
+
     def byDay(self, fromDate, toDate):
         request = self.request
+        dateRange = (fromDate - _2days, toDate + _2days)
+        # the occurrences which are on any of the days, in local time
+        localTZ = timezone.get_current_timezone()
+        startRange = (getAwareDatetime(fromDate, dt.time.min, localTZ),
+                      getAwareDatetime(toDate, dt.time.max, localTZ))
 
         class ByDayIterable(ModelIterable):
             def __iter__(self):
                 evods = EventsByDayList(fromDate, toDate)
-                for page in super().__iter__():
-                    exceptions = self.__getExceptionsFor(page)
-                    for occurence in page.repeat.between(fromDate - _2days,
-                                                         toDate + _2days, True):
+                pages = list(super().__iter__())
+                if not pages:
+                    yield from evods
+                    return
+                pageIds = self.queryset.order_by().values('pk')
+                materialized, kinds = self.__getMaterializedOccurrences(pageIds)
+                if any(not self.__isMaterialized(page) for page in pages):
+                    # the exceptions of these have to be looked for
+                    kinds = {"extra-info", "cancellation"}
+                allExceptions = self.__getExceptions(pageIds, pages, kinds)
+                for page in pages:
+                    exceptions = allExceptions.get(page.id, {})
+                    if self.__isMaterialized(page):
+                        spans = materialized.get(page.id, [])
+                    else:
+                        spans = self.__getSpans(page)
+                    for occurence, fromDt, toDt in spans:
                         thisEvent = None
                         exception = exceptions.get(occurence)
                         if exception:
@@ -835,44 +1388,127 @@ class RecurringEventQuerySet(EventQuerySet):
                         else:
                             thisEvent = ThisEvent(page.title, page,
                                                   page.get_url(request))
-                        if thisEvent:
-                            pageFromDate = getLocalDate(occurence,
-                                                        page.time_from, page.tz)
-                            daysDelta = dt.timedelta(days=page.num_days - 1)
-                            pageToDate = getLocalDate(occurence + daysDelta,
-                                                      page.time_to, page.tz)
-                            evods.add(thisEvent, pageFromDate, pageToDate)
+                        if not thisEvent:
+                            continue
+                        if page.time_from is not None:
+                            fromTime = fromDt.time()
+                            dayDt = fromDt
+                        else:
+                            # all day events are put on the day they end
+                            fromTime = None
+                            dayDt = getLocalDatetime(occurence, None, page.tz)
+                        evods.add(thisEvent, dayDt.date(), toDt.date(),
+                                  fromTime, (fromDt, toDt))
                 yield from evods
 
-            def __getExceptionsFor(self, page):
-                dateRange = (fromDate - _2days, toDate + _2days)
+            def __isMaterialized(self, page):
+                return (page.occurrences_until is not None and
+                        page.occurrences_until >= dateRange[1])
+
+            def __getMaterializedOccurrences(self, pageIds):
+                # One indexed query on when the occurrences start and finish,
+                # which also says which kinds of exceptions are needed
+                materialized = {}
+                kinds = set()
+                occurrences = EventOccurrence.objects                        \
+                                     .filter(event__in=pageIds,
+                                             start__lte=startRange[1],
+                                             finish__gte=startRange[0])      \
+                                     .order_by('start')                      \
+                                     .values_list('event_id', 'date', 'start',
+                                                  'finish', 'exception')
+                for eventId, occurence, start, finish, kind in occurrences:
+                    materialized.setdefault(eventId, [])                     \
+                                .append((occurence,
+                                         start.astimezone(localTZ),
+                                         finish.astimezone(localTZ)))
+                    if kind == "postponement":
+                        kind = "cancellation"
+                    if kind:
+                        kinds.add(kind)
+                return materialized, kinds
+
+            def __getSpans(self, page):
+                # convert all the occurrences to local time together
+                occurences = page.repeat.between(*dateRange, True)
+                daysDelta = dt.timedelta(days=page.num_days - 1)
+                starts = [(occurence, page.time_from, page.tz)
+                          for occurence in occurences]
+                finishes = [(occurence + daysDelta, page.time_to, page.tz)
+                            for occurence in occurences]
+                return zip(occurences,
+                           getLocalDatetimes(starts, dt.time.min),
+                           getLocalDatetimes(finishes))
+
+            def __getExceptions(self, pageIds, pages, kinds):
+                # Fetch the exceptions of all the pages at once, grouped by
+                # the id of the recurring event that they override, but only
+                # of the kinds which there are
+                titles = {page.id: page.title for page in pages}
                 exceptions = {}
-                for extraInfo in ExtraInfoPage.events(request).child_of(page)\
-                                     .filter(except_date__range=dateRange):
-                    title = extraInfo.extra_title or page.title
+                if "extra-info" in kinds:
+                    self.__addExtraInfo(exceptions, pageIds, titles)
+                if "cancellation" in kinds:
+                    self.__addCancellations(exceptions, pageIds)
+                return exceptions
+
+            def __addExtraInfo(self, exceptions, pageIds, titles):
+                for extraInfo in ExtraInfoPage.events(request)               \
+                                     .filter(overrides__in=pageIds,
+                                             except_date__range=dateRange)   \
+                                     .select_related('overrides'):
+                    title = (extraInfo.extra_title or
+                             titles.get(extraInfo.overrides_id))
                     exceptDate = extraInfo.except_date
-                    exceptions[exceptDate] = ThisEvent(title, extraInfo,
+                    exceptions.setdefault(extraInfo.overrides_id, {})        \
+                              [exceptDate] = ThisEvent(title, extraInfo,
                                                        extraInfo.get_url(request))
-                for cancellation in CancellationPage.events.child_of(page)   \
-                                     .filter(except_date__range=dateRange):
+
+            def __addCancellations(self, exceptions, pageIds):
+                cancellations = list(CancellationPage.events                 \
+                                     .filter(overrides__in=pageIds,
+                                             except_date__range=dateRange)   \
+                                     .select_related('postponementpage',
+                                                     'overrides'))
+                authorized = self.__getAuthorized(cancellations)
+                for cancellation in cancellations:
                     url = cancellation.get_url(request)
                     if hasattr(cancellation, "postponementpage"):
                         if url[-1] != '/':
                             url += "/from"
                         else:
                             url += "from/"
-                    if cancellation.isAuthorized(request):
+                    if cancellation.id in authorized:
                         title = cancellation.cancellation_title
                     else:
                         title = None
                         url = None
                     exceptDate = cancellation.except_date
-                    exceptions[exceptDate] = ThisEvent(title, cancellation, url)
-                return exceptions
-
+                    exceptions.setdefault(cancellation.overrides_id, {})     \
+                              [exceptDate] = ThisEvent(title, cancellation, url)
+
+            def __getAuthorized(self, cancellations):
+                if not cancellations:
+                    return set()
+                if request is None:
+                    return {cancellation.id for cancellation in cancellations
+                            if cancellation.isAuthorized(request)}
+                ids = [cancellation.id for cancellation in cancellations]
+                return set(CancellationPage.events(request)                  \
+                                           .filter(id__in=ids)               \
+                                           .values_list('id', flat=True))
+
+        # Only recurring events that have an occurrence in the date range,
+        # or that have not been materialized that far, are of interest
+        materialized = EventOccurrence.objects                               \
+                                      .filter(start__lte=startRange[1],
+                                              finish__gte=startRange[0])     \
+                                      .values('event_id')
         qs = self._clone()
         qs._iterable_class = ByDayIterable
-        return qs
+        return qs.filter(Q(occurrences_until__isnull=True) |
+                         Q(occurrences_until__lt=dateRange[1]) |
+                         Q(id__in=materialized))
 
 # Panel trickery needed as editing proxy models doesn't work yet :-(
 class HiddenNumDaysPanel(FieldPanel):
@@ -923,6 +1559,9 @@ class RecurringEventPage(EventBase, Page):
                      'joyous.PostponementPage']
     base_form_class = RecurringEventPageForm
 
+    # How many days ahead to materialize the occurrences of open-ended rules
+    OccurrencesHorizon = getattr(settings, "JOYOUS_OCCURRENCES_HORIZON", 730)
+
     # FIXME So that Fred can't cancel Barney's event
     # owner_subpages_only = True
 
@@ -930,6 +1569,9 @@ class RecurringEventPage(EventBase, Page):
     num_days = models.IntegerField(_("number of days"), default=1,
                                    validators=[MinValueValidator(1),
                                                MaxValueValidator(99)])
+    # The date up to which the occurrences of this event have been
+    # materialized, or None if they have not been
+    occurrences_until = models.DateField(null=True, blank=True, editable=False)
 
     # TODO 
     # exclude_holidays = models.BooleanField(default=False)
@@ -1089,6 +1731,26 @@ class RecurringEventPage(EventBase, Page):
         myNow = timezone.localtime(timezone=self.tz)
         return self.__after(myNow) or self.__before(myNow)
 
+    def _getLocalSpan(self, atDate):
+        """
+        Datetimes that the occurrence of the event which is on the given date
+        starts and finishes (in the local time zone), or (None, None) if
+        there is no such occurrence.
+
+        (Cancellations are not excluded.)
+        """
+        daysDelta = dt.timedelta(days=self.num_days - 1)
+        # allow a day either way for the difference in time zones
+        myDate = self.repeat.before(atDate + _1day, inc=True)
+        while myDate is not None and myDate >= atDate - daysDelta - _1day:
+            fromDt = getLocalDatetime(myDate, self.time_from, self.tz,
+                                      dt.time.min)
+            toDt = getLocalDatetime(myDate + daysDelta, self.time_to, self.tz)
+            if fromDt.date() <= atDate <= toDt.date():
+                return (fromDt, toDt)
+            myDate = self.repeat.before(myDate)
+        return (None, None)
+
     def _futureExceptions(self, request):
         """
         Returns all future extra info, cancellations and postponements created
@@ -1129,6 +1791,68 @@ class RecurringEventPage(EventBase, Page):
                                      event.url, retval)
         return retval
 
+    def save(self, *args, **kwargs):
+        self._forgetOccurrences()
+        if kwargs.get('update_fields') is None:
+            # the rule might have changed, so the materialized occurrences
+            # are not to be trusted until they are refreshed on publishing
+            self.occurrences_until = None
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self._forgetOccurrences()
+        super().refresh_from_db(*args, **kwargs)
+
+    def __getstate__(self):
+        # the memo only holds for this instance, don't let it travel
+        state = super().__getstate__().copy()
+        state.pop('_occurrenceMemo', None)
+        return state
+
+    def _forgetOccurrences(self):
+        """
+        Forget the exceptions and occurrences memoized for this instance.
+        """
+        self.__dict__.pop('_occurrenceMemo', None)
+
+    def __getMemo(self):
+        # The exceptions and occurrences worked out for this instance are
+        # remembered until the end of the request, or until it is saved or
+        # refreshed.  This saves repeating the same queries for each of the
+        # properties a page of events displays.
+        scope = getattr(_memoScope, 'current', None)
+        memo = self.__dict__.get('_occurrenceMemo')
+        if memo is None or memo[0] is not scope:
+            memo = self.__dict__['_occurrenceMemo'] = (scope, {})
+        return memo[1]
+
+    def __getCancelledDates(self):
+        memo = self.__getMemo()
+        if 'cancelled' not in memo:
+            memo['cancelled'] = frozenset(CancellationPage.events
+                                          .child_of(self)
+                                          .values_list('except_date',
+                                                       flat=True))
+        return memo['cancelled']
+
+    def __getExtraInfoDates(self):
+        memo = self.__getMemo()
+        if 'extraInfo' not in memo:
+            memo['extraInfo'] = frozenset(ExtraInfoPage.events
+                                          .child_of(self)
+                                          .exclude(extra_title="")
+                                          .values_list('except_date',
+                                                       flat=True))
+        return memo['extraInfo']
+
+    def __getPostponements(self):
+        memo = self.__getMemo()
+        if 'postponements' not in memo:
+            memo['postponements'] = list(PostponementPage.events
+                                         .child_of(self)
+                                         .order_by('date', 'time_from'))
+        return memo['postponements']
+
     def _occursOn(self, myDate):
         """
         Returns true iff an occurence of this event starts on this date
@@ -1136,14 +1860,101 @@ class RecurringEventPage(EventBase, Page):
 
         (Does not include postponements, but does exclude cancellations.)
         """
-        # TODO analyse which is faster (rrule or db) and test that first
-        if myDate not in self.repeat:
+        if not self.repeat.contains(myDate):
             return False
-        if CancellationPage.events.child_of(self)                            \
-                           .filter(except_date=myDate).exists():
+        if myDate in self.__getCancelledDates():
             return False
         return True
 
+    def _setOccurrenceTimes(self):
+        """
+        Set when this event next and last starts (not including cancellations
+        or extra info).
+        """
+        myNow = timezone.localtime(timezone=self.tz)
+        self.next_occurrence_at = self.__after(myNow, excludeExtraInfo=True,
+                                               timeDefault=dt.time.max)
+        self.last_occurrence_at = self.__before(myNow, excludeExtraInfo=True,
+                                                timeDefault=dt.time.max)
+        self.occurrence_times_at = timezone.now()
+
+    def _refreshOccurrenceTimes(self):
+        """
+        Recalculate and store when this event and its exceptions next and
+        last start.
+        """
+        super()._refreshOccurrenceTimes()
+        for ExceptionCls in (ExtraInfoPage, PostponementPage):
+            for page in ExceptionCls.objects.child_of(self):
+                page._refreshOccurrenceTimes()
+
+    def _refreshOccurrences(self):
+        """
+        Rebuild the materialized occurrences of this event.  Occurrences of an
+        open-ended rule are only materialized up to the OccurrencesHorizon.
+        """
+        with transaction.atomic():
+            EventOccurrence.objects.filter(event=self).delete()
+            until = None
+            if self.live:
+                until = dt.date.max
+                horizon = todayUtc() + dt.timedelta(days=self.OccurrencesHorizon)
+                exceptions = self.__getExceptionKinds()
+                daysDelta = dt.timedelta(days=self.num_days - 1)
+                occurrences = []
+                for occurence in self.repeat:
+                    if occurence > horizon:
+                        until = horizon
+                        break
+                    occurrences.append(EventOccurrence(event=self,
+                        date=occurence,
+                        start=getAwareDatetime(occurence, self.time_from,
+                                               self.tz, dt.time.min),
+                        finish=getAwareDatetime(occurence + daysDelta,
+                                                self.time_to,
+                                                self.tz, dt.time.max),
+                        exception=exceptions.get(occurence, "")))
+                EventOccurrence.objects.bulk_create(occurrences)
+            RecurringEventPage.objects.filter(id=self.id)                     \
+                                      .update(occurrences_until=until)
+            self.occurrences_until = until
+
+    def _clearOccurrences(self):
+        """
+        Remove the materialized occurrences of this event.
+        """
+        with transaction.atomic():
+            EventOccurrence.objects.filter(event=self).delete()
+            RecurringEventPage.objects.filter(id=self.id)                     \
+                                      .update(occurrences_until=None)
+            self.occurrences_until = None
+
+    def _refreshOccurrenceExceptions(self):
+        """
+        Update the exception kinds of the materialized occurrences of this
+        event.
+        """
+        with transaction.atomic():
+            EventOccurrence.objects.filter(event=self).exclude(exception="")  \
+                                   .update(exception="")
+            kinds = {}
+            for exceptDate, kind in self.__getExceptionKinds().items():
+                kinds.setdefault(kind, []).append(exceptDate)
+            for kind, exceptDates in kinds.items():
+                EventOccurrence.objects.filter(event=self,
+                                               date__in=exceptDates)         \
+                                       .update(exception=kind)
+
+    def __getExceptionKinds(self):
+        # later kinds take precedence, postponements are also cancellations
+        kinds = {}
+        for ExceptionCls in (ExtraInfoPage, CancellationPage, PostponementPage):
+            for exceptDate in ExceptionCls.events.child_of(self)             \
+                                          .values_list('except_date',
+                                                       flat=True):
+                kinds[exceptDate] = ExceptionCls.slugName
+        return kinds
+
     def _getMyFirstDatetimeFrom(self):
         """
         The datetime this event first started, or None if it never did.
@@ -1178,10 +1989,10 @@ class RecurringEventPage(EventBase, Page):
         if after:
             # is there a postponed event before that?
             # nb: range is inclusive
-            dateRange = (fromDt.date(), after.date())
-            postponements = PostponementPage.events.child_of(self)           \
-                                     .filter(date__range=(dateRange))        \
-                                     .order_by('date', 'time_from')
+            fromDate, toDate = fromDt.date(), after.date()
+            postponements = [postponement for postponement in
+                             self.__getPostponements()
+                             if fromDate <= postponement.date <= toDate]
             for postponement in postponements:
                 postDt = getAwareDatetime(postponement.date,
                                           postponement.time_from,
@@ -1193,9 +2004,10 @@ class RecurringEventPage(EventBase, Page):
                     return (postDt, postponement)
         else:
             # is there a postponed event then?
-            postponements = PostponementPage.events.child_of(self)           \
-                                     .filter(date__gte=fromDt.date())        \
-                                     .order_by('date', 'time_from')
+            fromDate = fromDt.date()
+            postponements = [postponement for postponement in
+                             self.__getPostponements()
+                             if postponement.date >= fromDate]
             for postponement in postponements:
                 postDt = getAwareDatetime(postponement.date,
                                           postponement.time_from,
@@ -1217,24 +2029,23 @@ class RecurringEventPage(EventBase, Page):
             return getLocalDatetime(myFromDt.date(), self.time_from,
                                     self.tz, timeDefault)
 
-    def __after(self, fromDt, excludeCancellations=True, excludeExtraInfo=False):
+    def __after(self, fromDt, excludeCancellations=True, excludeExtraInfo=False,
+                timeDefault=dt.time.min):
         fromDate = fromDt.date()
         if self.time_from and self.time_from < fromDt.time():
             fromDate += _1day
-        exceptions = set()
-        if excludeCancellations:
-            for cancelled in CancellationPage.events.child_of(self)          \
-                                     .filter(except_date__gte=fromDate):
-                exceptions.add(cancelled.except_date)
-        if excludeExtraInfo:
-            for info in ExtraInfoPage.events.child_of(self)                  \
-                                     .filter(except_date__gte=fromDate)      \
-                                     .exclude(extra_title=""):
-                exceptions.add(info.except_date)
-        for occurence in self.repeat.xafter(fromDate, inc=True):
-            if occurence not in exceptions:
-                return getAwareDatetime(occurence, self.time_from,
-                                        self.tz, dt.time.min)
+        memo = self.__getMemo()
+        key = ('after', fromDate, excludeCancellations, excludeExtraInfo)
+        if key not in memo:
+            exceptions = self.__getExceptionDates(excludeCancellations,
+                                                  excludeExtraInfo)
+            memo[key] = next((occurence for occurence in
+                              self.repeat.iterAfter(fromDate, inc=True)
+                              if occurence not in exceptions), None)
+        occurence = memo[key]
+        if occurence is not None:
+            return getAwareDatetime(occurence, self.time_from,
+                                    self.tz, timeDefault)
 
     def __localBefore(self, fromDt, timeDefault=dt.time.min, **kwargs):
         myFromDt = self.__before(fromDt.astimezone(self.tz), **kwargs)
@@ -1242,29 +2053,31 @@ class RecurringEventPage(EventBase, Page):
             return getLocalDatetime(myFromDt.date(), self.time_from,
                                     self.tz, timeDefault)
 
-    def __before(self, fromDt, excludeCancellations=True, excludeExtraInfo=False):
+    def __before(self, fromDt, excludeCancellations=True, excludeExtraInfo=False,
+                 timeDefault=dt.time.min):
         fromDate = fromDt.date()
         if self.time_from and self.time_from > fromDt.time():
             fromDate -= _1day
-        exceptions = set()
+        memo = self.__getMemo()
+        key = ('before', fromDate, excludeCancellations, excludeExtraInfo)
+        if key not in memo:
+            exceptions = self.__getExceptionDates(excludeCancellations,
+                                                  excludeExtraInfo)
+            memo[key] = next((occurence for occurence in
+                              self.repeat.iterBefore(fromDate, inc=True)
+                              if occurence not in exceptions), None)
+        occurence = memo[key]
+        if occurence is not None:
+            return getAwareDatetime(occurence, self.time_from,
+                                    self.tz, timeDefault)
+
+    def __getExceptionDates(self, excludeCancellations, excludeExtraInfo):
+        exceptions = frozenset()
         if excludeCancellations:
-            for cancelled in CancellationPage.events.child_of(self)          \
-                                     .filter(except_date__lte=fromDate):
-                exceptions.add(cancelled.except_date)
+            exceptions |= self.__getCancelledDates()
         if excludeExtraInfo:
-            for info in ExtraInfoPage.events.child_of(self)                  \
-                                     .filter(except_date__lte=fromDate)      \
-                                     .exclude(extra_title=""):
-                exceptions.add(info.except_date)
-        last = None
-        for occurence in self.repeat:
-            if occurence > fromDate:
-                break
-            if occurence not in exceptions:
-                last = occurence
-
-        if last is not None:
-            return getAwareDatetime(last, self.time_from, self.tz, dt.time.min)
+            exceptions |= self.__getExtraInfoDates()
+        return exceptions
 
 # ------------------------------------------------------------------------------
 class MultidayRecurringEventPage(ProxyPageMixin, RecurringEventPage):
@@ -1283,6 +2096,39 @@ class MultidayRecurringEventPage(ProxyPageMixin, RecurringEventPage):
         FieldPanel('num_days'),
         ] + RecurringEventPage.content_panels1
 
+# ------------------------------------------------------------------------------
+class EventOccurrence(models.Model):
+    """
+    A materialized occurrence of a recurring event.  These are kept up to date
+    when the event or its exceptions are published, unpublished or deleted, and
+    can be rebuilt with the joyous_refresh_occurrences management command.
+    """
+    class Meta:
+        ordering = ["start"]
+        unique_together = [("event", "date")]
+        indexes = [models.Index(fields=["start", "finish"])]
+        verbose_name = _("event occurrence")
+        verbose_name_plural = _("event occurrences")
+
+    EXCEPTION_CHOICES = [("",             _("none")),
+                         ("extra-info",   _("extra information")),
+                         ("cancellation", _("cancellation")),
+                         ("postponement", _("postponement"))]
+
+    event = models.ForeignKey('joyous.RecurringEventPage',
+                              related_name="occurrences",
+                              verbose_name=_("event"),
+                              on_delete=models.CASCADE)
+    #: The date of the occurrence in the event's own time zone
+    date = models.DateField(_("date"))
+    start = models.DateTimeField(_("start"))
+    finish = models.DateTimeField(_("finish"))
+    exception = models.CharField(_("exception"), max_length=16, blank=True,
+                                 choices=EXCEPTION_CHOICES)
+
+    def __str__(self):
+        return "{} {}".format(self.event, self.date)
+
 # ------------------------------------------------------------------------------
 class EventExceptionQuerySet(EventQuerySet):
     def upcoming(self):
@@ -1366,6 +2212,21 @@ class EventExceptionBase(models.Model):
         retval['overrides'] = self.overrides
         return retval
 
+    def _refreshOccurrence(self):
+        """
+        Update the exception kind of the materialized occurrence this
+        exception is for.
+        """
+        kind = ""
+        for ExceptionCls in (ExtraInfoPage, CancellationPage, PostponementPage):
+            if ExceptionCls.events.filter(overrides_id=self.overrides_id,
+                                          except_date=self.except_date)      \
+                                  .exists():
+                kind = ExceptionCls.slugName
+        EventOccurrence.objects.filter(event_id=self.overrides_id,
+                                       date=self.except_date)                \
+                               .update(exception=kind)
+
     def _getLocalWhen(self, date_from, num_days=1):
         """
         Returns a string describing when the event occurs (in the local time zone).
@@ -1402,6 +2263,42 @@ class EventExceptionBase(models.Model):
         """
         return getLocalTime(self.except_date, self.time_from, self.tz)
 
+    def _getLocalSpan(self, atDate=None):
+        """
+        Datetimes that the occurrence this exception is for starts and
+        finishes (in the local time zone).
+        """
+        daysDelta = dt.timedelta(days=self.num_days - 1)
+        return (getLocalDatetime(self.except_date, self.time_from, self.tz,
+                                 dt.time.min),
+                getLocalDatetime(self.except_date + daysDelta, self.time_to,
+                                 self.tz))
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if kwargs.get('update_fields') is None:
+            self._refreshEventTimes()
+
+    def delete(self, *args, **kwargs):
+        self._forgetEventOccurrences()
+        return super().delete(*args, **kwargs)
+
+    def _forgetEventOccurrences(self):
+        # Wagtail may save or delete us through another instance, but if we
+        # have our own copy of the event then it ought to know what changed
+        overrides = self._meta.get_field('overrides')
+        if overrides.is_cached(self):
+            overrides.get_cached_value(self)._forgetOccurrences()
+
+    def _refreshEventTimes(self):
+        """
+        Recalculate when the event this exception is for next and last starts.
+        """
+        self._forgetEventOccurrences()
+        event = RecurringEventPage.objects.filter(id=self.overrides_id).first()
+        if event is not None:
+            event._refreshOccurrenceTimes()
+
     def full_clean(self, *args, **kwargs):
         """
         Apply fixups that need to happen before per-field validation occurs.
@@ -1425,6 +2322,12 @@ class EventExceptionBase(models.Model):
 
 # ------------------------------------------------------------------------------
 class ExtraInfoQuerySet(EventExceptionQuerySet):
+    def upcoming(self):
+        return self._upcomingByTimes()
+
+    def past(self):
+        return self._pastByTimes()
+
     def this(self):
         request = self.request
         class ThisExtraInfoIterable(ModelIterable):
@@ -1462,6 +2365,15 @@ class ExtraInfoPage(EventExceptionBase, Page):
     extra_information = RichTextField(_("extra information"), blank=True)
     extra_information.help_text = _("Information just for this date")
 
+    # When this extra info starts, or None if the event does not occur then
+    next_occurrence_at = models.DateTimeField(null=True, blank=True,
+                                              editable=False, db_index=True)
+    last_occurrence_at = models.DateTimeField(null=True, blank=True,
+                                              editable=False, db_index=True)
+    # When those were calculated, or None if they have not been yet
+    occurrence_times_at = models.DateTimeField(null=True, blank=True,
+                                               editable=False)
+
     search_fields = Page.search_fields + [
         index.SearchField('extra_title'),
         index.SearchField('extra_information'),
@@ -1530,6 +2442,33 @@ class ExtraInfoPage(EventExceptionBase, Page):
         fromDt = getLocalDatetime(self.except_date, self.time_from, self.tz)
         return fromDt if predicate(fromDt) else None
 
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is None:
+            self._setOccurrenceTimes()
+        super().save(*args, **kwargs)
+
+    def _setOccurrenceTimes(self):
+        """
+        Set when this extra info starts (in the event's own time zone).
+        """
+        fromDt = None
+        if self.overrides._occursOn(self.except_date):
+            fromDt = getAwareDatetime(self.except_date, self.time_from,
+                                      self.tz)
+        self.next_occurrence_at = fromDt
+        self.last_occurrence_at = fromDt
+        self.occurrence_times_at = timezone.now()
+
+    def _refreshOccurrenceTimes(self):
+        """
+        Recalculate and store when this extra info starts.
+        """
+        self._setOccurrenceTimes()
+        ExtraInfoPage.objects.filter(id=self.id)                             \
+                          .update(next_occurrence_at=self.next_occurrence_at,
+                                  last_occurrence_at=self.last_occurrence_at,
+                                  occurrence_times_at=self.occurrence_times_at)
+
 # ------------------------------------------------------------------------------
 class CancellationPageForm(EventExceptionPageForm):
     description = _("a cancellation")
@@ -1590,12 +2529,10 @@ class CancellationPage(EventExceptionBase, Page):
 # ------------------------------------------------------------------------------
 class PostponementQuerySet(EventQuerySet):
     def upcoming(self):
-        qs = super().upcoming()
-        return qs.filter(date__gte = todayUtc() - _1day)
+        return self._upcomingByTimes()
 
     def past(self):
-        qs = super().past()
-        return qs.filter(date__lte = todayUtc() + _1day)
+        return self._pastByTimes()
 
     def this(self):
         request = self.request
@@ -1616,17 +2553,19 @@ class PostponementQuerySet(EventQuerySet):
                 for page in super().__iter__():
                     thisEvent = ThisEvent(page.postponement_title,
                                           page, page.get_url(request))
-                    pageFromDate = getLocalDate(page.date,
-                                                page.time_from, page.tz)
+                    pageFromDate, fromTime = getLocalDateAndTime(page.date,
+                                                    page.time_from, page.tz)
                     daysDelta = dt.timedelta(days=page.num_days - 1)
                     pageToDate = getLocalDate(page.date + daysDelta,
                                               page.time_to, page.tz)
-                    evods.add(thisEvent, pageFromDate, pageToDate)
+                    evods.add(thisEvent, pageFromDate, pageToDate, fromTime,
+                              page._getLocalSpan())
                 yield from evods
 
         qs = self._clone()
         qs._iterable_class = ByDayIterable
-        return qs.filter(date__range=(fromDate - _1day, toDate + _1day))
+        return qs.filter(date__range=(fromDate - _1day, toDate + _1day))     \
+                 .select_related('overrides')
 
 class PostponementPageForm(EventExceptionPageForm):
     description = _("a postponement")
@@ -1802,6 +2741,22 @@ class PostponementPage(RoutablePageMixin, RescheduleEventBase, CancellationPage)
         """
         return getLocalDatetime(self.date, self.time_from, self.tz)
 
+    def _getMyFromDt(self):
+        """
+        Datetime that the postponement starts (in the event's own time zone).
+        """
+        return getAwareDatetime(self.date, self.time_from, self.tz)
+
+    def _getLocalSpan(self, atDate=None):
+        """
+        Datetimes that the postponement starts and finishes (in the local time
+        zone).
+        """
+        daysDelta = dt.timedelta(days=self.num_days - 1)
+        return (getLocalDatetime(self.date, self.time_from, self.tz,
+                                 dt.time.min),
+                getLocalDatetime(self.date + daysDelta, self.time_to, self.tz))
+
 # ------------------------------------------------------------------------------
 class RescheduleMultidayEventPage(ProxyPageMixin, PostponementPage):
     """
@@ -2,10 +2,17 @@
 # Joyous models
 # ------------------------------------------------------------------------------
 import datetime as dt
+from django.db.models.signals import (post_delete, post_save, pre_save,
+                                      m2m_changed)
+from django.core.signals import request_started, request_finished
 from django.dispatch import receiver
 from wagtail.admin.signals import init_new_page
-from .models import EventExceptionBase
+from wagtail.core.models import Page, PageViewRestriction, get_page_models
+from wagtail.core.signals import page_published, page_unpublished
+from .models import EventBase, EventExceptionBase
 from .models import RecurringEventPage, PostponementPage
+from .models import CalendarPage, forgetGroupEvents, forgetOccurrenceMemos
+from .utils.restrictions import invalidateRestrictions
 
 # ------------------------------------------------------------------------------
 # Recieve Signals
@@ -37,5 +44,97 @@ def identifyExpectantParent(sender, **kwargs):
             page.group_page         = parent.group_page
             page.website            = parent.website
 
+# ------------------------------------------------------------------------------
+# Keep the materialized occurrences up to date
+@receiver(page_published)
+def refreshOccurrences(sender, **kwargs):
+    page = kwargs.get('instance')
+    if isinstance(page, RecurringEventPage):
+        page._refreshOccurrences()
+        page._refreshOccurrenceTimes()
+    elif isinstance(page, EventExceptionBase):
+        # the except_date might have been changed
+        event = RecurringEventPage.objects.filter(id=page.overrides_id).first()
+        if event is not None:
+            event._refreshOccurrenceExceptions()
+
+# NB: Wagtail also unpublishes pages when they are being deleted, so these
+# handlers must not add any new occurrences.
+@receiver(page_unpublished)
+def clearOccurrences(sender, **kwargs):
+    page = kwargs.get('instance')
+    if isinstance(page, RecurringEventPage):
+        page._clearOccurrences()
+    elif isinstance(page, EventExceptionBase):
+        page._refreshOccurrence()
+
+@receiver(post_delete)
+def refreshOccurrence(sender, **kwargs):
+    page = kwargs.get('instance')
+    if isinstance(page, EventExceptionBase):
+        page._refreshOccurrence()
+        page._refreshEventTimes()
+
+# Pages are not to remember their occurrences from one request to the next
+@receiver(request_started)
+@receiver(request_finished)
+def requestBoundary(sender, **kwargs):
+    forgetOccurrenceMemos()
+
+# ------------------------------------------------------------------------------
+# Forget the cached calendar views and group events when an event changes
+# (moving pages is looked after by the move hooks)
+def eventChanged(sender, **kwargs):
+    page = kwargs.get('instance')
+    if kwargs.get('update_fields') is None:
+        CalendarPage._invalidateCaches(page)
+        forgetGroupEvents(page)
+
+def eventRegrouped(sender, **kwargs):
+    # the event might be leaving the group it was linked to
+    page = kwargs.get('instance')
+    if kwargs.get('update_fields') is None:
+        forgetGroupEvents(page, former=True)
+
+for model in get_page_models():
+    if issubclass(model, (EventBase, EventExceptionBase)):
+        post_save.connect(eventChanged, sender=model)
+        post_delete.connect(eventChanged, sender=model)
+        if issubclass(model, EventBase):
+            pre_save.connect(eventRegrouped, sender=model)
+
+# Forget which calendar each site has, and the cached views, when a calendar
+# changes
+def calendarChanged(sender, **kwargs):
+    CalendarPage._invalidateCaches()
+
+for model in get_page_models():
+    if issubclass(model, CalendarPage):
+        post_save.connect(calendarChanged, sender=model)
+        post_delete.connect(calendarChanged, sender=model)
+
+# ------------------------------------------------------------------------------
+# Forget what was cached for each restriction profile when the restrictions
+# change
+@receiver(post_save, sender=PageViewRestriction)
+@receiver(post_delete, sender=PageViewRestriction)
+def restrictionChanged(sender, **kwargs):
+    invalidateRestrictions()
+
+@receiver(m2m_changed, sender=PageViewRestriction.groups.through)
+def restrictionGroupsChanged(sender, **kwargs):
+    invalidateRestrictions()
+
+# Page.move saves the moved page as a plain Page
+@receiver(post_save, sender=Page)
+def restrictedPageMoved(sender, **kwargs):
+    # the paths of the restricted pages it contains might have changed
+    page = kwargs.get('instance')
+    if (kwargs.get('update_fields') is None and
+        PageViewRestriction.objects.filter(page__path__startswith=page.path)
+                                   .exists()):
+        invalidateRestrictions()
+
+# ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
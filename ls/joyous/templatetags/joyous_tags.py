@@ -3,30 +3,42 @@
 # ------------------------------------------------------------------------------
 import datetime as dt
 import calendar
+from functools import partial
+from hashlib import md5
 from django import template
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
 from ..utils.telltime import timeFormat, dateFormat
 from ..models import getAllEventsByDay
 from ..models import getAllUpcomingEvents
-from ..models import getGroupUpcomingEvents
+from ..models import getGroupUpcomingEventsCached
 from ..models import getAllEventsByWeek
 from ..models import CalendarPage
 from ..utils.weeks import weekday_abbr, weekday_name
+from ..utils.cache import getCache, getGeneration
+from ..utils.restrictions import getRestrictionProfile
 from ..edit_handlers import MapFieldPanel
 
 register = template.Library()
 
-@register.inclusion_tag("joyous/tags/events_this_week.html",
-                        takes_context=True)
+@register.simple_tag(takes_context=True)
 def events_this_week(context):
     """
     Displays a week's worth of events.   Starts week with Monday, unless today is Sunday.
     """
     request = context['request']
-    home = request.site.root_page
-    cal = CalendarPage.objects.live().descendant_of(home).first()
+    calId = CalendarPage._getSiteCalendarId(request)
+    today = dt.date.today()
+    return _renderCached("joyous/tags/events_this_week.html", request, calId,
+                         today, partial(_getEventsThisWeek, request, calId,
+                                        today))
+
+def _getEventsThisWeek(request, calId, today):
+    cal = _getCalendar(calId)
     calUrl = cal.get_url(request) if cal else None
     calName = cal.title if cal else None
-    today = dt.date.today()
     beginOrd = today.toordinal()
     if today.weekday() != 6:
         # Start week with Monday, unless today is Sunday
@@ -44,16 +56,20 @@ def events_this_week(context):
             'calendarName': calName,
             'events':       events }
 
-@register.inclusion_tag("joyous/tags/minicalendar.html",
-                        takes_context=True)
+@register.simple_tag(takes_context=True)
 def minicalendar(context):
     """
     Displays a little ajax version of the calendar.
     """
-    today = dt.date.today()
     request = context['request']
-    home = request.site.root_page
-    cal = CalendarPage.objects.live().descendant_of(home).first()
+    calId = CalendarPage._getSiteCalendarId(request)
+    today = dt.date.today()
+    return _renderCached("joyous/tags/minicalendar.html", request, calId,
+                         today, partial(_getMinicalendar, request, calId,
+                                        today))
+
+def _getMinicalendar(request, calId, today):
+    cal = _getCalendar(calId)
     calUrl = cal.get_url(request) if cal else None
     if cal:
         events = cal._getEventsByWeek(request, today.year, today.month)
@@ -68,6 +84,49 @@ def minicalendar(context):
             'weekdayInfo': zip(weekday_abbr, weekday_name),
             'events':      events}
 
+def _getCalendar(calId):
+    if calId is not None:
+        return CalendarPage.objects.filter(id=calId).first()
+
+def _renderCached(templateName, request, calId, today, getContext):
+    """
+    Render the template with the context from getContext, or reuse what was
+    rendered for the same site, day and viewer within the calendar's cache
+    timeout (see JOYOUS_CALENDAR_CACHE_TIMEOUT).
+    """
+    key = _getFragmentCacheKey(templateName, request, calId, today)
+    if key is not None:
+        content = getCache().get(key)
+        if content is not None:
+            return mark_safe(content)
+    content = get_template(templateName).render(getContext(), request)
+    if key is not None:
+        getCache().set(key, content, CalendarPage.CacheTimeout)
+    return mark_safe(content)
+
+def _getFragmentCacheKey(templateName, request, calId, today):
+    """
+    The key to cache this rendering of a tag under, or None if it should not
+    be cached.
+    """
+    # without a calendar the tags show events from every site
+    if not CalendarPage.CacheTimeout or calId is None:
+        return None
+    rootId = request.site.root_page_id
+    allSites = CalendarPage._getSiteCalendar(request)[1]
+    keyed = (templateName,
+             today,
+             calId,
+             request.get_host(),
+             get_language(),
+             timezone.get_current_timezone_name(),
+             getRestrictionProfile(request),
+             getGeneration("restrictions"))
+    return "joyous:tag:{}:{}:{}".format(rootId,
+                            CalendarPage._getEventsGeneration(request,
+                                                              allSites),
+                            md5(repr(keyed).encode()).hexdigest())
+
 @register.inclusion_tag("joyous/tags/upcoming_events_detailed.html",
                         takes_context=True)
 def all_upcoming_events(context):
@@ -100,7 +159,7 @@ def group_upcoming_events(context, group=None):
     if group is None:
         group = context.get('page')
     if group:
-        events = getGroupUpcomingEvents(request, group)
+        events = getGroupUpcomingEventsCached(request, group)
     else:
         events = []
     return {'request': request,
@@ -18,6 +18,13 @@ DATABASES = {
     }
 }
 
+# Tests that need a cache can override this
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+}
+
 SECRET_KEY = 'not needed'
 
 ROOT_URLCONF = 'ls.joyous.tests.urls'
@@ -0,0 +1,35 @@
+# ------------------------------------------------------------------------------
+# Test Cache Utilities
+# ------------------------------------------------------------------------------
+import sys
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from ls.joyous.utils.cache import getGeneration, nextGeneration
+
+# ------------------------------------------------------------------------------
+@override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class Test(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def testSameGeneration(self):
+        self.assertEqual(getGeneration("things"), getGeneration("things"))
+        self.assertNotEqual(getGeneration("things"), getGeneration("stuff"))
+
+    def testNextGeneration(self):
+        generation = getGeneration("things")
+        nextGeneration("things")
+        self.assertNotEqual(getGeneration("things"), generation)
+
+    def testEvictedGeneration(self):
+        generations = {getGeneration("things")}
+        nextGeneration("things")
+        generations.add(getGeneration("things"))
+        cache.delete("joyous:generation:things")
+        # an earlier generation must not come back
+        self.assertNotIn(getGeneration("things"), generations)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -3,17 +3,25 @@
 # ------------------------------------------------------------------------------
 import sys
 import datetime as dt
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 from django_bs_test import TestCase
+from django.core.cache import cache
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth.models import User
 from django.test import RequestFactory
-from django.utils import translation
+from django.utils import timezone, translation
 from django.urls import reverse
 from wagtail.core.models import Site, Page
 from ls.joyous.models.calendar import (CalendarPage, SpecificCalendarPage,
-                                       GeneralCalendarPage)
-from ls.joyous.models.events import SimpleEventPage
+                                       GeneralCalendarPage, _makeEventRecord)
+from ls.joyous.models.events import (SimpleEventPage, MultidayEventPage,
+                                     RecurringEventPage, CancellationPage,
+                                     ExtraInfoPage, PostponementPage, ThisEvent)
+from ls.joyous.utils.recurrence import Recurrence, WEEKLY, TU
 from ls.joyous.models.groups import get_group_model
+from ls.joyous.utils.cache import getGeneration
 from .testutils import freeze_timetz, getPage
 
 GroupPage = get_group_model()
@@ -76,6 +84,30 @@ class TestCalendar(TestCase):
         self.assertEqual(holidays[0].div.string.strip(),
                          "Taranaki Anniversary Day")
 
+    def testYearView(self):
+        response = self.client.get("/events/2011/year/")
+        select = response.soup.select
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(select(".year-number")[0].string.strip(), "2011")
+        months = select(".yearly-view table.minicalendar")
+        self.assertEqual(len(months), 12)
+        june = months[5].select("a.month-name")[0]
+        self.assertEqual(june.string.strip(), "June")
+        self.assertEqual(june['href'], "/events/2011/6/")
+        self.assertEqual(len(select("tbody td.day")), 365)
+        links = select("tbody td.day a.event")
+        self.assertEqual(len(links), 1)
+        self.assertEqual(links[0]['href'], "/events/2011/06/05/")
+        self.assertEqual(links[0].string.strip(), "5")
+
+    @freeze_timetz("2011-03-05 10:00")
+    def testThisYearView(self):
+        response = self.client.get("/events/year/")
+        select = response.soup.select
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(select(".year-number")[0].string.strip(), "2011")
+        self.assertEqual(len(select("tbody td.day.today")), 1)
+
     def testDayWithOneEvent(self):
         response = self.client.get("/events/2011/6/5/")
         self.assertEqual(response.status_code, 302)
@@ -144,6 +176,47 @@ class TestCalendar(TestCase):
         self.assertEqual(len(select(".past-events")), 1)
         self.assertEqual(len(select(".past-events .event-item")), 1)
 
+    def testPastEventsPaginated(self):
+        calendar = CalendarPage.objects.get(slug="events")
+        for day in range(1, 31):
+            event = SimpleEventPage(owner = self.user,
+                                    slug  = "event-{}".format(day),
+                                    title = "Event {}".format(day),
+                                    date  = dt.date(2012,1,day))
+            calendar.add_child(instance=event)
+        response = self.client.get("/events/past/?page=2")
+        select = response.soup.select
+        self.assertEqual(response.status_code, 200)
+        events = select(".past-events .event-item")
+        self.assertEqual(len(events), 6)
+        title = events[0].select("a.event-title")[0]
+        self.assertEqual(title.string.strip(), "Event 5")
+        title = events[5].select("a.event-title")[0]
+        self.assertEqual(title.string.strip(), "Tree Planting")
+
+        response = self.client.get("/events/past/")
+        select = response.soup.select
+        events = select(".past-events .event-item")
+        self.assertEqual(len(events), 25)
+        title = events[24].select("a.event-title")[0]
+        self.assertEqual(title.string.strip(), "Event 6")
+        after = select(".events-pagination")[0]['data-next-after']
+        self.assertNotIn("+", after)
+        self.assertRegex(after, r"^2012-01-06T\d\d%3A\d\d%3A\d\d\.\d+Z%2C\d+$")
+        response = self.client.get("/events/past/?after=" + after)
+        select = response.soup.select
+        events = select(".past-events .event-item")
+        self.assertEqual(len(events), 6)
+        title = events[0].select("a.event-title")[0]
+        self.assertEqual(title.string.strip(), "Event 5")
+
+    def testPastEventsInvalidCursor(self):
+        response = self.client.get("/events/past/?after=yesterday,x")
+        self.assertEqual(response.status_code, 400)
+        # an unencoded + arrives as a space
+        response = self.client.get("/events/past/?after=2012-01-06T00:00:00+00:00,5")
+        self.assertEqual(response.status_code, 400)
+
     def testRouteDefault(self):
         response = self.client.get("/events/")
         select = response.soup.select
@@ -298,6 +371,337 @@ class TestFrançais(TestCase):
         self.assertEqual(holidays[0].div.string.strip(),
                          "Taranaki Anniversary Day")
 
+# ------------------------------------------------------------------------------
+@override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+@patch.object(CalendarPage, "CacheTimeout", 300)
+class TestCalendarCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('i', 'i@j.test', 's3(r3t')
+        self.calendar = CalendarPage(owner  = self.user,
+                                     slug  = "events",
+                                     title = "Events")
+        Page.objects.get(slug='home').add_child(instance=self.calendar)
+        self.calendar.save_revision().publish()
+        self.event = SimpleEventPage(owner = self.user,
+                                     slug  = "tree-planting",
+                                     title = "Tree Planting",
+                                     date      = dt.date(2011,6,5),
+                                     time_from = dt.time(9,30),
+                                     time_to   = dt.time(11,0))
+        self.calendar.add_child(instance=self.event)
+        self.event.save_revision().publish()
+
+    def _getTitles(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [title.string.strip() for title in
+                response.soup.select("tbody a.event .event-title")]
+
+    def testCached(self):
+        self.assertEqual(self._getTitles("/events/2011/06/"), ["Tree Planting"])
+        response = self.client.get("/events/2011/06/")
+        self.assertEqual(response.status_code, 200)
+        key = self.calendar._getCacheKey(response.wsgi_request,
+                                         self.calendar.serveMonth,
+                                         ["2011", "06"], {})
+        self.assertIsNotNone(cache.get(key))
+
+    def testNotCachedForOtherDates(self):
+        self.assertEqual(self._getTitles("/events/2011/06/"), ["Tree Planting"])
+        self.assertEqual(self._getTitles("/events/2011/07/"), [])
+
+    def testInvalidatedByNewEvent(self):
+        self.assertEqual(self._getTitles("/events/2011/06/"), ["Tree Planting"])
+        event = SimpleEventPage(owner = self.user,
+                                slug  = "working-bee",
+                                title = "Working Bee",
+                                date      = dt.date(2011,6,5),
+                                time_from = dt.time(13),
+                                time_to   = dt.time(15))
+        self.calendar.add_child(instance=event)
+        self.assertEqual(self._getTitles("/events/2011/06/"),
+                         ["Tree Planting", "Working Bee"])
+
+    def testInvalidatedByUnpublish(self):
+        self.assertEqual(self._getTitles("/events/2011/06/"), ["Tree Planting"])
+        self.event.unpublish()
+        self.assertEqual(self._getTitles("/events/2011/06/"), [])
+
+    def testInvalidatedByDelete(self):
+        self.assertEqual(self._getTitles("/events/2011/06/"), ["Tree Planting"])
+        self.event.delete()
+        self.assertEqual(self._getTitles("/events/2011/06/"), [])
+
+    def testInvalidatedByCalendarChange(self):
+        self.assertEqual(self._getTitles("/events/2011/06/"), ["Tree Planting"])
+        self.calendar.intro = "<p>Come along</p>"
+        self.calendar.save_revision().publish()
+        response = self.client.get("/events/2011/06/")
+        self.assertIn("Come along", response.content.decode())
+
+    def testInvalidateWithoutQueries(self):
+        generation = getGeneration("events")
+        with self.assertNumQueries(0):
+            CalendarPage._invalidateCaches()
+        self.assertNotEqual(getGeneration("events"), generation)
+
+    def testNotCachedWithOtherParams(self):
+        response = self.client.get("/events/2011/06/", {'utm_source': "news"})
+        self.assertEqual(response.status_code, 200)
+        key = self.calendar._getCacheKey(response.wsgi_request,
+                                         self.calendar.serveMonth,
+                                         ["2011", "06"], {})
+        self.assertIsNone(key)
+
+    def testOnlyParamsReadCached(self):
+        response = self.client.get("/events/upcoming/", {'page': "2"})
+        self.assertEqual(response.status_code, 200)
+        key = self.calendar._getCacheKey(response.wsgi_request,
+                                         self.calendar.serveUpcoming,
+                                         [], {})
+        self.assertIsNotNone(cache.get(key))
+        response = self.client.get("/events/2011/06/", {'page': "2"})
+        key = self.calendar._getCacheKey(response.wsgi_request,
+                                         self.calendar.serveMonth,
+                                         ["2011", "06"], {})
+        self.assertIsNone(key)
+
+    def _addOtherSiteEvent(self):
+        home = Page(owner = self.user,
+                    slug  = "other-home",
+                    title = "Other Home")
+        Page.get_first_root_node().add_child(instance=home)
+        Site.objects.create(hostname="other.joy.test", root_page=home)
+        event = SimpleEventPage(owner = self.user,
+                                slug  = "lambing",
+                                title = "Lambing",
+                                date  = dt.date(2011,6,5))
+        home.add_child(instance=event)
+        event.save_revision().publish()
+
+    def testNotInvalidatedByOtherSite(self):
+        response = self.client.get("/events/2011/06/")
+        key = self.calendar._getCacheKey(response.wsgi_request,
+                                         self.calendar.serveMonth,
+                                         ["2011", "06"], {})
+        self._addOtherSiteEvent()
+        self.assertEqual(self.calendar._getCacheKey(response.wsgi_request,
+                                                    self.calendar.serveMonth,
+                                                    ["2011", "06"], {}),
+                         key)
+        self.assertIsNotNone(cache.get(key))
+
+    def testGeneralInvalidatedByOtherSite(self):
+        general = GeneralCalendarPage(owner = self.user,
+                                      slug  = "all-events",
+                                      title = "All Events")
+        Page.objects.get(slug='home').add_child(instance=general)
+        general.save_revision().publish()
+        response = self.client.get("/all-events/2011/06/")
+        key = general._getCacheKey(response.wsgi_request, general.serveMonth,
+                                   ["2011", "06"], {})
+        self._addOtherSiteEvent()
+        self.assertNotEqual(general._getCacheKey(response.wsgi_request,
+                                                 general.serveMonth,
+                                                 ["2011", "06"], {}),
+                            key)
+        self.assertIn("Lambing",
+                      self.client.get("/all-events/2011/06/")
+                                 .content.decode())
+
+    def testNotCachedWhenSignedIn(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/events/2011/06/")
+        self.assertEqual(response.status_code, 200)
+        key = self.calendar._getCacheKey(response.wsgi_request,
+                                         self.calendar.serveMonth,
+                                         ["2011", "06"], {})
+        self.assertIsNone(key)
+
+    def testHeadersKept(self):
+        response1 = self.client.get("/events/2011/06/")
+        response2 = self.client.get("/events/2011/06/")
+        self.assertEqual(response2.content, response1.content)
+        self.assertEqual(sorted(response2.items()), sorted(response1.items()))
+
+# ------------------------------------------------------------------------------
+class TestEventsApi(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('i', 'i@j.test', 's3(r3t')
+        self.calendar = CalendarPage(owner = self.user,
+                                     slug  = "events",
+                                     title = "Events")
+        Page.objects.get(slug='home').add_child(instance=self.calendar)
+        self.calendar.save_revision().publish()
+        event = SimpleEventPage(owner = self.user,
+                                slug  = "tree-planting",
+                                title = "Tree Planting",
+                                date      = dt.date(2011,6,5),
+                                time_from = dt.time(9,30),
+                                time_to   = dt.time(11,0))
+        self.calendar.add_child(instance=event)
+        event.save_revision().publish()
+        camp = MultidayEventPage(owner = self.user,
+                                 slug  = "camp",
+                                 title = "Camp",
+                                 date_from = dt.date(2011,6,3),
+                                 date_to   = dt.date(2011,6,6))
+        self.calendar.add_child(instance=camp)
+        camp.save_revision().publish()
+        self.event = RecurringEventPage(owner = self.user,
+                                        slug  = "pilates",
+                                        title = "Pilates",
+                                        repeat = Recurrence(dtstart=dt.date(2011,1,1),
+                                                            freq=WEEKLY,
+                                                            byweekday=[TU]),
+                                        time_from = dt.time(18),
+                                        time_to   = dt.time(19))
+        self.calendar.add_child(instance=self.event)
+        self.event.save_revision().publish()
+        cancellation = CancellationPage(owner = self.user,
+                                        overrides = self.event,
+                                        except_date = dt.date(2011,6,14),
+                                        cancellation_title = "No Pilates")
+        self.event.add_child(instance=cancellation)
+        cancellation.save_revision().publish()
+
+    def _get(self, fromDate, toDate, **extra):
+        return self.client.get("/events/api/events/",
+                               {'from': fromDate, 'to': toDate}, **extra)
+
+    @freeze_timetz("2011-06-10 10:00")
+    def testEvents(self):
+        response = self._get("2011-06-05", "2011-06-14")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], "application/json")
+        data = response.json()
+        self.assertEqual(data['from'], "2011-06-05")
+        self.assertEqual(data['to'], "2011-06-14")
+        events = data['events']
+        self.assertEqual([event['title'] for event in events],
+                         ["Camp", "Tree Planting", "Pilates", "No Pilates"])
+        camp, treePlanting, pilates, cancelled = events
+        self.assertEqual(camp['start'], "2011-06-03T00:00:00+09:00")
+        self.assertTrue(camp['end'].startswith("2011-06-06T23:59:59"))
+        self.assertIs(camp['allDay'], True)
+        self.assertEqual(camp['status'], "finished")
+        self.assertEqual(treePlanting['url'], "/events/tree-planting/")
+        self.assertEqual(treePlanting['start'], "2011-06-05T09:30:00+09:00")
+        self.assertEqual(treePlanting['end'], "2011-06-05T11:00:00+09:00")
+        self.assertIs(treePlanting['allDay'], False)
+        self.assertIsNone(treePlanting['exception'])
+        self.assertEqual(pilates['uid'], self.event.uid)
+        self.assertEqual(pilates['start'], "2011-06-07T18:00:00+09:00")
+        self.assertEqual(pilates['end'], "2011-06-07T19:00:00+09:00")
+        # the status is of the occurrence, not of the whole event
+        self.assertEqual(pilates['status'], "finished")
+        self.assertIsNone(self.event.status)
+        self.assertEqual(cancelled['uid'], self.event.uid)
+        self.assertEqual(cancelled['start'], "2011-06-14T18:00:00+09:00")
+        self.assertEqual(cancelled['status'], "cancelled")
+        self.assertEqual(cancelled['exception'], "cancellation")
+
+    def _addExceptions(self, *weeks):
+        # of the Tuesdays after 14 June, cancel those in June, add extra
+        # information to those in July, and postpone those in August
+        for week in weeks:
+            delta = dt.timedelta(weeks=week)
+            cancellation = CancellationPage(owner = self.user,
+                                            overrides = self.event,
+                                            except_date = dt.date(2011,6,21) + delta,
+                                            cancellation_title = "No Pilates")
+            self.event.add_child(instance=cancellation)
+            cancellation.save_revision().publish()
+            info = ExtraInfoPage(owner = self.user,
+                                 overrides = self.event,
+                                 except_date = dt.date(2011,7,5) + delta,
+                                 extra_title = "Pilates Plus",
+                                 extra_information = "Bring a mat")
+            self.event.add_child(instance=info)
+            info.save_revision().publish()
+            postponement = PostponementPage(owner = self.user,
+                                            overrides = self.event,
+                                            except_date = dt.date(2011,8,2) + delta,
+                                            date = dt.date(2011,8,3) + delta,
+                                            postponement_title = "Late Pilates")
+            self.event.add_child(instance=postponement)
+            postponement.save_revision().publish()
+
+    def _countQueries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self._get("2011-06-05", "2011-08-31")
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    @freeze_timetz("2011-06-10 10:00")
+    def testExceptionsQueries(self):
+        self._addExceptions(0)
+        numQueries = self._countQueries()
+        self._addExceptions(1)
+        # the events are fetched together with what they override
+        self.assertEqual(self._countQueries(), numQueries)
+        events = self._get("2011-06-05", "2011-08-31").json()['events']
+        self.assertEqual({event['uid'] for event in events
+                          if event['exception'] is not None},
+                         {self.event.uid})
+
+    def testBadRequests(self):
+        self.assertEqual(self._get("", "").status_code, 400)
+        self.assertEqual(self._get("2011-06-05", "June").status_code, 400)
+        self.assertEqual(self._get("2019-02-30", "2019-03-02").status_code, 400)
+        self.assertEqual(self._get("2019-02-27", "2019-02-30").status_code, 400)
+        self.assertEqual(self._get("2011-06-05", "2011-06-04").status_code, 400)
+        self.assertEqual(self._get("2011-01-01", "2012-12-31").status_code, 400)
+
+    def testNotModified(self):
+        # frozen after the events were published, so edits are later still
+        with freeze_timetz():
+            response = self._get("2011-06-05", "2011-06-14")
+            etag = response['ETag']
+            self.assertNotIn('Last-Modified', response)
+            response = self._get("2011-06-05", "2011-06-14",
+                                 HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            response = self._get("2011-06-05", "2011-06-15",
+                                 HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.event.title = "Yoga"
+            self.event.save_revision().publish()
+            response = self._get("2011-06-05", "2011-06-14",
+                                 HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+    def testModifiedWhenStarted(self):
+        with freeze_timetz("2011-06-07 17:59"):
+            response = self._get("2011-06-07", "2011-06-07")
+            etag = response['ETag']
+            self.assertEqual(response.json()['events'][0]['status'], None)
+        with freeze_timetz("2011-06-07 18:01"):
+            response = self._get("2011-06-07", "2011-06-07",
+                                 HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['events'][0]['status'],
+                             "started")
+
+    def testRecordWithoutOverrides(self):
+        # e.g. a postponement of an event which has since been deleted
+        postponement = PostponementPage(postponement_title = "Late Pilates",
+                                        except_date = dt.date(2011,6,21),
+                                        date      = dt.date(2011,6,22),
+                                        time_from = dt.time(18),
+                                        time_to   = dt.time(19))
+        thisEvent = ThisEvent("Late Pilates", postponement, "/late-pilates/")
+        tz = timezone.get_current_timezone()
+        span = (tz.localize(dt.datetime(2011,6,22,18)),
+                tz.localize(dt.datetime(2011,6,22,19)))
+        record = _makeEventRecord(thisEvent, span,
+                                  tz.localize(dt.datetime(2011,6,10,10)))
+        self.assertIsNone(record['uid'])
+        self.assertEqual(record['exception'], "postponement")
+        self.assertIsNone(record['status'])
+
 # ------------------------------------------------------------------------------
 class TestSpecificCalendar(TestCase):
     def setUp(self):
@@ -12,6 +12,8 @@ from wagtail.core.models import Page, PageViewRestriction
 from ls.joyous.models import (EventBase, removeContentPanels, SimpleEventPage,
             MultidayEventPage, RecurringEventPage, MultidayRecurringEventPage,
             PostponementPage)
+from ls.joyous.models.events import (ThisEvent, EventsByDayList,
+                                     _getEventsByDay)
 from .testutils import datetimetz, freeze_timetz
 
 # ------------------------------------------------------------------------------
@@ -27,6 +29,82 @@ class Test(TestCase):
                                   if getattr(panel, "field_name", None) in
                                                  ("tz", "location", "website")])
 
+# ------------------------------------------------------------------------------
+class TestEventsByDayList(TestCase):
+    def _titles(self, events):
+        return [thisEvent.title for thisEvent in events]
+
+    def testSpans(self):
+        evods = EventsByDayList(dt.date(2020,3,2), dt.date(2020,3,6))
+        evods.add(ThisEvent("Camp", None, ""), dt.date(2020,2,28),
+                  dt.date(2020,3,3))
+        evods.add(ThisEvent("Lunch", None, ""), dt.date(2020,3,3),
+                  dt.date(2020,3,3), dt.time(12))
+        evods.add(ThisEvent("Fair", None, ""), dt.date(2020,3,3),
+                  dt.date(2020,3,5))
+        evods.add(ThisEvent("Breakfast", None, ""), dt.date(2020,3,3),
+                  dt.date(2020,3,3), dt.time(7,30))
+        evods.add(ThisEvent("Past", None, ""), dt.date(2020,2,1),
+                  dt.date(2020,3,1), dt.time(9))
+        evods.add(ThisEvent("Future", None, ""), dt.date(2020,3,7),
+                  dt.date(2020,3,7), dt.time(9))
+        days = list(evods)
+        self.assertEqual([evod.date for evod in days],
+                         [dt.date(2020,3,d) for d in range(2,7)])
+        self.assertEqual(self._titles(days[0].days_events), [])
+        self.assertEqual(self._titles(days[0].continuing_events), ["Camp"])
+        self.assertEqual(self._titles(days[1].days_events),
+                         ["Breakfast", "Lunch", "Fair"])
+        self.assertEqual(self._titles(days[1].continuing_events), ["Camp"])
+        self.assertEqual(self._titles(days[2].continuing_events), ["Fair"])
+        self.assertEqual(self._titles(days[3].continuing_events), ["Fair"])
+        self.assertEqual(self._titles(days[4].all_events), [])
+
+    def testMerged(self):
+        src1 = EventsByDayList(dt.date(2020,3,2), dt.date(2020,3,3))
+        src1.add(ThisEvent("Yoga", None, ""), dt.date(2020,3,3),
+                 dt.date(2020,3,3), dt.time(18))
+        src1.add(ThisEvent("Market", None, ""), dt.date(2020,3,3),
+                 dt.date(2020,3,3))
+        src2 = EventsByDayList(dt.date(2020,3,2), dt.date(2020,3,3))
+        src2.add(ThisEvent("Run", None, ""), dt.date(2020,3,3),
+                 dt.date(2020,3,3), dt.time(6))
+        src2.add(ThisEvent("Choir", None, ""), dt.date(2020,3,3),
+                 dt.date(2020,3,3), dt.time(18))
+        days = _getEventsByDay(dt.date(2020,3,2), [src1, src2])
+        self.assertEqual(self._titles(days[1].days_events),
+                         ["Run", "Yoga", "Choir", "Market"])
+
+    def testSpansKept(self):
+        src1 = EventsByDayList(dt.date(2020,3,2), dt.date(2020,3,3))
+        src1.add(ThisEvent("Camp", None, ""), dt.date(2020,3,1),
+                 dt.date(2020,3,4), None, "Camp span")
+        src1.add(ThisEvent("Yoga", None, ""), dt.date(2020,3,3),
+                 dt.date(2020,3,3), dt.time(18), "Yoga span")
+        src2 = EventsByDayList(dt.date(2020,3,2), dt.date(2020,3,3))
+        src2.add(ThisEvent("Run", None, ""), dt.date(2020,3,3),
+                 dt.date(2020,3,3), dt.time(6))
+        days = _getEventsByDay(dt.date(2020,3,2), [src1, src2])
+        self.assertEqual(self._titles(days[1].all_events),
+                         ["Run", "Yoga", "Camp"])
+        self.assertEqual(days[1].all_spans, [None, "Yoga span", "Camp span"])
+        self.assertEqual(days[0].all_spans, ["Camp span"])
+
+    def testLongEvents(self):
+        evods = EventsByDayList(dt.date(2020,1,1), dt.date(2020,12,31))
+        for num in range(500):
+            evods.add(ThisEvent(str(num), None, ""),
+                      dt.date(2019,12,1) + dt.timedelta(days=num),
+                      dt.date(2020,11,1) + dt.timedelta(days=num))
+        # those starting after the last day are not kept
+        self.assertEqual(len(evods.spans), 397)
+        days = list(evods)
+        self.assertEqual(len(days), 366)
+        self.assertEqual(len(days[0].continuing_events), 31)
+        self.assertEqual(len(days[0].days_events), 1)
+        self.assertEqual(self._titles(days[-1].continuing_events),
+                         [str(num) for num in range(60, 396)])
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
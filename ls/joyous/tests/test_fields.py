@@ -0,0 +1,44 @@
+# ------------------------------------------------------------------------------
+# Test Fields
+# ------------------------------------------------------------------------------
+import sys
+import datetime as dt
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from ls.joyous.fields import RecurrenceField
+from ls.joyous.utils.recurrence import Recurrence, WEEKLY, TU
+
+# ------------------------------------------------------------------------------
+class TestRecurrenceField(TestCase):
+    RULE = "DTSTART:20180327\nRRULE:FREQ=WEEKLY;WKST=SU;BYDAY=TU"
+
+    def testToPython(self):
+        field = RecurrenceField()
+        rr = field.to_python(self.RULE)
+        self.assertIsInstance(rr, Recurrence)
+        self.assertEqual(rr.freq, WEEKLY)
+        self.assertEqual(rr.byweekday, [TU])
+        self.assertEqual(rr.dtstart, dt.date(2018, 3, 27))
+        self.assertIsNone(field.to_python(""))
+        self.assertIs(field.to_python(rr), rr)
+
+    def testShared(self):
+        field = RecurrenceField()
+        rr1 = field.from_db_value(self.RULE)
+        rr2 = field.from_db_value(self.RULE)
+        self.assertIs(rr1, rr2)
+        rr3 = field.from_db_value(self.RULE.replace("TU", "WE"))
+        self.assertIsNot(rr1, rr3)
+
+    def testInvalid(self):
+        field = RecurrenceField()
+        with self.assertRaises(ValidationError):
+            field.to_python("RRULE:FREQ=FORTNIGHTLY")
+        with self.assertRaises(ValidationError):
+            field.to_python("RRULE:FREQ=WEEKLY;BYDAY=XX")
+        with self.assertRaises(ValidationError):
+            field.to_python("RRULE:FREQ=WEEKLY;UNTIL=2019-13-45")
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -5,11 +5,16 @@ import sys
 import datetime as dt
 import pytz
 import calendar
-from django.test import RequestFactory, TestCase
+from unittest.mock import patch
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User, AnonymousUser, Group
 from django.core.exceptions import (MultipleObjectsReturned, ObjectDoesNotExist,
                                     PermissionDenied)
 from django.utils import timezone
+from wagtail.core import hooks
 from wagtail.core.models import Site, Page, PageViewRestriction
 from ls.joyous.utils.recurrence import Recurrence
 from ls.joyous.utils.recurrence import WEEKLY, MONTHLY, MO, TU, WE, FR, SU
@@ -17,10 +22,10 @@ from ls.joyous.models.calendar import GeneralCalendarPage
 from ls.joyous.models.events import (SimpleEventPage, MultidayEventPage,
         RecurringEventPage, PostponementPage, ExtraInfoPage)
 from ls.joyous.models.events import (getAllEventsByDay, getAllEventsByWeek,
-        getAllUpcomingEvents, getAllPastEvents, getGroupUpcomingEvents,
-        getEventFromUid)
+        getAllEventsByYear, getAllUpcomingEvents, getAllPastEvents, getGroupUpcomingEvents,
+        getGroupUpcomingEventsCached, getEventFromUid, getEventsFromUids)
 from ls.joyous.models.groups import get_group_model
-from .testutils import datetimetz
+from .testutils import datetimetz, freeze_timetz
 
 GroupPage = get_group_model()
 
@@ -133,6 +138,29 @@ class Test(TestCase):
         self.assertEqual(len(evod.days_events), 1)
         self.assertEqual(len(evod.continuing_events), 0)
 
+    def testGetAllEventsByYear(self):
+        months = getAllEventsByYear(self.request, 2013)
+        self.assertEqual(len(months), 12)
+        for month, weeks in enumerate(months, 1):
+            byWeek = getAllEventsByWeek(self.request, 2013, month)
+            self.assertEqual(len(weeks), len(byWeek))
+            for week, expected in zip(weeks, byWeek):
+                self.assertEqual([evod and evod.date for evod in week],
+                                 [evod and evod.date for evod in expected])
+                self.assertEqual([evod and len(evod.all_events) for evod in week],
+                                 [evod and len(evod.all_events) for evod in expected])
+        evod = months[0][2][4]
+        self.assertEqual(evod.date, dt.date(2013,1,17))
+        self.assertEqual(len(evod.days_events), 1)
+
+    def testGetAllEventsByYearQueries(self):
+        getAllEventsByYear(self.request, 2013)
+        with CaptureQueriesContext(connection) as byMonth:
+            getAllEventsByWeek(self.request, 2013, 1)
+        with CaptureQueriesContext(connection) as byYear:
+            getAllEventsByYear(self.request, 2013)
+        self.assertEqual(len(byYear), len(byMonth))
+
     def testGetAllUpcomingEvents(self):
         today = timezone.localdate()
         futureEvent = MultidayEventPage(owner = self.user,
@@ -222,6 +250,40 @@ class Test(TestCase):
         self.assertEqual(events[0].title, "Planning to Plan")
         self.assertEqual(events[0].page.group, self.group)
 
+    def testGetGroupUpcomingEventsQueries(self):
+        def countQueries():
+            # the first look may fill in occurrence times that are missing
+            getGroupUpcomingEvents(self.request, self.group)
+            with CaptureQueriesContext(connection) as queries:
+                events = getGroupUpcomingEvents(self.request, self.group)
+            return len(queries), len(events)
+
+        numQueries = set()
+        numMeetings = 0
+        for size in (1, 4, 16):
+            for n in range(numMeetings, size):
+                meeting = RecurringEventPage(owner = self.user,
+                                             slug  = "meeting-{}".format(n),
+                                             title = "Meeting {}".format(n),
+                                             repeat    = Recurrence(dtstart=dt.date(2018,5,1),
+                                                                    freq=WEEKLY,
+                                                                    byweekday=[TU]),
+                                             time_from = dt.time(9),
+                                             group_page = self.group)
+                self.calendar.add_child(instance=meeting)
+                memo = ExtraInfoPage(owner = self.user,
+                                     slug  = "meeting-{}-extra-info".format(n),
+                                     title = "Extra Information Meeting {}".format(n),
+                                     overrides = meeting,
+                                     except_date = meeting.next_date,
+                                     extra_title = "Agenda {}".format(n))
+                meeting.add_child(instance=memo)
+            numMeetings = size
+            queries, events = countQueries()
+            self.assertEqual(events, size * 2)
+            numQueries.add(queries)
+        self.assertEqual(len(numQueries), 1)
+
     def testGetEventFromUid(self):
         event = getEventFromUid(self.request, "29daefed-fed1-4e47-9408-43ec9b06a06d")
         self.assertEqual(event.title, "Pet Show")
@@ -234,6 +296,28 @@ class Test(TestCase):
         with self.assertRaises(ObjectDoesNotExist):
             getEventFromUid(self.request, "d12971fb-e694-4a04-aba2-fb1a4a7166b9")
 
+    def testGetEventFromUidQueries(self):
+        # one to resolve the uid, one to fetch the page, and one for its
+        # view restrictions
+        with self.assertNumQueries(3):
+            event = getEventFromUid(self.request,
+                                    "29daefed-fed1-4e47-9408-43ec9b06a06d")
+        self.assertEqual(event.title, "Pet Show")
+
+    def testGetEventsFromUids(self):
+        uids = ["29daefed-fed1-4e47-9408-43ec9b06a06d",
+                "80af64e7-84e6-40d9-8b4f-7edf92aab9f7",
+                "initiative+technology",
+                "d12971fb-e694-4a04-aba2-fb1a4a7166b9"]
+        with self.assertNumQueries(3):
+            events = getEventsFromUids(self.request, uids, home=self.calendar)
+        self.assertEqual(events, {
+                "29daefed-fed1-4e47-9408-43ec9b06a06d": self.show,
+                "80af64e7-84e6-40d9-8b4f-7edf92aab9f7": self.rendezvous,
+                "initiative+technology":                self.party})
+        events = getEventsFromUids(self.request, uids, home=self.group)
+        self.assertEqual(events, {"initiative+technology": self.standup})
+
     def testAuthGetEventFromUid(self):
         with self.assertRaises(PermissionDenied):
             event = getEventFromUid(self.request, "80af64e7-84e6-40d9-8b4f-7edf92aab9f7")
@@ -242,6 +326,141 @@ class Test(TestCase):
         self.assertIsNotNone(event.title)
         self.assertEqual(event.title, "Private Rendezvous")
 
+# ------------------------------------------------------------------------------
+@override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+@patch("ls.joyous.models.events._GROUP_CACHE_TIMEOUT", 3600)
+class TestGroupCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.home = Page.objects.get(slug='home')
+        self.user = User.objects.create_user('i', 'i@foo.test', 's3cr3t')
+        self.request = RequestFactory().get("/test")
+        self.request.user = self.user
+        self.request.session = {}
+        self.calendar = GeneralCalendarPage(owner = self.user,
+                                            slug  = "events",
+                                            title = "Events")
+        self.home.add_child(instance=self.calendar)
+        self.group = GroupPage(slug = "initech", title = "Initech Corporation")
+        self.home.add_child(instance=self.group)
+        self.rival = GroupPage(slug = "initrode", title = "Initrode Corporation")
+        self.home.add_child(instance=self.rival)
+        self.launch = SimpleEventPage(owner = self.user,
+                                      slug   = "launch",
+                                      title  = "Product Launch",
+                                      date      = dt.date(2030,3,5),
+                                      time_from = dt.time(10),
+                                      group_page = self.group)
+        self.calendar.add_child(instance=self.launch)
+        self.launch.save_revision().publish()
+        self.party = SimpleEventPage(owner = self.user,
+                                     slug   = "party",
+                                     title  = "Launch Party",
+                                     date      = dt.date(2030,3,6),
+                                     time_from = dt.time(18))
+        self.group.add_child(instance=self.party)
+        self.party.save_revision().publish()
+
+    def _getTitles(self):
+        events = getGroupUpcomingEventsCached(self.request, self.group)
+        return [event.title for event in events]
+
+    @freeze_timetz("2030-03-05 09:00")
+    def testCached(self):
+        self.assertEqual(self._getTitles(), ["Product Launch", "Launch Party"])
+        with self.assertNumQueries(1):
+            # only the pages are fetched, all at once
+            self.assertEqual(self._getTitles(),
+                             ["Product Launch", "Launch Party"])
+        other = RequestFactory().get("/test")
+        other.user = AnonymousUser()
+        other.session = {}
+        self.assertEqual(getGroupUpcomingEventsCached(self.request, self.rival),
+                         [])
+        self.assertEqual(len(getGroupUpcomingEventsCached(other, self.group)), 2)
+
+    def testExpiresAtNextStart(self):
+        with freeze_timetz("2030-03-05 09:00"):
+            self.assertEqual(self._getTitles(),
+                             ["Product Launch", "Launch Party"])
+        with freeze_timetz("2030-03-05 09:59"):
+            with self.assertNumQueries(1):
+                self._getTitles()
+        with freeze_timetz("2030-03-05 10:00:01"):
+            self.assertEqual(self._getTitles(), ["Launch Party"])
+
+    @freeze_timetz("2030-03-05 09:00")
+    def testPagesNotCached(self):
+        events = getGroupUpcomingEventsCached(self.request, self.group)
+        self.assertEqual(len(events), 2)
+        key = [key for key in cache._cache if ":joyous:group:" in key][0]
+        self.assertNotIn(b"SimpleEventPage", cache._cache[key])
+        SimpleEventPage.objects.filter(id=self.party.id)                     \
+                               .update(location="The Office")
+        events = getGroupUpcomingEventsCached(self.request, self.group)
+        self.assertEqual([event.page for event in events],
+                         [self.launch, self.party])
+        self.assertEqual(events[1].page.location, "The Office")
+        self.assertEqual(events[1].url, self.party.get_url(self.request))
+
+    def testForgottenOnPublish(self):
+        self.assertEqual(self._getTitles(), ["Product Launch", "Launch Party"])
+        self.party.title = "Launch Celebration"
+        self.party.save_revision().publish()
+        self.assertEqual(self._getTitles(),
+                         ["Product Launch", "Launch Celebration"])
+        self.launch.unpublish()
+        self.assertEqual(self._getTitles(), ["Launch Celebration"])
+
+    def testForgottenOnRegroup(self):
+        self.assertEqual(self._getTitles(), ["Product Launch", "Launch Party"])
+        self.assertEqual(getGroupUpcomingEventsCached(self.request, self.rival),
+                         [])
+        self.launch.group_page = self.rival
+        self.launch.save_revision().publish()
+        self.assertEqual(self._getTitles(), ["Launch Party"])
+        events = getGroupUpcomingEventsCached(self.request, self.rival)
+        self.assertEqual([event.title for event in events], ["Product Launch"])
+
+    def testForgottenOnMove(self):
+        self.assertEqual(self._getTitles(), ["Product Launch", "Launch Party"])
+        self.assertEqual(getGroupUpcomingEventsCached(self.request, self.rival),
+                         [])
+        # as the admin move view does it
+        party = SimpleEventPage.objects.get(id=self.party.id)
+        for fn in hooks.get_hooks('before_move_page'):
+            fn(self.request, party, self.rival)
+        party.move(self.rival, pos='last-child')
+        for fn in hooks.get_hooks('after_move_page'):
+            fn(self.request, party)
+        self.assertEqual(self._getTitles(), ["Product Launch"])
+        events = getGroupUpcomingEventsCached(self.request, self.rival)
+        self.assertEqual([event.title for event in events], ["Launch Party"])
+
+    def testForgottenOnException(self):
+        meeting = RecurringEventPage(owner = self.user,
+                                     slug  = "plan-plan",
+                                     title = "Planning to Plan",
+                                     repeat    = Recurrence(dtstart=dt.date(2018,5,1),
+                                                            freq=WEEKLY,
+                                                            byweekday=[TU]),
+                                     time_from = dt.time(18,30),
+                                     time_to   = dt.time(20))
+        self.group.add_child(instance=meeting)
+        meeting.save_revision().publish()
+        self.assertIn("Planning to Plan", self._getTitles())
+        memo = ExtraInfoPage(owner = self.user,
+                             slug  = "plan-plan-extra-info",
+                             title = "Extra Information Planning to Plan",
+                             overrides = meeting,
+                             except_date = meeting.next_date,
+                             extra_title = "Gap Analysis")
+        meeting.add_child(instance=memo)
+        memo.save_revision().publish()
+        self.assertIn("Gap Analysis", self._getTitles())
+
 # ------------------------------------------------------------------------------
 class TestTZ(TestCase):
     def setUp(self):
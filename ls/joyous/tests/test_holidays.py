@@ -0,0 +1,61 @@
+# ------------------------------------------------------------------------------
+# Test Holidays
+# ------------------------------------------------------------------------------
+import sys
+import datetime as dt
+from unittest.mock import patch
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from ls.joyous.holidays.parser import parseHolidays
+from ls.joyous.utils.holidays import HolidayTable
+
+# ------------------------------------------------------------------------------
+class TestParser(TestCase):
+    def testParse(self):
+        hols = parseHolidays("NZ[WTL,Nelson],AU[*],Northern Ireland")
+        self.assertEqual(hols.get(dt.date(2018,2,6)), "Waitangi Day")
+        self.assertEqual(hols.get(dt.date(2018,3,17)), "St. Patrick's Day")
+        self.assertIsNone(hols.get(dt.date(2018,3,18)))
+
+    def testEmpty(self):
+        hols = parseHolidays("")
+        self.assertIsNone(hols.get(dt.date(2018,1,1)))
+
+# ------------------------------------------------------------------------------
+class TestTable(TestCase):
+    def testGet(self):
+        table = HolidayTable("NZ[*]")
+        self.assertEqual(table.get(dt.date(2012,3,12)),
+                         "Taranaki Anniversary Day")
+        self.assertEqual(table.get(dt.date(2019,12,25)), "Christmas Day")
+        self.assertIsNone(table.get(dt.date(2019,12,24)))
+        self.assertEqual(sorted(table._years), [2012, 2019])
+
+    def testLazy(self):
+        with patch("ls.joyous.holidays.parser.parseHolidays") as parse:
+            table = HolidayTable("NZ")
+            parse.assert_not_called()
+        self.assertIsNone(table._holidays)
+        table.get(dt.date(2018,1,1))
+        self.assertIsNotNone(table._holidays)
+
+    def testNoHolidays(self):
+        table = HolidayTable("")
+        self.assertIsNone(table.get(dt.date(2018,1,1)))
+        self.assertIsNone(table._holidays)
+
+    @override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def testShared(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        table1 = HolidayTable("NZ")
+        self.assertEqual(table1.get(dt.date(2018,2,6)), "Waitangi Day")
+        table2 = HolidayTable("NZ")
+        self.assertEqual(table2.get(dt.date(2018,2,6)), "Waitangi Day")
+        # the year came from the cache, so table2 did not parse anything
+        self.assertIsNone(table2._holidays)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -6,7 +6,8 @@ import sys
 import datetime as dt
 import pytz
 from io import BytesIO
-from icalendar import vDatetime
+from unittest.mock import patch
+from icalendar import vDatetime, Calendar
 from django.contrib.auth.models import User
 from django.contrib.messages.storage.fallback import FallbackStorage
 from django.test import TestCase, RequestFactory
@@ -18,7 +19,7 @@ from ls.joyous.models import (SimpleEventPage, MultidayEventPage,
 from ls.joyous.models import getAllEvents
 from ls.joyous.utils.recurrence import Recurrence
 from ls.joyous.utils.recurrence import WEEKLY, MONTHLY, TU, SA
-from ls.joyous.formats.ical import ICalHandler
+from ls.joyous.formats.ical import ICalHandler, VCalendar, TimeZoneSpan
 from freezegun import freeze_time
 from .testutils import datetimetz
 
@@ -724,6 +725,165 @@ class TestExport(TestCase):
         response = self.handler.serve(self.home, self._getRequest("/"))
         self.assertIsNone(response)
 
+    def testServeStreaming(self):
+        meeting = RecurringEventPage(owner = self.user,
+                                     slug  = "meeting",
+                                     title = "Meeting",
+                                     repeat = Recurrence(dtstart=dt.date(2020,1,7),
+                                                         freq=WEEKLY,
+                                                         byweekday=[TU]),
+                                     time_from = dt.time(19),
+                                     tz = pytz.timezone("Pacific/Auckland"))
+        self.calendar.add_child(instance=meeting)
+        meeting.save_revision().publish()
+        cancellation = CancellationPage(owner = self.user,
+                                        overrides = meeting,
+                                        except_date = dt.date(2020,1,14))
+        meeting.add_child(instance=cancellation)
+        cancellation.save_revision().publish()
+        expected = self.handler.serve(self.calendar,
+                                      self._getRequest("/events/")).content
+        with patch.object(ICalHandler, "streaming", True):
+            response = self.handler.serve(self.calendar,
+                                          self._getRequest("/events/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response.get('Content-Type'), "text/calendar")
+        self.assertEqual(response.get('Content-Disposition'),
+                         "attachment; filename=events.ics")
+        content = b"".join(response.streaming_content)
+        self.assertTrue(content.startswith(b"BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(content.endswith(b"END:VCALENDAR\r\n"))
+        self.assertEqual(content.count(b"BEGIN:VEVENT"), 3)
+        self.assertIn(b"EXDATE;TZID=Pacific/Auckland:20200114T190000", content)
+        self.assertLess(content.index(b"END:VTIMEZONE"),
+                        content.index(b"BEGIN:VEVENT"))
+        def components(ical):
+            # DTSTAMP is when each was served, which might be a second apart
+            components = [component
+                          for component in Calendar.from_ical(ical).walk()
+                          if component.name != "VCALENDAR"]
+            for component in components:
+                component.pop('DTSTAMP', None)
+            return sorted(component.to_ical() for component in components)
+        self.assertEqual(components(content), components(expected))
+
+    def testServeStreamingMakesEachOnce(self):
+        tz = pytz.timezone("Pacific/Auckland")
+        SimpleEventPage.objects.update(tz=tz)
+        with patch.object(ICalHandler, "streaming", True),                   \
+             patch.object(VCalendar.factory, "makeFromPage",
+                          wraps=VCalendar.factory.makeFromPage) as makeFromPage:
+            response = self.handler.serve(self.calendar,
+                                          self._getRequest("/events/"))
+            content = b"".join(response.streaming_content)
+        self.assertEqual(makeFromPage.call_count, 2)
+        self.assertEqual(content.count(b"BEGIN:VTIMEZONE"), 1)
+
+    def testTimeZoneSpanFromPage(self):
+        tz = pytz.timezone("Pacific/Auckland")
+        pages = [SimpleEventPage(owner = self.user,
+                                 slug  = "lunch",
+                                 title = "Lunch",
+                                 date  = dt.date(2020,4,1),
+                                 time_from = dt.time(12),
+                                 time_to   = dt.time(13),
+                                 tz = tz),
+                 MultidayEventPage(owner = self.user,
+                                   slug  = "camp",
+                                   title = "Camp",
+                                   date_from = dt.date(2020,4,3),
+                                   date_to   = dt.date(2020,4,6),
+                                   tz = tz),
+                 RecurringEventPage(owner = self.user,
+                                    slug  = "storytime",
+                                    title = "Storytime",
+                                    repeat = Recurrence(dtstart=dt.date(2020,3,3),
+                                                        until=dt.date(2020,5,26),
+                                                        freq=WEEKLY,
+                                                        byweekday=[TU]),
+                                    time_from = dt.time(10),
+                                    tz = tz),
+                 RecurringEventPage(owner = self.user,
+                                    slug  = "meeting",
+                                    title = "Meeting",
+                                    repeat = Recurrence(dtstart=dt.date(2020,1,7),
+                                                        freq=WEEKLY,
+                                                        byweekday=[TU]),
+                                    time_from = dt.time(19),
+                                    time_to   = dt.time(21),
+                                    tz = tz)]
+        for page in pages:
+            self.calendar.add_child(instance=page)
+            page.save_revision().publish()
+            span = TimeZoneSpan()
+            span.addPage(page)
+            expected = TimeZoneSpan(VCalendar.factory.makeFromPage(page))
+            self.assertEqual(span.firstDt, expected.firstDt)
+            self.assertEqual(span.lastDt, expected.lastDt)
+
+    def testServeNotModified(self):
+        response = self.handler.serve(self.calendar,
+                                      self._getRequest("/events/"))
+        etag = response.get('ETag')
+        self.assertTrue(etag)
+        request = self._getRequest("/events/")
+        request.META['HTTP_IF_NONE_MATCH'] = etag
+        with patch.object(VCalendar, "fromPage") as fromPage:
+            response = self.handler.serve(self.calendar, request)
+        fromPage.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get('ETag'), etag)
+
+    def testServeNoLastModified(self):
+        response = self.handler.serve(self.dicerun,
+                                      self._getRequest("/events/mercy-dice-run/"))
+        self.assertIsNone(response.get('Last-Modified'))
+        request = self._getRequest("/events/mercy-dice-run/")
+        request.META['HTTP_IF_MODIFIED_SINCE'] = "Wed, 21 Oct 2099 07:28:00 GMT"
+        response = self.handler.serve(self.dicerun, request)
+        self.assertEqual(response.status_code, 200)
+
+    def testServeDeleted(self):
+        response = self.handler.serve(self.calendar,
+                                      self._getRequest("/events/"))
+        etag = response.get('ETag')
+        self.dicerun.delete()
+        request = self._getRequest("/events/")
+        request.META['HTTP_IF_NONE_MATCH'] = etag
+        response = self.handler.serve(self.calendar, request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.get('ETag'), etag)
+
+    def testServeModified(self):
+        response = self.handler.serve(self.calendar,
+                                      self._getRequest("/events/"))
+        etag = response.get('ETag')
+        self.dicerun.unpublish()
+        request = self._getRequest("/events/")
+        request.META['HTTP_IF_NONE_MATCH'] = etag
+        response = self.handler.serve(self.calendar, request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.get('ETag'), etag)
+        self.assertEqual(response.content.count(b"BEGIN:VEVENT"), 1)
+
+    def testServeMoved(self):
+        gigs = CalendarPage(owner = self.user,
+                            slug  = "gigs",
+                            title = "Gigs")
+        self.home.add_child(instance=gigs)
+        gigs.save_revision().publish()
+        response = self.handler.serve(self.calendar,
+                                      self._getRequest("/events/"))
+        etag = response.get('ETag')
+        self.dicerun.move(gigs, pos="last-child")
+        request = self._getRequest("/events/")
+        request.META['HTTP_IF_NONE_MATCH'] = etag
+        response = self.handler.serve(self.calendar, request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.get('ETag'), etag)
+        self.assertIn(b"/gigs/mercy-dice-run/", response.content)
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
@@ -0,0 +1,284 @@
+# ------------------------------------------------------------------------------
+# Test joyous_import_ical Command
+# ------------------------------------------------------------------------------
+import sys
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+from wagtail.core.models import Site, Page
+from ls.joyous.models import CalendarPage, SimpleEventPage, ICalImportJob
+from ls.joyous.formats.ical import ICalHandler
+from .testutils import freeze_timetz, datetimetz
+
+# ------------------------------------------------------------------------------
+class Test(TestCase):
+    def setUp(self):
+        Site.objects.update(hostname="joy.test")
+        self.home = Page.objects.get(slug='home')
+        self.user = User.objects.create_user('i', 'i@joy.test', 's3cr3t')
+        self.calendar = CalendarPage(owner = self.user,
+                                     slug  = "events",
+                                     title = "Events")
+        self.home.add_child(instance=self.calendar)
+        self.calendar.save_revision().publish()
+
+    def _makeFeed(self, numEvents):
+        lines = [b"BEGIN:VCALENDAR",
+                 b"VERSION:2.0",
+                 b"PRODID:-//Bloor &amp; Spadina - ECPv4.6.13//NONSGML v1.0//EN"]
+        for num in range(numEvents):
+            lines += [b"BEGIN:VEVENT",
+                      b"DTSTART;TZID=UTC+0:201805%02dT093000" % (num + 1),
+                      b"DTEND;TZID=UTC+0:201805%02dT113000" % (num + 1),
+                      b"DTSTAMP:20180402T054745",
+                      b"LAST-MODIFIED:20180304T225154Z",
+                      b"UID:import-%d@bloorneighbours.ca" % num,
+                      b"SUMMARY:Imported Event %d" % num,
+                      b"END:VEVENT"]
+        lines.append(b"END:VCALENDAR")
+        return b"\r\n".join(lines)
+
+    def _getEvents(self):
+        return SimpleEventPage.objects.child_of(self.calendar)               \
+                                      .order_by('date')
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testImportFile(self):
+        fd, path = tempfile.mkstemp(suffix=".ics")
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "wb") as ics:
+            ics.write(self._makeFeed(3))
+        out = StringIO()
+        call_command("joyous_import_ical", path,
+                     calendar=self.calendar.id, user="i", publish=True,
+                     batch_size=2, stdout=out)
+        events = self._getEvents()
+        self.assertEqual(len(events), 3)
+        self.assertTrue(all(event.live for event in events))
+        self.assertEqual(events[0].title, "Imported Event 0")
+        self.assertIn("2/3 events", out.getvalue())
+        self.assertIn("3/3 events", out.getvalue())
+        self.assertIn("3 iCal events loaded", out.getvalue())
+        self.assertRegex(out.getvalue(),
+                         r"Loaded 3 iCal events in [\d.]+ seconds "
+                         r"\([\d.]+ events/sec\)")
+        job = ICalImportJob.objects.get()
+        self.assertEqual(job.status, ICalImportJob.DONE)
+        self.assertEqual(job.num_loaded, 3)
+        self.assertEqual(len(job.getLoadedUids()), 3)
+        self.assertIsNotNone(job.finished_at)
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testResume(self):
+        job = ICalImportJob.objects.create(calendar = self.calendar,
+                                           user     = self.user,
+                                           name     = "feed.ics",
+                                           data     = self._makeFeed(3),
+                                           status   = ICalImportJob.FAILED)
+        job.checkpoint(["import-1@bloorneighbours.ca"])
+        out = StringIO()
+        call_command("joyous_import_ical", resume=job.id, stdout=out)
+        self.assertIn("Resuming feed.ics after 1 events", out.getvalue())
+        self.assertEqual([event.uid for event in self._getEvents()],
+                         ["import-0@bloorneighbours.ca",
+                          "import-2@bloorneighbours.ca"])
+        job.refresh_from_db()
+        self.assertEqual(job.status, ICalImportJob.DONE)
+        self.assertEqual(len(job.getLoadedUids()), 3)
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testNotResumedWhileRunning(self):
+        job = ICalImportJob.objects.create(calendar = self.calendar,
+                                           user     = self.user,
+                                           name     = "feed.ics",
+                                           data     = self._makeFeed(3),
+                                           status   = ICalImportJob.RUNNING,
+                                           heartbeat_at = timezone.now())
+        with self.assertRaises(CommandError):
+            call_command("joyous_import_ical", resume=job.id, stdout=StringIO())
+        out = StringIO()
+        call_command("joyous_import_ical", stdout=out)
+        self.assertIn("Ran 0 queued iCal imports", out.getvalue())
+        self.assertEqual(len(self._getEvents()), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ICalImportJob.RUNNING)
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testResumeForced(self):
+        job = ICalImportJob.objects.create(calendar = self.calendar,
+                                           user     = self.user,
+                                           name     = "feed.ics",
+                                           data     = self._makeFeed(3),
+                                           status   = ICalImportJob.RUNNING,
+                                           heartbeat_at = timezone.now())
+        call_command("joyous_import_ical", resume=job.id, force=True,
+                     stdout=StringIO())
+        self.assertEqual(len(self._getEvents()), 3)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ICalImportJob.DONE)
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testResumeDied(self):
+        # e.g. its process was killed before it could record the failure
+        job = ICalImportJob.objects.create(calendar = self.calendar,
+                                           user     = self.user,
+                                           name     = "feed.ics",
+                                           data     = self._makeFeed(3),
+                                           status   = ICalImportJob.RUNNING,
+                                           heartbeat_at = datetimetz(2018,3,6,8,20))
+        job.checkpoint(["import-0@bloorneighbours.ca"])
+        with self.assertRaises(CommandError):
+            call_command("joyous_import_ical", resume=job.id, stale_after=60,
+                         stdout=StringIO())
+        out = StringIO()
+        call_command("joyous_import_ical", resume=job.id, stdout=out)
+        self.assertIn("Resuming feed.ics after 1 events", out.getvalue())
+        self.assertEqual(len(self._getEvents()), 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ICalImportJob.DONE)
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testQueuedDied(self):
+        job = ICalImportJob.objects.create(calendar = self.calendar,
+                                           user     = self.user,
+                                           name     = "feed.ics",
+                                           data     = self._makeFeed(2),
+                                           status   = ICalImportJob.RUNNING,
+                                           heartbeat_at = datetimetz(2018,3,6,8,20))
+        out = StringIO()
+        call_command("joyous_import_ical", stdout=out)
+        self.assertIn("Ran 1 queued iCal imports", out.getvalue())
+        self.assertEqual(len(self._getEvents()), 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ICalImportJob.DONE)
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testHeartbeat(self):
+        job = ICalImportJob.objects.create(calendar = self.calendar,
+                                           user     = self.user,
+                                           name     = "feed.ics",
+                                           data     = self._makeFeed(3))
+        with patch.object(ICalImportJob, "beat", autospec=True,
+                          side_effect=ICalImportJob.beat) as beat:
+            call_command("joyous_import_ical", resume=job.id, batch_size=2,
+                         stdout=StringIO())
+        self.assertEqual(beat.call_count, 2)
+        job.refresh_from_db()
+        self.assertEqual(job.heartbeat_at, timezone.now())
+
+    def testCheckpointQueries(self):
+        job = ICalImportJob.objects.create(calendar = self.calendar,
+                                           user     = self.user,
+                                           name     = "feed.ics",
+                                           data     = self._makeFeed(3))
+        for batch in range(3):
+            uids = ["import-{}-{}@bloorneighbours.ca".format(batch, num)
+                    for num in range(100)]
+            with self.assertNumQueries(1):
+                job.checkpoint(uids)
+        self.assertEqual(len(job.getLoadedUids()), 300)
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testLongPath(self):
+        tmpDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpDir)
+        dirPath = os.path.join(tmpDir, "d" * 100, "i" * 100, "r" * 100)
+        os.makedirs(dirPath)
+        path = os.path.join(dirPath, "feed.ics")
+        with open(path, "wb") as ics:
+            ics.write(self._makeFeed(1))
+        call_command("joyous_import_ical", path,
+                     calendar=self.calendar.id, user="i", stdout=StringIO())
+        job = ICalImportJob.objects.get()
+        self.assertEqual(job.status, ICalImportJob.DONE)
+        self.assertEqual(len(job.name), 255)
+        self.assertTrue(job.name.endswith("/feed.ics"))
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testFailedBatch(self):
+        job = ICalImportJob.objects.create(calendar = self.calendar,
+                                           user     = self.user,
+                                           name     = "feed.ics",
+                                           data     = self._makeFeed(3))
+        saveRevision = SimpleEventPage.save_revision
+        def failThird(page, *args, **kwargs):
+            if page.uid == "import-2@bloorneighbours.ca":
+                raise RuntimeError("Crash")
+            return saveRevision(page, *args, **kwargs)
+        with patch.object(SimpleEventPage, "save_revision", failThird):
+            with self.assertRaises(Exception):
+                call_command("joyous_import_ical", batch_size=2,
+                             stdout=StringIO(), stderr=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ICalImportJob.FAILED)
+        self.assertEqual(job.error, "failed: Crash")
+        self.assertEqual(len(job.getLoadedUids()), 2)
+        self.assertEqual(len(self._getEvents()), 2)
+
+        call_command("joyous_import_ical", resume=job.id, stdout=StringIO())
+        self.assertEqual(len(self._getEvents()), 3)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ICalImportJob.DONE)
+        self.assertEqual(job.error, "")
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testFailedJobsSkipped(self):
+        bad = ICalImportJob.objects.create(calendar = self.calendar,
+                                           user     = None,
+                                           name     = "orphan.ics",
+                                           data     = self._makeFeed(1))
+        good = ICalImportJob.objects.create(calendar = self.calendar,
+                                            user     = self.user,
+                                            name     = "feed.ics",
+                                            data     = self._makeFeed(2))
+        out = StringIO()
+        err = StringIO()
+        with self.assertRaises(CommandError) as raised:
+            call_command("joyous_import_ical", stdout=out, stderr=err)
+        self.assertEqual(str(raised.exception), "1 of 2 iCal imports failed")
+        self.assertIn("Ran 2 queued iCal imports", out.getvalue())
+        self.assertIn("iCal import orphan.ics has no user", err.getvalue())
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, ICalImportJob.FAILED)
+        self.assertEqual(bad.error, "has no user")
+        good.refresh_from_db()
+        self.assertEqual(good.status, ICalImportJob.DONE)
+        self.assertEqual(len(self._getEvents()), 2)
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testQueuedFromAdmin(self):
+        request = RequestFactory().post("/")
+        request.user = self.user
+        request.site = self.home.get_site()
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        upload = SimpleUploadedFile("feed.ics", self._makeFeed(2))
+        with patch.object(ICalHandler, "background", True):
+            ICalHandler().load(self.calendar, request, upload, utc2local=True)
+        self.assertEqual(len(self._getEvents()), 0)
+        job = ICalImportJob.objects.get()
+        self.assertEqual(job.status, ICalImportJob.PENDING)
+        self.assertEqual(job.user, self.user)
+        self.assertTrue(job.utc2local)
+        msgs = list(request._messages)
+        self.assertEqual(msgs[0].message, "iCal import feed.ics queued")
+
+        out = StringIO()
+        call_command("joyous_import_ical", stdout=out)
+        self.assertIn("Ran 1 queued iCal imports", out.getvalue())
+        self.assertEqual(len(self._getEvents()), 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ICalImportJob.DONE)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -0,0 +1,58 @@
+# ------------------------------------------------------------------------------
+# Test Import Time
+# ------------------------------------------------------------------------------
+import sys
+import os
+import re
+import subprocess
+from unittest import skipIf
+from django.test import SimpleTestCase
+import ls.joyous
+
+# ------------------------------------------------------------------------------
+@skipIf(sys.version_info < (3, 7), "-X importtime needs Python 3.7")
+class Test(SimpleTestCase):
+    # Libraries which Joyous should only import when they are first needed
+    LAZY = ["holidays", "icalendar", "num2words", "ls.joyous.formats",
+            "ls.joyous.holidays"]
+
+    # Generous limit on the time spent in Joyous's own modules (microseconds)
+    BUDGET = 500000
+
+    SCRIPT = "import django; django.setup(); "                               \
+             "import ls.joyous.models, ls.joyous.wagtail_hooks"
+
+    def _getImportTimes(self):
+        env = dict(os.environ)
+        env['DJANGO_SETTINGS_MODULE'] = "ls.joyous.tests.settings"
+        topDir = os.path.dirname(os.path.dirname(os.path.dirname(
+                                 os.path.abspath(ls.joyous.__file__))))
+        env['PYTHONPATH'] = os.pathsep.join(filter(None,
+                                [topDir, env.get('PYTHONPATH')]))
+        result = subprocess.run([sys.executable, "-X", "importtime",
+                                 "-c", self.SCRIPT],
+                                env=env,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        times = {}
+        for line in result.stderr.splitlines():
+            match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)",
+                             line)
+            if match:
+                times[match.group(4)] = int(match.group(1))
+        return times
+
+    def testImportTime(self):
+        times = self._getImportTimes()
+        self.assertIn("ls.joyous.models.events", times)
+        for name in self.LAZY:
+            self.assertNotIn(name, times, "{} was imported".format(name))
+        ownTime = sum(usecs for name, usecs in times.items()
+                      if name.startswith("ls.joyous"))
+        self.assertLess(ownTime, self.BUDGET)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
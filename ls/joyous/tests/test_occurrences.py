@@ -0,0 +1,508 @@
+# ------------------------------------------------------------------------------
+# Test Event Occurrences
+# ------------------------------------------------------------------------------
+import sys
+import datetime as dt
+import pytz
+from importlib import import_module
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth.models import User
+from wagtail.core.models import Page
+from ls.joyous.models import (RecurringEventPage, EventOccurrence,
+        CancellationPage, PostponementPage, ExtraInfoPage, GeneralCalendarPage,
+        SimpleEventPage)
+from ls.joyous.models.events import EventsByTimeList
+from ls.joyous.utils.recurrence import Recurrence, WEEKLY, MO, TU, WE, FR
+from .testutils import freeze_timetz, datetimetz
+
+# ------------------------------------------------------------------------------
+class Test(TestCase):
+    def setUp(self):
+        self.home = Page.objects.get(slug='home')
+        self.user = User.objects.create_user('i', 'i@joy.test', 's3(r3t')
+        self.calendar = GeneralCalendarPage(owner = self.user,
+                                            slug  = "events",
+                                            title = "Events")
+        self.home.add_child(instance=self.calendar)
+        self.calendar.save_revision().publish()
+        self.event = RecurringEventPage(owner = self.user,
+                                        slug  = "lunch",
+                                        title = "Lunch",
+                                        repeat = Recurrence(dtstart=dt.date(2018,3,5),
+                                                            until=dt.date(2018,6,29),
+                                                            freq=WEEKLY,
+                                                            byweekday=[MO,WE,FR]),
+                                        time_from = dt.time(12),
+                                        time_to   = dt.time(13))
+        self.calendar.add_child(instance=self.event)
+
+    def _publishCancellation(self, exceptDate, title=""):
+        cancellation = CancellationPage(owner = self.user,
+                                        overrides = self.event,
+                                        except_date = exceptDate,
+                                        cancellation_title = title)
+        self.event.add_child(instance=cancellation)
+        cancellation.save_revision().publish()
+        return cancellation
+
+    def _getRequest(self):
+        request = RequestFactory().get("/test")
+        request.user = self.user
+        request.session = {}
+        return request
+
+    def testNotMaterialized(self):
+        self.assertIsNone(self.event.occurrences_until)
+        self.assertFalse(EventOccurrence.objects.exists())
+
+    def testPublish(self):
+        self.event.save_revision().publish()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.occurrences_until, dt.date.max)
+        occurrences = self.event.occurrences.all()
+        self.assertEqual(len(occurrences), 51)
+        first = occurrences[0]
+        self.assertEqual(first.date, dt.date(2018,3,5))
+        self.assertEqual(first.start.date(), dt.date(2018,3,5))
+        self.assertEqual(first.exception, "")
+        self.assertEqual(occurrences[50].date, dt.date(2018,6,29))
+
+    @freeze_timetz("2018-04-01 10:00")
+    def testHorizon(self):
+        self.event.repeat = Recurrence(dtstart=dt.date(2018,3,5),
+                                       freq=WEEKLY,
+                                       byweekday=[MO,WE,FR])
+        self.event.save_revision().publish()
+        self.event.refresh_from_db()
+        horizon = dt.date(2018,4,1) + dt.timedelta(days=730)
+        self.assertEqual(self.event.occurrences_until, horizon)
+        last = self.event.occurrences.last()
+        self.assertLessEqual(last.date, horizon)
+        events = RecurringEventPage.events.byDay(horizon - dt.timedelta(days=7),
+                                                 horizon + dt.timedelta(days=7))
+        self.assertEqual(sum(len(evod.days_events) for evod in events), 6)
+
+    def testUnpublish(self):
+        self.event.save_revision().publish()
+        self.event.unpublish()
+        self.event.refresh_from_db()
+        self.assertIsNone(self.event.occurrences_until)
+        self.assertFalse(self.event.occurrences.exists())
+
+    def testSaveChangedRule(self):
+        self.event.save_revision().publish()
+        self.event.repeat = Recurrence(dtstart=dt.date(2018,3,5),
+                                       until=dt.date(2018,6,29),
+                                       freq=WEEKLY,
+                                       byweekday=[TU])
+        self.event.save()
+        self.event.refresh_from_db()
+        self.assertIsNone(self.event.occurrences_until)
+        events = RecurringEventPage.events.byDay(dt.date(2018,4,1),
+                                                 dt.date(2018,4,7))
+        self.assertEqual([evod.date for evod in events if evod.days_events],
+                         [dt.date(2018,4,3)])
+        self.event.save_revision().publish()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.occurrences_until, dt.date.max)
+        self.assertEqual(self.event.occurrences.count(), 17)
+
+    def testDelete(self):
+        self.event.save_revision().publish()
+        self._publishCancellation(dt.date(2018,3,7))
+        self.event.delete()
+        self.assertFalse(EventOccurrence.objects.exists())
+
+    def testExceptions(self):
+        self.event.save_revision().publish()
+        cancellation = self._publishCancellation(dt.date(2018,3,7))
+        info = ExtraInfoPage(owner = self.user,
+                             overrides = self.event,
+                             except_date = dt.date(2018,3,9),
+                             extra_title = "Pizza")
+        self.event.add_child(instance=info)
+        info.save_revision().publish()
+        postponement = PostponementPage(owner = self.user,
+                                        overrides = self.event,
+                                        except_date = dt.date(2018,3,12),
+                                        postponement_title = "Late Lunch",
+                                        date = dt.date(2018,3,13))
+        self.event.add_child(instance=postponement)
+        postponement.save_revision().publish()
+        kinds = dict(self.event.occurrences.exclude(exception="")
+                                           .values_list('date', 'exception'))
+        self.assertEqual(kinds, {dt.date(2018,3,7):  "cancellation",
+                                 dt.date(2018,3,9):  "extra-info",
+                                 dt.date(2018,3,12): "postponement"})
+        info.unpublish()
+        self.assertEqual(self.event.occurrences.get(date=dt.date(2018,3,9))
+                                               .exception, "")
+        cancellation.delete()
+        self.assertEqual(self.event.occurrences.get(date=dt.date(2018,3,7))
+                                               .exception, "")
+
+    def testByDay(self):
+        self._publishCancellation(dt.date(2018,4,9), "No lunch today")
+        unmaterialized = RecurringEventPage.events.byDay(dt.date(2018,4,1),
+                                                         dt.date(2018,4,30))
+        self.event.save_revision().publish()
+        materialized = RecurringEventPage.events.byDay(dt.date(2018,4,1),
+                                                       dt.date(2018,4,30))
+        self.assertEqual(len(materialized), 30)
+        for evod1, evod2 in zip(materialized, unmaterialized):
+            self.assertEqual(evod1.date, evod2.date)
+            self.assertEqual(evod1.days_events, evod2.days_events)
+            self.assertEqual(evod1.continuing_events, evod2.continuing_events)
+        evod = materialized[8]
+        self.assertEqual(evod.date, dt.date(2018,4,9))
+        self.assertEqual(evod.days_events[0].title, "No lunch today")
+
+    def testByDayQueries(self):
+        self.event.save_revision().publish()
+        self._publishCancellation(dt.date(2018,4,9), "No lunch today")
+        request = self._getRequest()
+        with CaptureQueriesContext(connection) as oneEvent:
+            list(RecurringEventPage.events(request)
+                                   .byDay(dt.date(2018,4,1),
+                                          dt.date(2018,4,30)))
+        for num in range(5):
+            event = RecurringEventPage(owner = self.user,
+                                       slug  = "tea{}".format(num),
+                                       title = "Tea {}".format(num),
+                                       repeat = self.event.repeat,
+                                       time_from = dt.time(15),
+                                       time_to   = dt.time(16))
+            self.calendar.add_child(instance=event)
+            event.save_revision().publish()
+            cancellation = CancellationPage(owner = self.user,
+                                            overrides = event,
+                                            except_date = dt.date(2018,4,11),
+                                            cancellation_title = "No tea")
+            event.add_child(instance=cancellation)
+            cancellation.save_revision().publish()
+        request = self._getRequest()
+        with CaptureQueriesContext(connection) as sixEvents:
+            events = list(RecurringEventPage.events(request)
+                                            .byDay(dt.date(2018,4,1),
+                                                   dt.date(2018,4,30)))
+        self.assertEqual(len(sixEvents), len(oneEvent))
+        evod = events[10]
+        self.assertEqual(evod.date, dt.date(2018,4,11))
+        self.assertEqual(len(evod.days_events), 6)
+        self.assertEqual(sum(1 for ev in evod.days_events
+                             if ev.title == "No tea"), 5)
+
+    def _getTablesQueried(self, fromDate, toDate):
+        with CaptureQueriesContext(connection) as queries:
+            events = list(RecurringEventPage.events.byDay(fromDate, toDate))
+        tables = {table for table in ("joyous_eventoccurrence",
+                                      "joyous_extrainfopage",
+                                      "joyous_cancellationpage")
+                  if any('FROM "{}"'.format(table) in query['sql']
+                         for query in queries)}
+        return events, tables
+
+    def testByDayOnlyNeededExceptions(self):
+        self.event.save_revision().publish()
+        self._publishCancellation(dt.date(2018,3,9), "No lunch today")
+        # no exceptions in April
+        events, tables = self._getTablesQueried(dt.date(2018,4,1),
+                                                dt.date(2018,4,30))
+        self.assertEqual(tables, {"joyous_eventoccurrence"})
+        self.assertEqual(sum(len(evod.all_events) for evod in events), 13)
+        # a cancellation, but no extra info in March
+        events, tables = self._getTablesQueried(dt.date(2018,3,1),
+                                                dt.date(2018,3,31))
+        self.assertEqual(tables, {"joyous_eventoccurrence",
+                                  "joyous_cancellationpage"})
+        self.assertEqual(events[8].days_events[0].title, "No lunch today")
+
+    def testByDayOccurrenceTimes(self):
+        self.event.save_revision().publish()
+        occurrence = self.event.occurrences.get(date=dt.date(2018,4,9))
+        self.assertEqual(occurrence.start, datetimetz(2018,4,9,12))
+        self.assertEqual(occurrence.finish, datetimetz(2018,4,9,13))
+        EventOccurrence.objects.filter(id=occurrence.id)                     \
+                               .update(start=datetimetz(2018,4,10,12),
+                                       finish=datetimetz(2018,4,10,13))
+        events = list(RecurringEventPage.events.byDay(dt.date(2018,4,9),
+                                                      dt.date(2018,4,10)))
+        # the stored times are what is used
+        self.assertEqual(events[0].all_events, [])
+        self.assertEqual(events[1].days_events[0].title, "Lunch")
+        self.assertEqual(events[1].all_spans,
+                         [(datetimetz(2018,4,10,12), datetimetz(2018,4,10,13))])
+
+    def testByDayNoOccurrences(self):
+        self.event.save_revision().publish()
+        events = RecurringEventPage.events.byDay(dt.date(2019,4,1),
+                                                 dt.date(2019,4,30))
+        self.assertEqual(len(events), 30)
+        self.assertEqual(sum(len(evod.all_events) for evod in events), 0)
+
+    def testCommand(self):
+        out = StringIO()
+        call_command("joyous_refresh_occurrences", stdout=out)
+        self.assertIn("Refreshed the occurrences of 1 recurring events",
+                      out.getvalue())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.occurrences_until, dt.date.max)
+        self.assertEqual(self.event.occurrences.count(), 51)
+        self.assertIn("Refreshed the occurrence times of 1 events",
+                      out.getvalue())
+
+# ------------------------------------------------------------------------------
+class TestTimes(TestCase):
+    @freeze_timetz("2018-04-03 10:00")
+    def setUp(self):
+        self.home = Page.objects.get(slug='home')
+        self.user = User.objects.create_user('i', 'i@joy.test', 's3(r3t')
+        self.calendar = GeneralCalendarPage(owner = self.user,
+                                            slug  = "events",
+                                            title = "Events")
+        self.home.add_child(instance=self.calendar)
+        self.calendar.save_revision().publish()
+        self.event = RecurringEventPage(owner = self.user,
+                                        slug  = "lunch",
+                                        title = "Lunch",
+                                        repeat = Recurrence(dtstart=dt.date(2018,3,5),
+                                                            until=dt.date(2018,6,29),
+                                                            freq=WEEKLY,
+                                                            byweekday=[MO,WE,FR]),
+                                        time_from = dt.time(12),
+                                        time_to   = dt.time(13))
+        self.calendar.add_child(instance=self.event)
+        self.party = SimpleEventPage(owner = self.user,
+                                     slug  = "party",
+                                     title = "Party",
+                                     date  = dt.date(2018,4,7),
+                                     time_from = dt.time(20))
+        self.calendar.add_child(instance=self.party)
+
+    def testSimpleTimes(self):
+        self.assertEqual(self.party.next_occurrence_at,
+                         datetimetz(2018,4,7,20))
+        self.assertEqual(self.party.last_occurrence_at,
+                         datetimetz(2018,4,7,20))
+
+    def testRecurringTimes(self):
+        self.assertEqual(self.event.next_occurrence_at,
+                         datetimetz(2018,4,4,12))
+        self.assertEqual(self.event.last_occurrence_at,
+                         datetimetz(2018,4,2,12))
+
+    @freeze_timetz("2018-04-03 10:00")
+    def testCancellation(self):
+        cancellation = CancellationPage(owner = self.user,
+                                        overrides = self.event,
+                                        except_date = dt.date(2018,4,4))
+        self.event.add_child(instance=cancellation)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.next_occurrence_at,
+                         datetimetz(2018,4,6,12))
+        cancellation.delete()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.next_occurrence_at,
+                         datetimetz(2018,4,4,12))
+
+    @freeze_timetz("2018-04-05 10:00")
+    def testUpcoming(self):
+        events = list(RecurringEventPage.events.upcoming())
+        self.assertEqual(events, [self.event])
+        self.assertEqual(events[0].next_occurrence_at,
+                         datetimetz(2018,4,6,12))
+        self.assertEqual(events[0].last_occurrence_at,
+                         datetimetz(2018,4,4,12))
+        self.assertEqual(list(SimpleEventPage.events.upcoming()), [self.party])
+        self.assertEqual(list(SimpleEventPage.events.past()), [])
+
+    @freeze_timetz("2018-07-01 10:00")
+    def testPast(self):
+        self.assertEqual(list(RecurringEventPage.events.upcoming()), [])
+        events = list(RecurringEventPage.events.past())
+        self.assertEqual(events, [self.event])
+        self.assertIsNone(events[0].next_occurrence_at)
+        self.assertEqual(events[0].last_occurrence_at,
+                         datetimetz(2018,6,29,12))
+        self.assertEqual(list(SimpleEventPage.events.past()), [self.party])
+
+    @freeze_timetz("2018-04-05 10:00")
+    def testUpcomingQueries(self):
+        call_command("joyous_refresh_occurrences", stdout=StringIO())
+        with self.assertNumQueries(2):
+            list(RecurringEventPage.events.upcoming())
+
+    @freeze_timetz("2018-04-05 10:00")
+    def testStaleNotStored(self):
+        events = RecurringEventPage.events.upcoming()
+        self.assertEqual(events.count(), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(list(events[:1]), [self.event])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.next_occurrence_at,
+                         datetimetz(2018,4,4,12))
+        call_command("joyous_refresh_occurrences", stdout=StringIO())
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.next_occurrence_at,
+                         datetimetz(2018,4,6,12))
+
+    @freeze_timetz("2018-04-05 10:00")
+    def testOnlyRefreshedInQueryset(self):
+        other = RecurringEventPage(owner = self.user,
+                                   slug  = "tea",
+                                   title = "Tea",
+                                   repeat = self.event.repeat,
+                                   time_from = dt.time(15))
+        self.calendar.add_child(instance=other)
+        RecurringEventPage.objects.filter(id=other.id)                       \
+                          .update(next_occurrence_at=datetimetz(2018,4,4,15))
+        list(RecurringEventPage.events.filter(slug="lunch").upcoming())
+        other.refresh_from_db()
+        self.assertEqual(other.next_occurrence_at, datetimetz(2018,4,4,15))
+
+    def testNoTimesNotStale(self):
+        info = ExtraInfoPage(owner = self.user,
+                             overrides = self.event,
+                             except_date = dt.date(2018,4,3),
+                             extra_title = "Not lunch")
+        self.event.add_child(instance=info)
+        self.assertIsNone(info.next_occurrence_at)
+        self.assertIsNotNone(info.occurrence_times_at)
+        with self.assertNumQueries(1):
+            list(ExtraInfoPage.events.upcoming())
+
+    @freeze_timetz("2018-04-03 10:00")
+    def testAllDayTimesInEventZone(self):
+        picnic = SimpleEventPage(owner = self.user,
+                                 slug  = "picnic",
+                                 title = "Picnic",
+                                 date  = dt.date(2018,4,8),
+                                 tz    = pytz.timezone("Pacific/Auckland"))
+        with timezone.override("America/Los_Angeles"):
+            self.calendar.add_child(instance=picnic)
+        self.assertEqual(picnic.next_occurrence_at,
+                         pytz.timezone("Pacific/Auckland")
+                             .localize(dt.datetime(2018,4,8,23,59,59,999999)))
+
+    def _addStaleTeas(self):
+        teas = []
+        for num in range(4):
+            tea = RecurringEventPage(owner = self.user,
+                                     slug  = "tea{}".format(num),
+                                     title = "Tea {}".format(num),
+                                     repeat = self.event.repeat,
+                                     time_from = dt.time(15))
+            self.calendar.add_child(instance=tea)
+            teas.append(tea)
+        RecurringEventPage.objects.filter(slug__startswith="tea")            \
+                          .update(next_occurrence_at=datetimetz(2018,4,4,15),
+                                  last_occurrence_at=datetimetz(2018,4,2,15))
+        return teas
+
+    @freeze_timetz("2018-04-05 10:00")
+    def testStaleUpcoming(self):
+        teas = self._addStaleTeas()
+        with freeze_timetz("2018-04-05 10:00"):
+            # the lunch times are up to date, the teas are not
+            self.event._refreshOccurrenceTimes()
+        events = list(RecurringEventPage.events.upcoming())
+        self.assertEqual(events, [self.event] + teas)
+        self.assertEqual(events[1].next_occurrence_at, datetimetz(2018,4,6,15))
+        # worked out, but not stored
+        self.assertEqual(RecurringEventPage.objects
+                             .filter(next_occurrence_at__lt=timezone.now())
+                             .count(), 4)
+
+    @freeze_timetz("2018-04-05 10:00")
+    def testStalePast(self):
+        teas = self._addStaleTeas()
+        self.event._refreshOccurrenceTimes()
+        events = list(RecurringEventPage.events.past())
+        self.assertEqual(events, teas[::-1] + [self.event])
+        self.assertEqual(events[0].last_occurrence_at, datetimetz(2018,4,4,15))
+
+    @freeze_timetz("2018-04-05 10:00")
+    def testStaleInPages(self):
+        teas = self._addStaleTeas()
+        self.event._refreshOccurrenceTimes()
+        events = EventsByTimeList([RecurringEventPage.events.upcoming().this()],
+                                  'next_occurrence_at')
+        self.assertEqual(events.count(), 5)
+        self.assertEqual([event.page for event in events[:2]],
+                         [self.event, teas[0]])
+        after = events.after(*events.cursor(events[1]))
+        self.assertEqual([event.page for event in after], teas[1:])
+
+    @freeze_timetz("2018-04-03 10:00")
+    def testPopulatedByMigration(self):
+        info = ExtraInfoPage(owner = self.user,
+                             overrides = self.event,
+                             except_date = dt.date(2018,4,4),
+                             extra_title = "Not lunch")
+        self.event.add_child(instance=info)
+        for Event in (RecurringEventPage, SimpleEventPage, ExtraInfoPage):
+            Event.objects.update(next_occurrence_at=None,
+                                 last_occurrence_at=None,
+                                 occurrence_times_at=None)
+        self._migrate()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.next_occurrence_at,
+                         datetimetz(2018,4,6,12))
+        self.assertEqual(self.event.last_occurrence_at,
+                         datetimetz(2018,4,2,12))
+        self.party.refresh_from_db()
+        self.assertEqual(self.party.next_occurrence_at,
+                         datetimetz(2018,4,7,20))
+        info.refresh_from_db()
+        self.assertEqual(info.next_occurrence_at, datetimetz(2018,4,4,12))
+        self.assertIsNotNone(info.occurrence_times_at)
+
+    @freeze_timetz("2018-04-03 10:00")
+    def testPostponementPopulatedByMigration(self):
+        postponement = PostponementPage(owner = self.user,
+                                        overrides = self.event,
+                                        except_date = dt.date(2018,4,4),
+                                        postponement_title = "Late lunch",
+                                        date      = dt.date(2018,4,5),
+                                        time_from = dt.time(13))
+        self.event.add_child(instance=postponement)
+        allDay = PostponementPage(owner = self.user,
+                                  overrides = self.event,
+                                  except_date = dt.date(2018,4,6),
+                                  postponement_title = "Lunch all day",
+                                  date      = dt.date(2018,4,7))
+        self.event.add_child(instance=allDay)
+        RecurringEventPage.objects.update(tz=pytz.timezone("Asia/Tokyo"))
+        PostponementPage.objects.update(next_occurrence_at=None,
+                                        last_occurrence_at=None,
+                                        occurrence_times_at=None)
+        self._migrate()
+        tokyo = pytz.timezone("Asia/Tokyo")
+        postponement.refresh_from_db()
+        self.assertEqual(postponement.next_occurrence_at,
+                         tokyo.localize(dt.datetime(2018,4,5,13)))
+        self.assertEqual(postponement.last_occurrence_at,
+                         tokyo.localize(dt.datetime(2018,4,5,13)))
+        self.assertIsNotNone(postponement.occurrence_times_at)
+        allDay.refresh_from_db()
+        self.assertEqual(allDay.next_occurrence_at,
+                         tokyo.localize(dt.datetime(2018,4,7,23,59,59,999999)))
+
+    def _migrate(self):
+        # run the data migration with the models as they were before it
+        migration = import_module("ls.joyous.migrations."
+                                  "0018_populate_occurrence_times")
+        executor = MigrationExecutor(connection)
+        state = executor.loader.project_state(("joyous",
+                                               "0017_occurrence_times"))
+        migration.populate(state.apps, None)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
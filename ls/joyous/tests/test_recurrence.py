@@ -1,6 +1,8 @@
 # ------------------------------------------------------------------------------
 import sys
 import datetime as dt
+import random
+from itertools import takewhile, islice
 from dateutil.rrule import rrule
 from django.test import TestCase
 from ls.joyous.utils.recurrence import Recurrence, Weekday
@@ -130,6 +132,142 @@ class TestRecurrence(TestCase):
                                                           tzinfo=dt.timezone.utc)),
                         "FREQ=DAILY;INTERVAL=2;WKST=SU;UNTIL=20110111T235959Z")
 
+# ------------------------------------------------------------------------------
+class TestPeriodicParity(TestCase):
+    """The arithmetic expansion of simple rules must match dateutil's"""
+    def _getRules(self):
+        rand = random.Random(5545)
+        days = [MO, TU, WE, TH, FR, SA, SU]
+        for num in range(200):
+            kwargs = {'dtstart': dt.date(2016,1,1) +
+                                 dt.timedelta(days=rand.randrange(800)),
+                      'freq':     rand.choice([DAILY, WEEKLY, MONTHLY]),
+                      'interval': rand.choice([1, 1, 2, 3, 5]),
+                      'wkst':     rand.choice([MO, SU, WE])}
+            if rand.random() < 0.6:
+                kwargs['byweekday'] = rand.sample(days, rand.randint(1, 4))
+            if kwargs['freq'] == MONTHLY or rand.random() < 0.1:
+                if rand.random() < 0.7:
+                    kwargs['bymonthday'] = rand.sample([1, 5, 15, 28, 29, 30,
+                                                        31, -1, -2, -31],
+                                                       rand.randint(1, 3))
+            if rand.random() < 0.2:
+                kwargs['bymonth'] = rand.sample(range(1, 13),
+                                                rand.randint(1, 6))
+            limit = rand.random()
+            if limit < 0.3:
+                kwargs['count'] = rand.randint(1, 40)
+            elif limit < 0.6:
+                kwargs['until'] = kwargs['dtstart'] +                        \
+                                  dt.timedelta(days=rand.randrange(1500))
+            yield kwargs
+
+    def testIter(self):
+        numFast = 0
+        for kwargs in self._getRules():
+            rr = Recurrence(**kwargs)
+            rule = rrule(**kwargs)
+            numFast += rr._periodic is not None
+            expected = [occurence.date() for occurence in
+                        takewhile(lambda when: when.year < 2024, rule)]
+            occurrences = list(takewhile(lambda when: when.year < 2024, rr))
+            self.assertEqual(occurrences, expected, repr(rr))
+        self.assertEqual(numFast, 200)
+
+    def testBetween(self):
+        rand = random.Random(2445)
+        for kwargs in self._getRules():
+            rr = Recurrence(**kwargs)
+            rule = rrule(**kwargs)
+            after = kwargs['dtstart'] + dt.timedelta(days=rand.randrange(-60, 900))
+            before = after + dt.timedelta(days=rand.randrange(0, 120))
+            for inc in (True, False):
+                expected = [occurence.date() for occurence in
+                            rule.between(dt.datetime.combine(after, dt.time.min),
+                                         dt.datetime.combine(before, dt.time.min),
+                                         inc)]
+                self.assertEqual(rr.between(after, before, inc), expected,
+                                 "{!r} {} {} {}".format(rr, after, before, inc))
+
+    def testBeforeAfterContains(self):
+        rand = random.Random(1728)
+        for kwargs in self._getRules():
+            rr = Recurrence(**kwargs)
+            rule = rrule(**kwargs)
+            date = kwargs['dtstart'] + dt.timedelta(days=rand.randrange(-60, 900))
+            when = dt.datetime.combine(date, dt.time.min)
+            for inc in (True, False):
+                for method in ("before", "after"):
+                    expected = getattr(rule, method)(when, inc)
+                    if expected is not None:
+                        expected = expected.date()
+                    self.assertEqual(getattr(rr, method)(date, inc), expected,
+                                     "{!r} {} {} {}".format(rr, method,
+                                                            date, inc))
+            self.assertEqual(rr.contains(date), when in rule,
+                             "{!r} {}".format(rr, date))
+            self.assertEqual(date in rr, when in rule)
+
+    def testIterAfterBefore(self):
+        rand = random.Random(3021)
+        for kwargs in self._getRules():
+            rr = Recurrence(**kwargs)
+            date = kwargs['dtstart'] + dt.timedelta(days=rand.randrange(-60, 900))
+            for inc in (True, False):
+                after = list(islice(rr.iterAfter(date, inc), 3))
+                before = list(islice(rr.iterBefore(date, inc), 3))
+                expected = []
+                for occurence in after:
+                    expected.append(rr.after(expected[-1] if expected else date,
+                                             inc and not expected))
+                self.assertEqual(after, expected, "{!r} {} {}".format(rr, date, inc))
+                expected = []
+                for occurence in before:
+                    expected.append(rr.before(expected[-1] if expected else date,
+                                              inc and not expected))
+                self.assertEqual(before, expected, "{!r} {} {}".format(rr, date, inc))
+
+    def testNeverMatches(self):
+        # 30 February, so these have to give up without reaching year 9999
+        for freq, interval in [(DAILY, 3), (WEEKLY, 2), (MONTHLY, 1)]:
+            rr = Recurrence(dtstart=dt.date(2019,1,1),
+                            freq=freq,
+                            interval=interval,
+                            bymonth=[2],
+                            bymonthday=[30])
+            self.assertIsNotNone(rr._periodic)
+            self.assertEqual(list(rr), [])
+            self.assertIsNone(rr.after(dt.date(2019,1,1)))
+            self.assertIsNone(rr.before(dt.date(9000,1,1)))
+            self.assertEqual(rr.between(dt.date(2019,1,1),
+                                        dt.date(9000,1,1)), [])
+
+    def testComplexFallback(self):
+        rr = Recurrence(dtstart=dt.date(2009,1,1),
+                        freq=MONTHLY,
+                        byweekday=[MO(1), FR(-1)])
+        self.assertIsNone(rr._periodic)
+        self.assertEqual(rr.between(dt.date(2019,1,1), dt.date(2019,2,28)),
+                         [dt.date(2019,1,7), dt.date(2019,1,25),
+                          dt.date(2019,2,4), dt.date(2019,2,22)])
+        self.assertEqual(rr.after(dt.date(2019,1,7)), dt.date(2019,1,25))
+        self.assertEqual(rr.before(dt.date(2019,1,25), inc=True),
+                         dt.date(2019,1,25))
+        self.assertEqual(list(islice(rr.iterAfter(dt.date(2019,1,7)), 2)),
+                         [dt.date(2019,1,25), dt.date(2019,2,4)])
+        self.assertEqual(list(islice(rr.iterBefore(dt.date(2019,2,4),
+                                                   inc=True), 2)),
+                         [dt.date(2019,2,4), dt.date(2019,1,25)])
+        self.assertTrue(rr.contains(dt.date(2019,2,4)))
+        self.assertFalse(rr.contains(dt.date(2019,2,5)))
+        rr = Recurrence(dtstart=dt.date(2009,1,1),
+                        freq=YEARLY,
+                        bymonth=[3],
+                        bymonthday=[17])
+        self.assertIsNone(rr._periodic)
+        self.assertEqual(rr.between(dt.date(2019,1,1), dt.date(2020,12,31)),
+                         [dt.date(2019,3,17), dt.date(2020,3,17)])
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
@@ -3,8 +3,10 @@
 # ------------------------------------------------------------------------------
 import sys
 import datetime as dt
+import pickle
 import pytz
 import calendar
+from django.core.signals import request_started, request_finished
 from django.test import TestCase, RequestFactory
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -206,6 +208,74 @@ class Test(TestCase):
         self.assertIs(self.event._occursOn(dt.date(2018,3,6)), True)
         self.assertIs(self.event._occursOn(dt.date(2018,3,13)), False)
 
+    @freeze_timetz("2018-03-01 10:00")
+    def testMemoized(self):
+        request = RequestFactory().get("/test")
+        request.user = self.user
+        request.session = {}
+        event = RecurringEventPage.objects.get(id=self.event.id)
+        with self.assertNumQueries(3):
+            # cancellations, extra info and postponements, once each
+            event.next_date
+            event._upcoming_datetime_from
+            event.prev_date
+            event._past_datetime_from
+            event.status
+            event._nextOn(request)
+            event._occursOn(dt.date(2018,3,6))
+        with self.assertNumQueries(0):
+            self.assertEqual(event.next_date, dt.date(2018,3,6))
+            self.assertEqual(event.status, None)
+
+    @freeze_timetz("2018-03-01 10:00")
+    def testMemoForgotten(self):
+        self.assertEqual(self.event.next_date, dt.date(2018,3,6))
+        cancellation = CancellationPage(owner = self.user,
+                                        overrides = self.event,
+                                        except_date = dt.date(2018,3,6))
+        self.event.add_child(instance=cancellation)
+        self.assertEqual(self.event.next_date, dt.date(2018,4,3))
+        self.assertIs(self.event._occursOn(dt.date(2018,3,6)), False)
+        cancellation.delete()
+        self.assertEqual(self.event.next_date, dt.date(2018,3,6))
+        self.event.repeat = Recurrence(dtstart=dt.date(2017,8,5),
+                                       freq=MONTHLY,
+                                       byweekday=[TU(2)])
+        self.event.save()
+        self.assertEqual(self.event.next_date, dt.date(2018,3,13))
+
+    @freeze_timetz("2018-03-01 10:00")
+    def testMemoNotShared(self):
+        event = RecurringEventPage.objects.get(id=self.event.id)
+        self.assertEqual(event.next_date, dt.date(2018,3,6))
+        copy = pickle.loads(pickle.dumps(event))
+        self.assertNotIn('_occurrenceMemo', copy.__dict__)
+        self.assertIn('_occurrenceMemo', event.__dict__)
+        cancellation = CancellationPage(owner = self.user,
+                                        overrides = self.event,
+                                        except_date = dt.date(2018,3,6))
+        self.event.add_child(instance=cancellation)
+        self.assertEqual(copy.next_date, dt.date(2018,4,3))
+        self.assertEqual(RecurringEventPage.objects.get(id=self.event.id)
+                                                   .next_date,
+                         dt.date(2018,4,3))
+
+    @freeze_timetz("2018-03-01 10:00")
+    def testMemoForRequest(self):
+        event = RecurringEventPage.objects.get(id=self.event.id)
+        request_started.send(sender=self.__class__)
+        self.assertEqual(event.next_date, dt.date(2018,3,6))
+        CancellationPage.objects.create(owner = self.user,
+                                        overrides = self.event,
+                                        except_date = dt.date(2018,3,6),
+                                        path = self.event.path + "0001",
+                                        depth = self.event.depth + 1,
+                                        title = "Cancelled")
+        self.assertEqual(event.next_date, dt.date(2018,3,6))
+        request_finished.send(sender=self.__class__)
+        request_started.send(sender=self.__class__)
+        self.assertEqual(event.next_date, dt.date(2018,4,3))
+
 # ------------------------------------------------------------------------------
 class TestTZ(TestCase):
     def setUp(self):
@@ -0,0 +1,138 @@
+# ------------------------------------------------------------------------------
+# Test Restrictions Utilities
+# ------------------------------------------------------------------------------
+import sys
+import datetime as dt
+from django.contrib.auth.models import User, AnonymousUser, Group
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory, override_settings
+from unittest.mock import patch
+from wagtail.core.models import Page, PageViewRestriction
+from ls.joyous.models import GeneralCalendarPage, SimpleEventPage
+from ls.joyous.utils.restrictions import (getRestrictionProfile,
+        getRestrictedPaths)
+
+# ------------------------------------------------------------------------------
+@override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+@patch("ls.joyous.utils.restrictions._RESTRICTIONS_CACHE_TIMEOUT", 60)
+class Test(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.home = Page.objects.get(slug='home')
+        self.user = User.objects.create_user('i', 'i@joy.test', 's3(r3t')
+        self.friends = Group.objects.create(name = "Friends")
+        self.calendar = GeneralCalendarPage(owner = self.user,
+                                            slug  = "events",
+                                            title = "Events")
+        self.home.add_child(instance=self.calendar)
+        self.party = SimpleEventPage(owner = self.user,
+                                     slug  = "party",
+                                     title = "Party",
+                                     date  = dt.date(2019,1,1))
+        self.calendar.add_child(instance=self.party)
+        self.meeting = SimpleEventPage(owner = self.user,
+                                       slug  = "meeting",
+                                       title = "Meeting",
+                                       date  = dt.date(2019,1,2))
+        self.calendar.add_child(instance=self.meeting)
+
+    def _getRequest(self, user=None):
+        request = RequestFactory().get("/test")
+        request.user = user or AnonymousUser()
+        request.session = {}
+        return request
+
+    def _restrict(self, page, restrictionType, **kwargs):
+        restriction = PageViewRestriction.objects.create(page = page,
+                                           restriction_type = restrictionType,
+                                           **kwargs)
+        return restriction
+
+    def testProfile(self):
+        self.user.groups.set([self.friends])
+        request = self._getRequest(self.user)
+        self.assertEqual(getRestrictionProfile(request),
+                         (True, False, (self.friends.id,), ()))
+        request = self._getRequest()
+        request.session[PageViewRestriction.passed_view_restrictions_session_key] = [3, 1]
+        self.assertEqual(getRestrictionProfile(request),
+                         (False, False, (), (1, 3)))
+
+    def testNoRestrictions(self):
+        self.assertEqual(getRestrictedPaths(self._getRequest()), [])
+
+    def testNestedCollapsed(self):
+        self._restrict(self.calendar, PageViewRestriction.LOGIN)
+        self._restrict(self.party, PageViewRestriction.LOGIN)
+        self.assertEqual(getRestrictedPaths(self._getRequest()),
+                         [self.calendar.path])
+        self.assertEqual(getRestrictedPaths(self._getRequest(self.user)), [])
+
+    def testGroups(self):
+        restriction = self._restrict(self.party, PageViewRestriction.GROUPS)
+        restriction.groups.set([self.friends])
+        self.assertEqual(getRestrictedPaths(self._getRequest(self.user)),
+                         [self.party.path])
+        self.user.groups.set([self.friends])
+        self.assertEqual(getRestrictedPaths(self._getRequest(self.user)), [])
+
+    def testPassword(self):
+        restriction = self._restrict(self.party, PageViewRestriction.PASSWORD,
+                                     password="s3cr3t")
+        request = self._getRequest()
+        self.assertEqual(getRestrictedPaths(request), [self.party.path])
+        request = self._getRequest()
+        KEY = PageViewRestriction.passed_view_restrictions_session_key
+        request.session[KEY] = [restriction.id]
+        self.assertEqual(getRestrictedPaths(request), [])
+
+    def testMemoized(self):
+        self._restrict(self.party, PageViewRestriction.LOGIN)
+        request = self._getRequest()
+        getRestrictedPaths(request)
+        with self.assertNumQueries(0):
+            paths = getRestrictedPaths(request)
+        self.assertEqual(paths, [self.party.path])
+
+    def testKeptBetweenRequests(self):
+        self._restrict(self.party, PageViewRestriction.LOGIN)
+        getRestrictedPaths(self._getRequest())
+        with self.assertNumQueries(0):
+            paths = getRestrictedPaths(self._getRequest())
+        self.assertEqual(paths, [self.party.path])
+
+    def testNotKeptBetweenRequests(self):
+        with patch("ls.joyous.utils.restrictions._RESTRICTIONS_CACHE_TIMEOUT",
+                   0):
+            self.assertEqual(getRestrictedPaths(self._getRequest()), [])
+            # as if saved by another process, without invalidating this one
+            PageViewRestriction.objects.bulk_create([
+                    PageViewRestriction(page = self.party,
+                                        restriction_type = PageViewRestriction.LOGIN)])
+            self.assertEqual(getRestrictedPaths(self._getRequest()),
+                             [self.party.path])
+
+    def testInvalidated(self):
+        self._restrict(self.party, PageViewRestriction.LOGIN)
+        self.assertEqual(getRestrictedPaths(self._getRequest()),
+                         [self.party.path])
+        restriction = self._restrict(self.meeting, PageViewRestriction.LOGIN)
+        self.assertEqual(getRestrictedPaths(self._getRequest()),
+                         [self.party.path, self.meeting.path])
+        restriction.delete()
+        self.assertEqual(getRestrictedPaths(self._getRequest()),
+                         [self.party.path])
+
+    def testMoved(self):
+        self._restrict(self.party, PageViewRestriction.LOGIN)
+        self.assertEqual(getRestrictedPaths(self._getRequest()),
+                         [self.party.path])
+        self.party.move(self.meeting, "last-child")
+        self.party.refresh_from_db()
+        self.assertEqual(getRestrictedPaths(self._getRequest()),
+                         [self.party.path])
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -5,9 +5,11 @@ import sys
 import datetime as dt
 import pytz
 from django.test import TestCase
+from django.utils import timezone
 from .testutils import datetimetz
 from ls.joyous.utils.telltime import (getAwareDatetime, getLocalDatetime,
-        getLocalDateAndTime, getLocalDate, getLocalTime,
+        getLocalDateAndTime, getLocalDate, getLocalTime, getLocalDatetimes,
+        getConversionCacheInfo, clearConversionCache,
         timeFrom, timeTo, timeFormat, dateFormat, dateFormatDMY)
 
 # ------------------------------------------------------------------------------
@@ -62,6 +64,47 @@ class TestLocalTimes(TestCase):
         localTZ = pytz.timezone("Asia/Tokyo")
         self.assertEqual(time, dt.time(19,44).replace(tzinfo=localTZ))
 
+# ------------------------------------------------------------------------------
+class TestConversionCache(TestCase):
+    def setUp(self):
+        clearConversionCache()
+
+    def testHitsAndMisses(self):
+        prague = pytz.timezone("Europe/Prague")
+        when1 = getLocalDatetime(dt.date(2017,3,23), dt.time(18), prague)
+        info = getConversionCacheInfo()
+        self.assertEqual(info.hits, 0)
+        self.assertGreater(info.misses, 0)
+        when2 = getLocalDatetime(dt.date(2017,3,23), dt.time(18), prague)
+        self.assertEqual(when1, when2)
+        self.assertEqual(getConversionCacheInfo().hits, 1)
+        self.assertEqual(getConversionCacheInfo().misses, info.misses)
+        clearConversionCache()
+        self.assertEqual(getConversionCacheInfo().currsize, 0)
+
+    def testCurrentTimeZone(self):
+        prague = pytz.timezone("Europe/Prague")
+        when = getLocalDatetime(dt.date(2017,3,23), dt.time(18), prague)
+        self.assertEqual(when.tzinfo.zone, "Asia/Tokyo")
+        with timezone.override("Pacific/Auckland"):
+            when = getLocalDatetime(dt.date(2017,3,23), dt.time(18), prague)
+            self.assertEqual(when.tzinfo.zone, "Pacific/Auckland")
+            self.assertEqual(when.time(), dt.time(6))
+            when = getAwareDatetime(dt.date(2017,3,23), dt.time(18), None)
+            self.assertEqual(when.tzinfo.zone, "Pacific/Auckland")
+        when = getAwareDatetime(dt.date(2017,3,23), dt.time(18), None)
+        self.assertEqual(when.tzinfo.zone, "Asia/Tokyo")
+
+    def testGetLocalDatetimes(self):
+        prague = pytz.timezone("Europe/Prague")
+        whens = getLocalDatetimes([(dt.date(2017,3,23), dt.time(18), prague),
+                                   (dt.date(2019,1,1),  dt.time(1),  None),
+                                   (dt.date(2006,6,22), None,        prague)],
+                                  dt.time(0))
+        self.assertEqual(whens, [datetimetz(2017,3,24,2),
+                                 datetimetz(2019,1,1,1),
+                                 datetimetz(2006,6,22,0)])
+
 # ------------------------------------------------------------------------------
 class TestNullableTimes(TestCase):
     def testTimeFrom(self):
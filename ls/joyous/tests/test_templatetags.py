@@ -3,8 +3,10 @@
 # ------------------------------------------------------------------------------
 import sys
 import datetime as dt
+from unittest.mock import patch
 from django.contrib.auth.models import User
-from django.test import TestCase, RequestFactory
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory, override_settings
 from django.utils import timezone
 from django.template import Context, Template, TemplateSyntaxError
 from django.test import TestCase, RequestFactory
@@ -582,6 +584,83 @@ class TestNoCalendar(TestCase):
         self.assertEqual(len(select("tbody td.noday")), 4)
         self.assertEqual(len(select('tbody td.day span.event')), 14)
 
+# ------------------------------------------------------------------------------
+@override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+@patch.object(CalendarPage, "CacheTimeout", 300)
+class TestTagCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('i', 'i@joy.test', 's3cr3t')
+        home = getPage("/home/")
+        self.calendar = CalendarPage(owner = self.user,
+                                     slug  = "events",
+                                     title = "Events")
+        home.add_child(instance=self.calendar)
+        self.calendar.save_revision().publish()
+        self.event = SimpleEventPage(owner = self.user,
+                                     slug  = "public-lecture",
+                                     title = "The Human Condition",
+                                     date  = dt.date(1984,9,14),
+                                     time_from = dt.time(19))
+        self.calendar.add_child(instance=self.event)
+        self.event.save_revision().publish()
+        self.request = RequestFactory().get("/test")
+        self.request.user = self.user
+        self.request.session = {}
+        self.request.site = Site.objects.get(is_default_site=True)
+
+    def _render(self, tag):
+        return Template("{% load joyous_tags %}{% " + tag + " %}")           \
+                       .render(Context({'request': self.request}))
+
+    @freeze_timetz("1984-09-11 10:00")
+    def testEventsThisWeek(self):
+        out = self._render("events_this_week")
+        self.assertIn("The Human Condition", out)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._render("events_this_week"), out)
+        self.event.title = "The Human Environment"
+        self.event.save_revision().publish()
+        out = self._render("events_this_week")
+        self.assertNotIn("The Human Condition", out)
+        self.assertIn("The Human Environment", out)
+
+    @freeze_timetz("1984-09-11 10:00")
+    def testMinicalendar(self):
+        out = self._render("minicalendar")
+        self.assertIn('title="The Human Condition"', out)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._render("minicalendar"), out)
+        self.event.unpublish()
+        out = self._render("minicalendar")
+        self.assertNotIn('title="The Human Condition"', out)
+
+    @freeze_timetz("1984-09-11 10:00")
+    def testSiteCalendar(self):
+        self.assertEqual(CalendarPage._getSiteCalendarId(self.request),
+                         self.calendar.id)
+        with self.assertNumQueries(0):
+            calendarId = CalendarPage._getSiteCalendarId(self.request)
+        self.assertEqual(calendarId, self.calendar.id)
+        self.calendar.unpublish()
+        self.assertIsNone(CalendarPage._getSiteCalendarId(self.request))
+        self.calendar.save_revision().publish()
+        self.assertEqual(CalendarPage._getSiteCalendarId(self.request),
+                         self.calendar.id)
+
+    def testSiteCalendarExpires(self):
+        with freeze_timetz("1984-09-11 10:00") as frozen:
+            CalendarPage._getSiteCalendarId(self.request)
+            frozen.tick(dt.timedelta(seconds=299))
+            with self.assertNumQueries(0):
+                CalendarPage._getSiteCalendarId(self.request)
+            frozen.tick(dt.timedelta(seconds=2))
+            with self.assertNumQueries(1):
+                calendarId = CalendarPage._getSiteCalendarId(self.request)
+        self.assertEqual(calendarId, self.calendar.id)
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
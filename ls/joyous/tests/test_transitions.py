@@ -0,0 +1,77 @@
+# ------------------------------------------------------------------------------
+# Test Time Zone Transition Tables
+# ------------------------------------------------------------------------------
+import sys
+import datetime as dt
+import pytz
+from django.test import TestCase
+from ls.joyous.utils.transitions import (getTransitionTable, convertDatetime,
+        TransitionTable)
+
+# ------------------------------------------------------------------------------
+class Test(TestCase):
+    ZONES = ["Pacific/Auckland", "America/Toronto", "Europe/London",
+             "Australia/Lord_Howe", "Asia/Kolkata", "America/St_Johns",
+             "Pacific/Chatham", "Etc/GMT+5", "UTC"]
+
+    def _getWhens(self):
+        # every 7 hours and 13 minutes through a couple of years
+        when = dt.datetime(2018, 1, 1)
+        step = dt.timedelta(hours=7, minutes=13)
+        while when < dt.datetime(2020, 1, 1):
+            yield when
+            when += step
+
+    def testLocalize(self):
+        for name in self.ZONES:
+            tz = pytz.timezone(name)
+            table = getTransitionTable(tz)
+            for when in self._getWhens():
+                aware = table.localize(when)
+                try:
+                    expected = tz.localize(when, is_dst=None)
+                except (pytz.AmbiguousTimeError, pytz.NonExistentTimeError):
+                    self.assertIsNone(aware)
+                else:
+                    self.assertEqual(aware, expected)
+                    self.assertIs(aware.tzinfo, expected.tzinfo)
+
+    def testFromUtc(self):
+        for name in self.ZONES:
+            tz = pytz.timezone(name)
+            table = getTransitionTable(tz)
+            for when in self._getWhens():
+                aware = table.fromutc(when)
+                expected = pytz.utc.localize(when).astimezone(tz)
+                self.assertEqual(aware, expected)
+                self.assertIs(aware.tzinfo, expected.tzinfo)
+
+    def testConvert(self):
+        auckland = pytz.timezone("Pacific/Auckland")
+        toronto = pytz.timezone("America/Toronto")
+        when = convertDatetime(dt.datetime(2019, 6, 1, 9), auckland, toronto)
+        self.assertEqual(when.tzinfo.zone, "America/Toronto")
+        self.assertEqual(when.replace(tzinfo=None), dt.datetime(2019, 5, 31, 17))
+
+    def testConvertAwkward(self):
+        toronto = pytz.timezone("America/Toronto")
+        # non-existent
+        self.assertIsNone(convertDatetime(dt.datetime(2019, 3, 10, 2, 30),
+                                          toronto, pytz.utc))
+        # ambiguous
+        self.assertIsNone(convertDatetime(dt.datetime(2019, 11, 3, 1, 30),
+                                          toronto, pytz.utc))
+
+    def testNotPytz(self):
+        self.assertIsNone(getTransitionTable(dt.timezone.utc))
+        self.assertIsNone(convertDatetime(dt.datetime(2019, 6, 1, 9),
+                                          dt.timezone.utc, pytz.utc))
+
+    def testCached(self):
+        tz = pytz.timezone("Pacific/Auckland")
+        self.assertIs(getTransitionTable(tz), getTransitionTable(tz))
+        self.assertIsInstance(getTransitionTable(tz), TransitionTable)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -8,12 +8,15 @@ from django.contrib.auth.models import User
 from django.contrib.messages.storage.fallback import FallbackStorage
 from django.contrib import messages
 from django.utils import timezone
+from django.db import connection
 from django.test import TestCase, RequestFactory
-from wagtail.core.models import Site, Page
+from django.test.utils import CaptureQueriesContext
+from wagtail.core.models import Site, Page, PageViewRestriction
 from ls.joyous.utils.recurrence import Recurrence
 from ls.joyous.utils.recurrence import DAILY, WEEKLY, YEARLY, MO, TU, WE, TH, FR, SA
 from ls.joyous.models import (CalendarPage, SimpleEventPage, RecurringEventPage,
-        CancellationPage, PostponementPage, ExtraInfoPage, GroupPage)
+        CancellationPage, PostponementPage, ExtraInfoPage, GroupPage,
+        getEventFromUid)
 from ls.joyous.formats.ical import (CalendarTypeError,
         CalendarNotInitializedError, VCalendar)
 from freezegun import freeze_time
@@ -520,6 +523,110 @@ class TestUpdate(TestCase):
         cancellation = cancellations[1]
         self.assertEqual(cancellation.except_date, dt.date(2018,10,25))
 
+    def _makeFeed(self, numEvents, modified=b"20180304T225154Z"):
+        lines = [b"BEGIN:VCALENDAR",
+                 b"VERSION:2.0",
+                 b"PRODID:-//Bloor &amp; Spadina - ECPv4.6.13//NONSGML v1.0//EN"]
+        for num in range(numEvents):
+            lines += [b"BEGIN:VEVENT",
+                      b"DTSTART;TZID=UTC+0:201805%02dT093000" % (num + 1),
+                      b"DTEND;TZID=UTC+0:201805%02dT113000" % (num + 1),
+                      b"DTSTAMP:20180402T054745",
+                      b"LAST-MODIFIED:" + modified,
+                      b"UID:bulk-%d@bloorneighbours.ca" % num,
+                      b"SUMMARY:Bulk Event %d" % num,
+                      b"END:VEVENT"]
+        lines.append(b"END:VCALENDAR")
+        return b"\r\n".join(lines)
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testLoadInBatches(self):
+        reports = []
+        def progress(uids, numDone, numTotal):
+            reports.append((len(uids), numDone, numTotal))
+        vcal = VCalendar(self.calendar, batchSize=2, progress=progress)
+        request = self._getRequest()
+        vcal.load(request, self._makeFeed(5))
+        self.assertEqual(reports, [(2, 2, 5), (2, 4, 5), (1, 5, 5)])
+        events = SimpleEventPage.events.child_of(self.calendar)            \
+                                       .filter(uid__startswith="bulk-")
+        self.assertEqual(events.count(), 5)
+        msgs = list(messages.get_messages(request))
+        self.assertEqual(msgs[0].message, "5 iCal events loaded")
+
+        # loading the same feed again has nothing to do
+        reports.clear()
+        request = self._getRequest()
+        vcal.load(request, self._makeFeed(5))
+        self.assertEqual(reports, [])
+        self.assertEqual(list(messages.get_messages(request)), [])
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testLoadUnchangedQueries(self):
+        vcal = VCalendar(self.calendar)
+        vcal.load(self._getRequest(), self._makeFeed(6))
+        numQueries = []
+        for numEvents in (1, 6):
+            with CaptureQueriesContext(connection) as queries:
+                vcal.load(self._getRequest(), self._makeFeed(numEvents))
+            numQueries.append(len(queries))
+        self.assertEqual(numQueries[0], numQueries[1])
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testLoadRestricted(self):
+        event = SimpleEventPage.objects.get(slug="mini-fair")
+        PageViewRestriction.objects.create(page = event,
+                                           restriction_type = "password",
+                                           password = "s3cr3t")
+        data  = b"\r\n".join([
+                b"BEGIN:VCALENDAR",
+                b"VERSION:2.0",
+                b"PRODID:-//Bloor &amp; Spadina - ECPv4.6.13//NONSGML v1.0//EN",
+                b"BEGIN:VEVENT",
+                b"DTSTART;TZID=UTC+0:20180407T093000",
+                b"DTEND;TZID=UTC+0:20180407T113000",
+                b"DTSTAMP:20180402T054745",
+                b"LAST-MODIFIED:20180304T225154Z",
+                b"UID:978-1523093400-1523100600@bloorneighbours.ca",
+                b"SUMMARY:Mini-Fair & Garage Sale",
+                b"END:VEVENT",
+                b"END:VCALENDAR",])
+        vcal = VCalendar(self.calendar)
+        vcal.load(self._getRequest(), data)
+        event.refresh_from_db()
+        self.assertEqual(event.title, "Mini-Fair")
+        self.assertEqual(SimpleEventPage.objects.filter(uid=event.uid).count(), 1)
+
+    @freeze_timetz("2018-03-06 9:00")
+    def testLoadUidInOtherSite(self):
+        root = Page.objects.get(depth=1)
+        otherHome = Page(slug="other", title="Other Home")
+        root.add_child(instance=otherHome)
+        Site.objects.create(hostname="other.test", root_page=otherHome)
+        otherCalendar = CalendarPage(owner = self.user,
+                                     slug  = "events",
+                                     title = "Other Events")
+        otherHome.add_child(instance=otherCalendar)
+        other = SimpleEventPage(owner = self.user,
+                                slug  = "bulk-0",
+                                title = "Other Bulk Event",
+                                date  = dt.date(2018,5,1),
+                                uid   = "bulk-0@bloorneighbours.ca")
+        otherCalendar.add_child(instance=other)
+        vcal = VCalendar(self.calendar)
+        request = self._getRequest()
+        self.assertEqual(vcal.load(request, self._makeFeed(2)), (1, 1))
+        self.assertEqual(SimpleEventPage.objects.filter(uid=other.uid).get(),
+                         other)
+        self.assertEqual(getEventFromUid(request, other.uid), other)
+        events = SimpleEventPage.events.child_of(self.calendar)            \
+                                       .filter(uid__startswith="bulk-")
+        self.assertEqual([event.uid for event in events],
+                         ["bulk-1@bloorneighbours.ca"])
+        msgs = [msg.message for msg in messages.get_messages(request)]
+        self.assertIn("1 iCal events have UIDs already used by events "
+                      "outside of this calendar", msgs)
+
 # ------------------------------------------------------------------------------
 class TestNoCalendar(TestCase):
     @freeze_timetz("2012-08-01 13:00")
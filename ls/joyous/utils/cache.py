@@ -0,0 +1,42 @@
+# ------------------------------------------------------------------------------
+# Cache utilities
+# ------------------------------------------------------------------------------
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import caches
+
+# ------------------------------------------------------------------------------
+def getCache():
+    """
+    Returns the Django cache that Joyous uses (see JOYOUS_CACHE).
+    """
+    return caches[getattr(settings, "JOYOUS_CACHE", "default")]
+
+def getGeneration(name):
+    """
+    Returns the current generation of the named set of cache entries.  Include
+    this in their keys so they can all be invalidated at once.
+
+    Generations are random tokens rather than counters, so if the generation
+    is evicted from the cache the entries of an earlier generation cannot be
+    found again.
+    """
+    key = "joyous:generation:{}".format(name)
+    cache = getCache()
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid4().hex, None)
+        generation = cache.get(key)
+    return generation
+
+def nextGeneration(name):
+    """
+    Invalidate the named set of cache entries by moving on to their next
+    generation.
+    """
+    key = "joyous:generation:{}".format(name)
+    getCache().set(key, uuid4().hex, None)
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
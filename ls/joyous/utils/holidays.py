@@ -0,0 +1,55 @@
+# ------------------------------------------------------------------------------
+# Holiday tables
+# ------------------------------------------------------------------------------
+# python-holidays is only imported when a table is first filled in
+import datetime as dt
+from hashlib import md5
+from .cache import getCache
+
+__all__ = ["HolidayTable"]
+
+class HolidayTable:
+    """
+    The holidays given by a string like NZ[WTL,Nelson],AU[*] as a table of
+    dates to names.  Nothing is parsed until the first lookup, and the table
+    is then filled in a year at a time, as each year is asked for.  The years
+    are also kept in the Joyous cache so other processes can share them.
+    """
+    def __init__(self, holidaysStr):
+        self.holidaysStr = holidaysStr.strip()
+        self._holidays = None
+        self._years = {}
+
+    def get(self, date, default=None):
+        """
+        Returns the names of any holidays on the given date.
+        """
+        names = self._years.get(date.year)
+        if names is None:
+            names = self._years[date.year] = self._getYear(date.year)
+        return names.get(date, default)
+
+    def _getYear(self, year):
+        if not self.holidaysStr:
+            return {}
+        cache = getCache()
+        key = "joyous:holidays:{}:{}".format(
+                   md5(self.holidaysStr.encode()).hexdigest(), year)
+        names = cache.get(key)
+        if names is None:
+            names = self._calcYear(year)
+            cache.set(key, names, None)
+        return names
+
+    def _calcYear(self, year):
+        if self._holidays is None:
+            from ..holidays.parser import parseHolidays
+            self._holidays = parseHolidays(self.holidaysStr)
+        # looking up a date makes python-holidays fill in that year
+        self._holidays.get(dt.date(year, 1, 1))
+        return {date: name for date, name in self._holidays.items()
+                if date.year == year}
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
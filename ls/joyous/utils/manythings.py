@@ -4,10 +4,11 @@
 from django.utils.translation import get_language
 from django.utils.translation import to_locale
 from django.utils.translation import gettext as _, gettext_noop
-from num2words import num2words
 
 # ------------------------------------------------------------------------------
 def _n2w(n, to):
+    # num2words loads all its languages, so wait until it is needed
+    from num2words import num2words
     try:
         return num2words(n, lang=to_locale(get_language()), to=to)
     except NotImplementedError:
@@ -13,6 +13,7 @@ import sys
 from operator import attrgetter
 import calendar
 import datetime as dt
+import math
 from dateutil.rrule import rrule, rrulestr, rrulebase
 from dateutil.rrule import DAILY, WEEKLY, MONTHLY, YEARLY
 from dateutil.rrule import weekday as rrweekday
@@ -87,6 +88,7 @@ class Recurrence(rrulebase):
             self.rule = arg0
         else:
             self.rule = rrule(*args, **kwargs)
+        self._periodic = _PeriodicRule.fromRule(self.rule)
 
     # expose all rrule properties
     #: How often the recurrence repeats. (0,1,2,3)
@@ -183,8 +185,91 @@ class Recurrence(rrulebase):
             return []
 
     def _iter(self):
-        for occurence in self.rule._iter():
-            yield occurence.date()
+        if self._periodic is not None:
+            return self._periodic.iterFrom()
+        return (occurence.date() for occurence in self.rule._iter())
+
+    def between(self, after, before, inc=False, count=1):
+        """
+        Returns all the occurrences of the rule between after and before.
+        The inc keyword defines what happens if after and/or before are
+        themselves occurrences.  With inc=True, they will be included in the
+        list, if they are found in the recurrence set.
+        """
+        if (self._periodic is None or
+            type(after) is not dt.date or type(before) is not dt.date):
+            return super().between(after, before, inc, count)
+        occurrences = []
+        for occurence in self._periodic.iterFrom(after):
+            if occurence > before or (occurence == before and not inc):
+                break
+            if occurence > after or inc:
+                occurrences.append(occurence)
+        return occurrences
+
+    def after(self, date, inc=False):
+        """
+        Returns the first occurrence after the given date.  With inc=True,
+        if the date itself is an occurrence it will be returned.
+        """
+        if self._periodic is None or type(date) is not dt.date:
+            return super().after(date, inc)
+        if not inc:
+            date += dt.timedelta(days=1)
+        return next(self._periodic.iterFrom(date), None)
+
+    def before(self, date, inc=False):
+        """
+        Returns the last occurrence before the given date.  With inc=True,
+        if the date itself is an occurrence it will be returned.
+        """
+        if self._periodic is None or type(date) is not dt.date:
+            return super().before(date, inc)
+        if not inc:
+            date -= dt.timedelta(days=1)
+        return next(self._periodic.iterBackFrom(date), None)
+
+    def iterAfter(self, date, inc=False):
+        """
+        Yields the occurrences after the given date, in order.  With inc=True,
+        if the date itself is an occurrence it will be the first yielded.
+        """
+        if self._periodic is not None:
+            if not inc:
+                date += dt.timedelta(days=1)
+            yield from self._periodic.iterFrom(date)
+            return
+        for occurence in self._iter():
+            if occurence > date or (inc and occurence == date):
+                yield occurence
+
+    def iterBefore(self, date, inc=False):
+        """
+        Yields the occurrences before the given date, latest first.  With
+        inc=True, if the date itself is an occurrence it will be the first
+        yielded.
+        """
+        if self._periodic is not None:
+            if not inc:
+                date -= dt.timedelta(days=1)
+            yield from self._periodic.iterBackFrom(date)
+            return
+        occurrences = []
+        for occurence in self._iter():
+            if occurence > date or (not inc and occurence == date):
+                break
+            occurrences.append(occurence)
+        yield from reversed(occurrences)
+
+    def contains(self, date):
+        """
+        Returns True iff there is an occurrence on the given date.
+        """
+        if self._periodic is None or type(date) is not dt.date:
+            return super().__contains__(date)
+        return self._periodic.contains(date)
+
+    __contains__ = contains
 
     # __len__() introduces a large performance penality.
     def getCount(self):
@@ -316,6 +401,170 @@ class Recurrence(rrulebase):
             retval += " "+_("(until {when})").format(when=dateFormatDMY(until))
         return retval
 
+# ------------------------------------------------------------------------------
+class _PeriodicRule:
+    """
+    Expands the simple shapes of rule -- daily, weekly or monthly, optionally
+    limited by month, weekday and day of the month -- using date arithmetic
+    to go straight to the right period, rather than the general (and much
+    slower) machinery of dateutil.rrule.
+    """
+    @classmethod
+    def fromRule(cls, rule):
+        """Returns a _PeriodicRule for rule, or None if it is not simple."""
+        if (rule._freq not in (DAILY, WEEKLY, MONTHLY) or
+            rule._byweekno or rule._byyearday or rule._byeaster or
+            rule._bysetpos or rule._bynweekday or
+            rule._dtstart.tzinfo is not None or
+            len(rule._timeset or ()) != 1):
+            return None
+        return cls(rule)
+
+    def __init__(self, rule):
+        self.freq       = rule._freq
+        self.interval   = rule._interval
+        self.count      = rule._count
+        self.time       = rule._timeset[0]
+        self.startDt    = rule._dtstart
+        self.untilDt    = rule._until
+        self.months     = rule._bymonth or ()
+        self.weekdays   = rule._byweekday or ()
+        self.monthdays  = rule._bymonthday or ()
+        self.nmonthdays = rule._bynmonthday or ()
+        start = self.startDt.date()
+        if self.freq == DAILY:
+            self.firstDay = start
+        elif self.freq == WEEKLY:
+            self.firstDay = start - dt.timedelta(days=(start.weekday() -
+                                                       rule._wkst) % 7)
+        else:
+            self.firstMonth = start.year * 12 + start.month - 1
+        # The Gregorian calendar repeats every 400 years, which is 4800 months
+        # or 146097 days (a whole number of weeks), so a rule that matches
+        # nothing in a whole cycle of its periods never will
+        if self.freq == DAILY:
+            cycle = 146097
+        elif self.freq == WEEKLY:
+            cycle = 146097 // 7
+        else:
+            cycle = 4800
+        self.maxEmptyPeriods = cycle // math.gcd(cycle, self.interval)
+
+    def iterFrom(self, fromDate=None):
+        """Yields the occurrences on or after fromDate."""
+        period = 0
+        if fromDate is not None and not self.count:
+            # jump straight to the period fromDate is in
+            period = max(self._getPeriod(fromDate), 0)
+        numFound = 0
+        numEmpty = 0
+        while numEmpty < self.maxEmptyPeriods:
+            try:
+                days = self._getDays(period)
+            except (OverflowError, ValueError):
+                # gone past the end of time
+                return
+            numEmpty = numEmpty + 1 if not days else 0
+            for day in days:
+                when = dt.datetime.combine(day, self.time)
+                if when < self.startDt:
+                    continue
+                if self.untilDt is not None and when > self.untilDt:
+                    return
+                if self.count:
+                    numFound += 1
+                    if numFound > self.count:
+                        return
+                if fromDate is None or day >= fromDate:
+                    yield day
+            period += 1
+
+    def iterBackFrom(self, toDate):
+        """Yields the occurrences on or before toDate, latest first."""
+        if self.count:
+            # which occurrences are counted depends upon all the earlier ones
+            occurrences = []
+            for day in self.iterFrom():
+                if day > toDate:
+                    break
+                occurrences.append(day)
+            yield from reversed(occurrences)
+            return
+        if self.untilDt is not None:
+            toDate = min(toDate, self.untilDt.date())
+        period = self._getPeriod(toDate)
+        numEmpty = 0
+        while period >= 0 and numEmpty < self.maxEmptyPeriods:
+            try:
+                days = self._getDays(period)
+            except (OverflowError, ValueError):
+                # gone past the end of time
+                days = []
+            numEmpty = numEmpty + 1 if not days else 0
+            for day in reversed(days):
+                when = dt.datetime.combine(day, self.time)
+                if when < self.startDt:
+                    return
+                if day > toDate or (self.untilDt is not None and
+                                    when > self.untilDt):
+                    continue
+                yield day
+            period -= 1
+
+    def contains(self, date):
+        """Returns True iff there is an occurrence on date."""
+        if self.count:
+            return next(self.iterBackFrom(date), None) == date
+        when = dt.datetime.combine(date, self.time)
+        if when < self.startDt:
+            return False
+        if self.untilDt is not None and when > self.untilDt:
+            return False
+        period = self._getPeriod(date)
+        return period >= 0 and date in self._getDays(period)
+
+    def _getPeriod(self, date):
+        if self.freq == DAILY:
+            return (date - self.firstDay).days // self.interval
+        elif self.freq == WEEKLY:
+            return (date - self.firstDay).days // (7 * self.interval)
+        else:
+            month = date.year * 12 + date.month - 1
+            return (month - self.firstMonth) // self.interval
+
+    def _getDays(self, period):
+        if self.freq == DAILY:
+            days = [self.firstDay + dt.timedelta(days=period * self.interval)]
+        elif self.freq == WEEKLY:
+            weekStart = self.firstDay + dt.timedelta(days=7 * period *
+                                                     self.interval)
+            days = [weekStart + dt.timedelta(days=i) for i in range(7)]
+        else:
+            year, month = divmod(self.firstMonth + period * self.interval, 12)
+            month += 1
+            numDays = calendar.monthrange(year, month)[1]
+            if self.monthdays or self.nmonthdays:
+                mdays = {mday for mday in self.monthdays if mday <= numDays}
+                mdays.update(numDays + nmday + 1 for nmday in self.nmonthdays
+                             if -nmday <= numDays)
+                mdays = sorted(mdays)
+            else:
+                mdays = range(1, numDays + 1)
+            days = [dt.date(year, month, mday) for mday in mdays]
+        return [day for day in days if self._matches(day)]
+
+    def _matches(self, day):
+        if self.months and day.month not in self.months:
+            return False
+        if self.weekdays and day.weekday() not in self.weekdays:
+            return False
+        if self.freq != MONTHLY and (self.monthdays or self.nmonthdays):
+            numDays = calendar.monthrange(day.year, day.month)[1]
+            if (day.day not in self.monthdays and
+                day.day - numDays - 1 not in self.nmonthdays):
+                return False
+        return True
+
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
 # ------------------------------------------------------------------------------
@@ -0,0 +1,94 @@
+# ------------------------------------------------------------------------------
+# Page view restriction utilities
+# ------------------------------------------------------------------------------
+from hashlib import md5
+from django.conf import settings
+from wagtail.core.models import PageViewRestriction
+from .cache import getCache, getGeneration, nextGeneration
+
+# ------------------------------------------------------------------------------
+# seconds to cache the restricted paths for, 0 to not cache them
+_RESTRICTIONS_CACHE_TIMEOUT = getattr(settings,
+                                      "JOYOUS_RESTRICTIONS_CACHE_TIMEOUT", 0)
+
+# ------------------------------------------------------------------------------
+def getRestrictionProfile(request):
+    """
+    Returns a hashable description of what the viewer of this request is
+    allowed to see: whether they are logged in, whether they are a superuser,
+    the groups they belong to, and the password restrictions they have passed.
+    """
+    KEY    = PageViewRestriction.passed_view_restrictions_session_key
+    user   = request.user
+    passed = tuple(sorted(set(request.session.get(KEY, []))))
+    memo = getattr(request, "_joyous_restriction_profile", None)
+    if memo is not None and memo[0] is user and memo[1] == passed:
+        return memo[2]
+    if user.is_authenticated:
+        groups = tuple(sorted(user.groups.values_list('id', flat=True)))
+    else:
+        groups = ()
+    profile = (user.is_authenticated, user.is_superuser, groups, passed)
+    request._joyous_restriction_profile = (user, passed, profile)
+    return profile
+
+def getRestrictedPaths(request):
+    """
+    Returns the tree paths of the pages this request is not allowed to view,
+    sorted and with any paths nested under another one removed.
+
+    The paths are cached for each restriction profile (see
+    JOYOUS_RESTRICTIONS_CACHE_TIMEOUT) until the restrictions change, and are
+    remembered for the rest of the request on top of that.
+    """
+    profile = getRestrictionProfile(request)
+    memo = getattr(request, "_joyous_restricted_paths", None)
+    if memo is not None and memo[0] == profile:
+        return memo[1]
+    if _RESTRICTIONS_CACHE_TIMEOUT:
+        key = "joyous:restrictions:{}:{}".format(getGeneration("restrictions"),
+                                       md5(repr(profile).encode()).hexdigest())
+        cache = getCache()
+        paths = cache.get(key)
+        if paths is None:
+            paths = _compileRestrictedPaths(*profile)
+            cache.set(key, paths, _RESTRICTIONS_CACHE_TIMEOUT)
+    else:
+        paths = _compileRestrictedPaths(*profile)
+    request._joyous_restricted_paths = (profile, paths)
+    return paths
+
+def invalidateRestrictions():
+    """
+    Forget anything cached for a restriction profile, e.g. because a
+    restriction or a restricted page has changed.
+    """
+    nextGeneration("restrictions")
+
+def _compileRestrictedPaths(isAuthenticated, isSuperuser, groups, passed):
+    PASSWORD = PageViewRestriction.PASSWORD
+    LOGIN    = PageViewRestriction.LOGIN
+    GROUPS   = PageViewRestriction.GROUPS
+
+    restrictions = PageViewRestriction.objects.all()
+    if passed:
+        restrictions = restrictions.exclude(id__in=passed,
+                                            restriction_type=PASSWORD)
+    if isAuthenticated:
+        restrictions = restrictions.exclude(restriction_type=LOGIN)
+    if isSuperuser:
+        restrictions = restrictions.exclude(restriction_type=GROUPS)
+    elif groups:
+        restrictions = restrictions.exclude(groups__in=groups,
+                                            restriction_type=GROUPS)
+    paths = []
+    for path in sorted(set(restrictions.values_list('page__path', flat=True))):
+        # a restriction on an ancestor already covers this page
+        if paths and path.startswith(paths[-1]):
+            continue
+        paths.append(path)
+    return paths
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
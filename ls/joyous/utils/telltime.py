@@ -2,12 +2,14 @@
 # Date/time utilities
 # ------------------------------------------------------------------------------
 import datetime as dt
-from functools import wraps
+from collections import namedtuple
+from functools import lru_cache, wraps
 from inspect import signature
 from django.conf import settings
 from django.utils import dateformat
 from django.utils import timezone
 from django.utils.translation import gettext as _
+from .transitions import getTransitionTable, convertDatetime
 
 # ------------------------------------------------------------------------------
 def getLocalDate(*args, **kwargs):
@@ -38,16 +40,16 @@ def getLocalDatetime(date, time, tz=None, timeDefault=dt.time.max):
     Get a datetime in the local timezone from date and optionally time
     """
     localTZ = timezone.get_current_timezone()
-    if tz is None or tz == localTZ:
-        localDt = getAwareDatetime(date, time, tz, timeDefault)
-    else:
-        # create in event's time zone
-        eventDt = getAwareDatetime(date, time, tz, timeDefault)
-        # convert to local time zone
-        localDt = eventDt.astimezone(localTZ)
-        if time is None:
-            localDt = getAwareDatetime(localDt.date(), None, localTZ, timeDefault)
-    return localDt
+    return _getLocalDatetime(date, time, tz, localTZ, timeDefault)
+
+def getLocalDatetimes(whens, timeDefault=dt.time.max):
+    """
+    Get datetimes in the local timezone from a list of (date, time, tz)
+    tuples, where time and tz may be None
+    """
+    localTZ = timezone.get_current_timezone()
+    return [_getLocalDatetime(date, time, tz, localTZ, timeDefault)
+            for date, time, tz in whens]
 
 def getAwareDatetime(date, time, tz, timeDefault=dt.time.max):
     """
@@ -55,13 +57,63 @@ def getAwareDatetime(date, time, tz, timeDefault=dt.time.max):
     If time is not given it will default to timeDefault if that is given
     or if not then to the end of the day.
     """
+    if tz is None:
+        tz = timezone.get_current_timezone()
+    return _getAwareDatetime(date, time, tz, timeDefault)
+
+ConversionCacheInfo = namedtuple("ConversionCacheInfo",
+                                 "hits misses maxsize currsize")
+
+def getConversionCacheInfo():
+    """
+    Get the hits and misses of the cache of date and time conversions
+    """
+    infos = [_getLocalDatetime.cache_info(), _getAwareDatetime.cache_info()]
+    return ConversionCacheInfo(*(sum(values) for values in zip(*infos)))
+
+def clearConversionCache():
+    """
+    Forget all the date and time conversions that have been cached
+    """
+    _getLocalDatetime.cache_clear()
+    _getAwareDatetime.cache_clear()
+
+# datetimes are immutable, so the results of these conversions can be shared
+_CONVERSION_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=_CONVERSION_CACHE_SIZE)
+def _getLocalDatetime(date, time, tz, localTZ, timeDefault):
+    if tz is None or tz == localTZ:
+        localDt = _getAwareDatetime(date, time, tz or localTZ, timeDefault)
+    else:
+        datetime = dt.datetime.combine(date, timeDefault if time is None
+                                             else time)
+        localDt = None
+        if datetime.tzinfo is None:
+            # convert directly using the zones' offset transitions
+            localDt = convertDatetime(datetime, tz, localTZ)
+        if localDt is None:
+            # create in event's time zone
+            eventDt = _getAwareDatetime(date, time, tz, timeDefault)
+            # convert to local time zone
+            localDt = eventDt.astimezone(localTZ)
+        if time is None:
+            localDt = _getAwareDatetime(localDt.date(), None, localTZ,
+                                        timeDefault)
+    return localDt
+
+@lru_cache(maxsize=_CONVERSION_CACHE_SIZE)
+def _getAwareDatetime(date, time, tz, timeDefault):
     if time is None:
         time = timeDefault
     datetime = dt.datetime.combine(date, time)
-    # arbitary rule to handle DST transitions:
-    # if daylight savings causes an error then use standard time
-    datetime = timezone.make_aware(datetime, tz, is_dst=False)
-    return datetime
+    table = getTransitionTable(tz) if datetime.tzinfo is None else None
+    awareDt = table.localize(datetime) if table is not None else None
+    if awareDt is None:
+        # arbitary rule to handle DST transitions:
+        # if daylight savings causes an error then use standard time
+        awareDt = timezone.make_aware(datetime, tz, is_dst=False)
+    return awareDt
 
 def todayUtc():
     """
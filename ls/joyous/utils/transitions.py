@@ -0,0 +1,91 @@
+# ------------------------------------------------------------------------------
+# Time zone offset transition tables
+# pytz tzinfo.localize tries out every offset the zone could have around the
+# given time, which is slow when converting many times.  This looks up the
+# offset directly from the zone's table of UTC transition instants instead,
+# leaving the awkward ambiguous and non-existent times to pytz.
+# ------------------------------------------------------------------------------
+import datetime as dt
+from bisect import bisect_right
+from functools import lru_cache
+from pytz.tzinfo import BaseTzInfo
+
+_1day = dt.timedelta(days=1)
+
+# ------------------------------------------------------------------------------
+class TransitionTable:
+    """
+    The sorted UTC instants at which a pytz time zone changes its offset,
+    along with the offset and tzinfo which apply from each instant on.
+    """
+    def __init__(self, tz):
+        utcTimes = getattr(tz, '_utc_transition_times', None)
+        if utcTimes:
+            self.utcTimes = list(utcTimes)
+            self.offsets  = [info[0] for info in tz._transition_info]
+            self.tzinfos  = [tz._tzinfos[info] for info in tz._transition_info]
+        else:
+            # a zone with a fixed offset
+            self.utcTimes = [dt.datetime.min]
+            self.offsets  = [tz.utcoffset(None)]
+            self.tzinfos  = [tz]
+
+    def localize(self, naive):
+        """
+        Return the naive local datetime made aware in this zone, or None if
+        that wall clock time is ambiguous or does not exist.
+        """
+        # only intervals within a day of the wall clock time can hold it
+        found = None
+        num = len(self.utcTimes)
+        index = max(bisect_right(self.utcTimes, naive - _1day) - 1, 0)
+        while index < num and self.utcTimes[index] <= naive + _1day:
+            utc = naive - self.offsets[index]
+            if (self.utcTimes[index] <= utc and
+                (index + 1 == num or utc < self.utcTimes[index + 1])):
+                if found is not None:
+                    # ambiguous
+                    return None
+                found = index
+            index += 1
+        if found is None:
+            # non-existent
+            return None
+        return naive.replace(tzinfo=self.tzinfos[found])
+
+    def fromutc(self, utc):
+        """
+        Return the naive UTC datetime converted to an aware datetime in this
+        zone.
+        """
+        index = max(bisect_right(self.utcTimes, utc) - 1, 0)
+        return (utc + self.offsets[index]).replace(tzinfo=self.tzinfos[index])
+
+@lru_cache(maxsize=None)
+def getTransitionTable(tz):
+    """
+    Get the transition table for a pytz time zone, or None for other tzinfos.
+    """
+    if not isinstance(tz, BaseTzInfo):
+        return None
+    return TransitionTable(tz)
+
+def convertDatetime(naive, fromTz, toTz):
+    """
+    Convert the naive wall clock time in fromTz to an aware datetime in toTz.
+    Returns None if it cannot be done with the transition tables, because
+    either zone is not from pytz or the time is ambiguous or non-existent in
+    fromTz.
+    """
+    fromTable = getTransitionTable(fromTz)
+    toTable   = getTransitionTable(toTz)
+    if fromTable is None or toTable is None:
+        return None
+    aware = fromTable.localize(naive)
+    if aware is None:
+        return None
+    return toTable.fromutc(naive - aware.utcoffset())
+
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
+# ------------------------------------------------------------------------------
@@ -9,7 +9,26 @@ from wagtail.core import hooks
 from wagtail.contrib.modeladmin.options import ModelAdmin
 from wagtail.contrib.modeladmin.options import modeladmin_register
 from .models import EventCategory, CalendarPage, CalendarPageForm
-from .formats import NullHandler, ICalHandler, GoogleCalendarHandler
+from .models import forgetGroupEvents
+
+# ------------------------------------------------------------------------------
+class LazyHandler:
+    """
+    Stands in for a format handler, only creating it when it is first used.
+    The formats need icalendar, which need not slow down starting up.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.handler = None
+
+    def __getattr__(self, attr):
+        if self.handler is None:
+            from . import formats
+            self.handler = getattr(formats, self.name)()
+        return getattr(self.handler, attr)
+
+_iCalHandler = LazyHandler("ICalHandler")
+_googleHandler = LazyHandler("GoogleCalendarHandler")
 
 # ------------------------------------------------------------------------------
 @hooks.register('insert_editor_js')
@@ -25,11 +44,12 @@ def handlePageExport(page, request, serve_args, serve_kwargs):
     format = request.GET.get('format')
     # TODO impement a registry of different format handlers
     if format == "ical":
-        handler = ICalHandler()
+        handler = _iCalHandler
     elif format == "google":
-        handler = GoogleCalendarHandler()
+        handler = _googleHandler
     else:
-        handler = NullHandler()
+        # nothing to serve, as the NullHandler would
+        return None
     return handler.serve(page, request, serve_args, serve_kwargs)
 
 @hooks.register('before_edit_page')
@@ -38,8 +58,21 @@ def stashRequest(request, page):
         page.__joyous_edit_request = request
     return None
 
-CalendarPageForm.registerImportHandler(ICalHandler())
-CalendarPageForm.registerExportHandler(ICalHandler())
+@hooks.register('before_move_page')
+@hooks.register('after_move_page')
+def forgetCachedCalendars(request, page, destination=None):
+    # the moved page might contain events or calendars, either where it was
+    # or where it is
+    CalendarPage._invalidateCaches()
+    # or it might be an event moving in or out of a group, but the page given
+    # after the move still has the path it had before it
+    if destination is None:
+        page = type(page).objects.get(id=page.id)
+    forgetGroupEvents(page)
+    return None
+
+CalendarPageForm.registerImportHandler(_iCalHandler)
+CalendarPageForm.registerExportHandler(_iCalHandler)
 
 # ------------------------------------------------------------------------------
 class EventCategoryAdmin(ModelAdmin):
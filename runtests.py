@@ -12,6 +12,9 @@ def run():
         verbosity = 2
     os.environ['DJANGO_SETTINGS_MODULE'] = 'ls.joyous.tests.settings'
     django.setup()
+    # The test runner puts ls/joyous at the front of sys.path, where our
+    # holidays package would hide python-holidays, so import that first
+    import holidays
     TestRunner = get_runner(settings)
     test_runner = TestRunner(top_level="ls/joyous",
                              verbosity=verbosity,